@@ -10,7 +10,7 @@ from flask.ext.restful import Api
 sys.path.append('src')
 
 from db import DB
-import cors, jsonp
+import blobs, cache, classifier, compression, conditional, cors, generation, invalidation, jsonp, lookups, profiling, snapshots, spool
 
 # create flask application
 app = Flask(__name__)
@@ -19,13 +19,39 @@ app = Flask(__name__)
 app.config.from_object('config.api')
 
 # initialize the database pool
-DB.init_pool(app.config['DATABASE'])
+DB.init_app(app.config)
+
+# query timing and slow query log
+profiling.init_app(app.config)
+
+# caches used when submitting results
+lookups.init_app(app.config)
+blobs.init_app(app.config)
+classifier.init_app(app.config)
+
+# cache of GET responses, valid until the data generation changes
+generation.init_app(app.config)
+cache.init_app(app.config)
+
+# notifications about changed data, invalidating the cache (and purging HTTP caches)
+invalidation.init_app(app.config)
+
+# stats rendered by the refresh daemon
+snapshots.init_app(app.config)
+
+# gzip / brotli compression of the responses
+compression.init_app(app.config)
 
 # create the REST api
 api = Api(app)
 
-# CORS / allow calls from all origins (well, especially pgxn-tester.org, but not only)
-api.decorators=[cors.crossdomain(origin='*'), jsonp.support_jsonp]
+# the response cache is the innermost decorator (cached responses still get JSONP etc.), the
+# compression and the conditional GET need to see the JSONP output (the callback changes the
+# response), and the conditional GET needs to see the encoding (each has a different ETag)
+#
+# CORS / allow calls from all origins (well, especially pgxn-tester.org, but not only) - this
+# is the outermost one, so that 304 responses get the headers too
+api.decorators=[cache.cached, jsonp.support_jsonp, compression.compressed, conditional.conditional, cors.crossdomain(origin='*')]
 
 import index
 import distributions
@@ -33,6 +59,10 @@ import users
 import machines
 import results
 import stats
+import diagnostics
+
+# local spool for submitted results (only when RESULTS_SPOOL is set)
+spool.init_app(app.config, results.store_spooled)
 
 api.add_resource(index.Index, '/')
 
@@ -41,7 +71,9 @@ api.add_resource(distributions.Distribution,	 '/distributions/<string:name>')
 api.add_resource(distributions.Version,			 '/distributions/<string:name>/<string:version>')
 
 api.add_resource(results.Result,				 '/results/<string:rid>')
+api.add_resource(results.ResultLog,				 '/results/<string:rid>/logs/<string:name>')
 api.add_resource(results.ResultList,			 '/results')
+api.add_resource(results.ResultBatch,			 '/results/batch')
 
 api.add_resource(users.UserList,				 '/users')
 api.add_resource(users.User,					 '/users/<string:name>')
@@ -62,6 +94,13 @@ api.add_resource(stats.MonthlyStatus,			'/stats/monthly/version-status')
 
 api.add_resource(stats.ErrorsOverview,			'/stats/errors')
 api.add_resource(stats.ErrorsPerStatus,			'/stats/errors/status')
+api.add_resource(stats.ErrorsUnclassified,		'/stats/errors/unclassified')
+
+api.add_resource(diagnostics.Pool,				'/diagnostics/pool')
+api.add_resource(diagnostics.Queries,			'/diagnostics/queries')
+api.add_resource(diagnostics.Spool,				'/diagnostics/spool')
+api.add_resource(diagnostics.Cache,				'/diagnostics/cache')
+api.add_resource(diagnostics.Compression,		'/diagnostics/compression')
 
 if __name__ == '__main__':
     app.run()
@@ -1,187 +1,106 @@
-CREATE TABLE error_analysis (
+-- rules for classification of the errors (see src/classifier.py) - the rules for each phase are
+-- checked against the log of that phase, and the first matching rule (by priority) is used
+CREATE TABLE error_rules (
 
     id              SERIAL PRIMARY KEY,
 
-    result_id       INT NOT NULL REFERENCES results(id),
+    -- lower priority wins when multiple rules match
+    priority        INT NOT NULL,
 
-    -- description, contact e-mail etc.
-    error_phase     TEXT,
-    description     TEXT,
+    error_phase     TEXT NOT NULL,
+
+    -- regular expression (Python syntax, without capturing groups), matched within a line
+    pattern         TEXT NOT NULL,
+    description     TEXT NOT NULL,
 
     CONSTRAINT valid_phase CHECK (error_phase IN ('install', 'load', 'check'))
 
 );
 
+CREATE TABLE error_analysis (
 
-CREATE OR REPLACE FUNCTION analyze_install_errors() RETURNS void AS $$
-DECLARE
-    v_row RECORD;
-BEGIN
-
-    FOR v_row IN (SELECT id, log_install FROM results WHERE install_result = 'error') LOOP
-
-        DELETE FROM error_analysis WHERE result_id = v_row.id;
-
-        IF (v_row.log_install LIKE '%Makefile.global%') THEN
-
-            INSERT INTO error_analysis(result_id, error_phase, description)
-            VALUES (v_row.id, 'install', 'mising Makefile.global');
-
-        ELSIF (v_row.log_install LIKE '%no Makefile found in the extension root%') THEN
-
-            INSERT INTO error_analysis(result_id, error_phase, description)
-            VALUES (v_row.id, 'install', 'mising Makefile in extension root');
-
-        ELSIF (v_row.log_install LIKE '%will not overwrite just-created%') THEN
-
-            INSERT INTO error_analysis(result_id, error_phase, description)
-            VALUES (v_row.id, 'install', 'will not overwrite just-created file');
-
-        ELSIF (v_row.log_install LIKE '%missing destination file operand%') THEN
-
-            INSERT INTO error_analysis(result_id, error_phase, description)
-            VALUES (v_row.id, 'install', 'missing destination file operand');
-
-        ELSIF (v_row.log_install LIKE '%no input file specified%') THEN
-
-            INSERT INTO error_analysis(result_id, error_phase, description)
-            VALUES (v_row.id, 'install', 'no input file specified');
-
-        ELSIF (v_row.log_install LIKE '%No such file or directory%') THEN
-
-            INSERT INTO error_analysis(result_id, error_phase, description)
-            VALUES (v_row.id, 'install', 'no such file or directory');
-
-        ELSIF (v_row.log_install LIKE '%No rule to make target%') THEN
-
-            INSERT INTO error_analysis(result_id, error_phase, description)
-            VALUES (v_row.id, 'install', 'missing makefile target');
-
-        ELSIF (v_row.log_install LIKE '%Command not found%')
-        OR (v_row.log_install LIKE '%command not found%') THEN
-
-            INSERT INTO error_analysis(result_id, error_phase, description)
-            VALUES (v_row.id, 'install', 'command not found');
-
-        ELSIF (v_row.log_install LIKE '%error: %: No such file or directory%')
-        OR (v_row.log_install LIKE '%catastrophic error: cannot open source file%') THEN
-
-            INSERT INTO error_analysis(result_id, error_phase, description)
-            VALUES (v_row.id, 'install', 'no such file or directory');
-
-        ELSIF (v_row.log_install LIKE '%error: identifier "%" is undefined%')
-        OR (v_row.log_install LIKE '%error: ''%'' undeclared%') THEN
-
-            INSERT INTO error_analysis(result_id, error_phase, description)
-            VALUES (v_row.id, 'install', 'undeclared identifier');
-
-        ELSIF (v_row.log_install LIKE '%error: ''%'' has no member named ''%''%')
-        OR (v_row.log_install LIKE '%error: struct "%" has no field "%"%') THEN
-
-            INSERT INTO error_analysis(result_id, error_phase, description)
-            VALUES (v_row.id, 'install', 'struct member missing');
-
-        ELSIF (v_row.log_install LIKE '%error: incompatible types when assigning to type%')
-        OR (v_row.log_install LIKE '%error: a value of type "%" cannot be assigned to an entity of type%') THEN
-
-            INSERT INTO error_analysis(result_id, error_phase, description)
-            VALUES (v_row.id, 'install', 'incompatible types in assignment');
-
-        ELSIF (v_row.log_install LIKE '%too many arguments in function call%')
-        OR (v_row.log_install LIKE '%error: too many arguments to function%') THEN
-
-            INSERT INTO error_analysis(result_id, error_phase, description)
-            VALUES (v_row.id, 'install', 'too many arguments in a function call');
-
-        ELSIF (v_row.log_install LIKE '%too few arguments in function call%')
-        OR (v_row.log_install LIKE '%error: too few arguments to function%') THEN
-
-            INSERT INTO error_analysis(result_id, error_phase, description)
-            VALUES (v_row.id, 'install', 'too few arguments in a function call');
-
-        ELSIF (v_row.log_install LIKE '%configure: error: % is not installed, but is required by debversion%') T
-
-            INSERT INTO error_analysis(result_id, error_phase, description)
-            VALUES (v_row.id, 'install', 'configure missing library');
-
-        ELSIF (v_row.log_install LIKE '%cannot create regular file %: Permission denied%') THEN
-
-            INSERT INTO error_analysis(result_id, error_phase, description)
-            VALUES (v_row.id, 'install', 'permission denied');
-
-        ELSIF (v_row.log_install LIKE '%config/install-sh: % does not exist.%') THEN
-
-            INSERT INTO error_analysis(result_id, error_phase, description)
-            VALUES (v_row.id, 'install', 'installed file missing');
-
-        ELSIF (v_row.log_install LIKE '%error: invalid type argument%') THEN
-
-            INSERT INTO error_analysis(result_id, error_phase, description)
-            VALUES (v_row.id, 'install', 'invalid type argument');
-
-        ELSIF (v_row.log_install LIKE '%undefined reference to%') THEN
-
-            INSERT INTO error_analysis(result_id, error_phase, description)
-            VALUES (v_row.id, 'install', 'undefined reference when linking');
-
-        ELSIF (v_row.log_install LIKE '%error: pointer to incomplete class type is not allowed%')
-        OR (v_row.log_install LIKE '%error: dereferencing pointer to incomplete type%') THEN
-
-            INSERT INTO error_analysis(result_id, error_phase, description)
-            VALUES (v_row.id, 'install', 'dereferencing pointer to incomplete type');
-
-        ELSIF (v_row.log_install LIKE '%You need to run the ''configure'' program first. See the file%') THEN
-
-            INSERT INTO error_analysis(result_id, error_phase, description)
-            VALUES (v_row.id, 'install', 'configure not executed');
-
-        ELSIF (v_row.log_install LIKE '%error: declaration is incompatible%') THEN
-
-            INSERT INTO error_analysis(result_id, error_phase, description)
-            VALUES (v_row.id, 'install', 'incompatible declaration');
-
-        ELSIF (v_row.log_install LIKE '%requires PostgreSQL % or above%')
-        OR (v_row.log_install LIKE '%error: #error directive: Wrong Postgresql version.%')
-        OR (v_row.log_install LIKE '%error: #error Wrong Postgresql version%')
-        OR (v_row.log_install LIKE '%#error wrong Postgresql version%') THEN
+    id              SERIAL PRIMARY KEY,
 
-            INSERT INTO error_analysis(result_id, error_phase, description)
-            VALUES (v_row.id, 'install', 'unsupported PostgreSQL version');
+    result_id       INT NOT NULL REFERENCES results(id),
 
-        ELSIF (v_row.log_install LIKE '%#error Must compile with c99 or define%') THEN
+    -- description, contact e-mail etc.
+    error_phase     TEXT,
+    description     TEXT,
 
-            INSERT INTO error_analysis(result_id, error_phase, description)
-            VALUES (v_row.id, 'install', 'c99 compiler required');
+    -- the rule matching the log
+    rule_id         INT REFERENCES error_rules(id) ON DELETE SET NULL,
 
-        ELSIF (v_row.log_install LIKE '%unexpected error: OSError - [Errno 17] File exists%') THEN
+    CONSTRAINT valid_phase CHECK (error_phase IN ('install', 'load', 'check'))
 
-            INSERT INTO error_analysis(result_id, error_phase, description)
-            VALUES (v_row.id, 'install', 'unexpected error - file exists');
+);
 
-        ELSIF (v_row.log_install LIKE '%ld: cannot find -lpython2.7%')
-        OR (v_row.log_install LIKE '%Found Python 2.6, but 2.7 is required.%') THEN
+CREATE INDEX error_analysis_result_idx ON error_analysis (result_id);
 
-            INSERT INTO error_analysis(result_id, error_phase, description)
-            VALUES (v_row.id, 'install', 'incompatible python version');
+-- progress of the reclassification of existing results (see src/analyze-errors.py), updated
+-- along with the analysis (so that an interrupted reclassification can be resumed)
+CREATE TABLE error_analysis_checkpoint (
 
-        ELSIF (v_row.log_install LIKE '%error: expected an expression%') THEN
+    last_result_id  INT NOT NULL,
+    updated         TIMESTAMP NOT NULL DEFAULT now()
 
-            INSERT INTO error_analysis(result_id, error_phase, description)
-            VALUES (v_row.id, 'install', 'expected an expression');
+);
 
-        ELSIF (v_row.log_install LIKE '%error: expression must have pointer type%') THEN
+-- the results are classified when submitted, after changing the rules run src/analyze-errors.py
+-- to reclassify the existing results
+INSERT INTO error_rules (priority, error_phase, pattern, description) VALUES
+    (10, 'install', 'Makefile\.global', 'mising Makefile.global'),
+    (20, 'install', 'no Makefile found in the extension root', 'mising Makefile in extension root'),
+    (30, 'install', 'will not overwrite just-created', 'will not overwrite just-created file'),
+    (40, 'install', 'missing destination file operand', 'missing destination file operand'),
+    (50, 'install', 'no input file specified', 'no input file specified'),
+    (60, 'install', 'No such file or directory', 'no such file or directory'),
+    (70, 'install', 'No rule to make target', 'missing makefile target'),
+    (80, 'install', '[Cc]ommand not found', 'command not found'),
+    (90, 'install', 'catastrophic error: cannot open source file', 'no such file or directory'),
+    (100, 'install', 'error: identifier ".*" is undefined', 'undeclared identifier'),
+    (110, 'install', 'error: ''.*'' undeclared', 'undeclared identifier'),
+    (120, 'install', 'error: ''.*'' has no member named ''.*''', 'struct member missing'),
+    (130, 'install', 'error: struct ".*" has no field ".*"', 'struct member missing'),
+    (140, 'install', 'error: incompatible types when assigning to type', 'incompatible types in assignment'),
+    (150, 'install', 'error: a value of type ".*" cannot be assigned to an entity of type', 'incompatible types in assignment'),
+    (160, 'install', 'too many arguments in function call', 'too many arguments in a function call'),
+    (170, 'install', 'error: too many arguments to function', 'too many arguments in a function call'),
+    (180, 'install', 'too few arguments in function call', 'too few arguments in a function call'),
+    (190, 'install', 'error: too few arguments to function', 'too few arguments in a function call'),
+    (200, 'install', 'configure: error: .* is not installed, but is required by debversion', 'configure missing library'),
+    (210, 'install', 'cannot create regular file .*: Permission denied', 'permission denied'),
+    (220, 'install', 'config/install-sh: .* does not exist\.', 'installed file missing'),
+    (230, 'install', 'error: invalid type argument', 'invalid type argument'),
+    (240, 'install', 'undefined reference to', 'undefined reference when linking'),
+    (250, 'install', 'error: pointer to incomplete class type is not allowed', 'dereferencing pointer to incomplete type'),
+    (260, 'install', 'error: dereferencing pointer to incomplete type', 'dereferencing pointer to incomplete type'),
+    (270, 'install', 'You need to run the ''configure'' program first\. See the file', 'configure not executed'),
+    (280, 'install', 'error: declaration is incompatible', 'incompatible declaration'),
+    (290, 'install', 'requires PostgreSQL .* or above', 'unsupported PostgreSQL version'),
+    (300, 'install', '#error (?:directive: )?[Ww]rong Postgresql version', 'unsupported PostgreSQL version'),
+    (310, 'install', '#error Must compile with c99 or define', 'c99 compiler required'),
+    (320, 'install', 'unexpected error: OSError - \[Errno 17\] File exists', 'unexpected error - file exists'),
+    (330, 'install', 'ld: cannot find -lpython2\.7', 'incompatible python version'),
+    (340, 'install', 'Found Python 2\.6, but 2\.7 is required\.', 'incompatible python version'),
+    (350, 'install', 'error: expected an expression', 'expected an expression'),
+    (360, 'install', 'error: expression must have pointer type', 'expression must have pointer type'),
+    (370, 'install', 'missing separator\.  Stop\.', 'missing separator');
+
+-- clusters of similar failures not matching any of the rules (see src/cluster-errors.py), with a
+-- representative result and an excerpt of its log (helps with writing new rules)
+CREATE TABLE error_clusters (
 
-            INSERT INTO error_analysis(result_id, error_phase, description)
-            VALUES (v_row.id, 'install', 'expression must have pointer type');
+    id              SERIAL PRIMARY KEY,
 
-        ELSIF (v_row.log_install LIKE '%missing separator.  Stop.%') THEN
+    error_phase     TEXT NOT NULL,
+    result_count    INT NOT NULL,
 
-            INSERT INTO error_analysis(result_id, error_phase, description)
-            VALUES (v_row.id, 'install', 'missing separator');
+    -- representative of the cluster
+    result_id       INT NOT NULL REFERENCES results(id),
+    sample          TEXT NOT NULL,
 
-        END IF;
+    updated         TIMESTAMP NOT NULL DEFAULT now(),
 
-    END LOOP;
+    CONSTRAINT valid_phase CHECK (error_phase IN ('install', 'load', 'check'))
 
-END;
-$$ LANGUAGE plpgsql;
+);
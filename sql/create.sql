@@ -89,6 +89,25 @@ CREATE TABLE machines (
 
 CREATE TYPE test_result AS ENUM ('ok', 'error', 'missing');
 
+-- content-addressed storage of large values submitted with the results (logs, pg_config and
+-- env_info) - the same data is submitted over and over, so each value is stored only once,
+-- identified by a SHA-256 hash of the (uncompressed) contents
+CREATE TABLE blobs (
+
+    hash            BYTEA PRIMARY KEY,
+
+    -- compression used for the data (zlib)
+    codec           TEXT NOT NULL,
+
+    -- size of the data before compression
+    blob_size       INT NOT NULL,
+    blob_data       BYTEA NOT NULL
+
+);
+
+-- the data are compressed already, so don't try to compress them again
+ALTER TABLE blobs ALTER COLUMN blob_data SET STORAGE EXTERNAL;
+
 CREATE TABLE results (
 
     id              SERIAL PRIMARY KEY,
@@ -105,11 +124,11 @@ CREATE TABLE results (
     -- version of PostgreSQL
     pg_version      TEXT NOT NULL,
 
-    -- pg_config output (info about CFLAGS etc.)
-    pg_config       JSON NOT NULL,
+    -- pg_config output (info about CFLAGS etc.), JSON stored as a blob
+    pg_config_hash  BYTEA NOT NULL REFERENCES blobs(hash),
 
-    -- various info about environment (e.g. 'uname -a' and whatever the client considers useful)
-    env_info        JSON NOT NULL,
+    -- various info about environment (e.g. 'uname -a' and whatever the client considers useful), JSON stored as a blob
+    env_info_hash   BYTEA NOT NULL REFERENCES blobs(hash),
 
     -- results of each phase
     load_result     test_result,
@@ -119,133 +138,557 @@ CREATE TABLE results (
     -- duration of steps (in miliseconds)
     load_duration       INT,
     install_duration    INT,
-    check_duration      INT,
+    check_duration      INT
+
+);
+
+-- log from each phase (if available), and a diff from the pg_regress check - kept
+-- outside the results table (as blobs), as most queries don't need them
+CREATE TABLE result_logs (
+
+    result_id       INT NOT NULL REFERENCES results(id),
+
+    -- install, load, check or diff
+    log_name        TEXT NOT NULL,
 
-    -- log from each phase (if available), and a diff from the pg_regress check
-    log_load        TEXT,
-    log_install     TEXT,
-    log_check       TEXT,
-    check_diff      TEXT
+    blob_hash       BYTEA NOT NULL REFERENCES blobs(hash),
+
+    PRIMARY KEY (result_id, log_name),
+
+    CONSTRAINT valid_log_name CHECK (log_name IN ('install', 'load', 'check', 'diff'))
 
 );
 
 CREATE INDEX results_version_idx ON results (dist_version_id);
 CREATE INDEX results_machine_idx ON results (machine_id);
-CREATE INDEX results_submit_date_idx ON results(submit_date);
-CREATE INDEX distribution_version_idx ON distribution_versions(dist_id);
+CREATE INDEX results_submit_date_idx ON results(submit_date, id);
+CREATE UNIQUE INDEX distribution_version_idx ON distribution_versions(dist_id, version_number);
 CREATE INDEX distributions_user_idx ON distributions(user_id);
 
--- ID of the last result for each distribution/machine/major_version
-CREATE MATERIALIZED VIEW results_last
-    AS SELECT DISTINCT machine_id, dist_version_id, major_version(pg_version) AS pg_version,
-                       LAST_VALUE(id)
-                           OVER (PARTITION BY machine_id, major_version(pg_version), dist_version_id
-                                 ORDER BY submit_date ASC
-                                 ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING) AS result_id
-  FROM results;
+-- ID of the last result for each distribution/machine/major_version (maintained by triggers on
+-- the results table, see results_last_insert)
+CREATE TABLE results_last (
+
+    machine_id      INT NOT NULL,
+    dist_version_id INT NOT NULL,
+    pg_version      TEXT NOT NULL,
+
+    result_id       INT NOT NULL,
+    submit_date     TIMESTAMP NOT NULL,
+
+    PRIMARY KEY (machine_id, dist_version_id, pg_version)
+
+);
 
 CREATE UNIQUE INDEX results_last_id_idx ON results_last (result_id);
-CREATE INDEX results_last_machine_idx ON results_last (machine_id);
 CREATE INDEX results_last_version_idx ON results_last (dist_version_id);
 
--- ID of the last version for distribution/status
-CREATE MATERIALIZED VIEW version_last
-    AS SELECT DISTINCT dist_id, version_status,
-                       LAST_VALUE(id)
-                           OVER (PARTITION BY dist_id, version_status
-                           ORDER BY version_date ASC
-                           ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING) AS version_id
-  FROM distribution_versions;
+-- ID of the last version for distribution/status (maintained by triggers on the distribution_versions
+-- table, see version_last_insert and version_last_update)
+CREATE TABLE version_last (
+
+    dist_id         INT NOT NULL,
+    version_status  TEXT NOT NULL,
+
+    version_id      INT NOT NULL,
+    version_date    TIMESTAMP NOT NULL,
+
+    PRIMARY KEY (dist_id, version_status)
+
+);
+
+CREATE INDEX version_last_version_idx ON version_last (version_id);
+
+-- a new result replaces the last one for the machine/distribution version/major version (unless
+-- it's older, e.g. when submitted late)
+CREATE OR REPLACE FUNCTION results_last_insert() RETURNS trigger AS $$
+BEGIN
+
+    -- results with unexpected version strings have no major version (skip them)
+    IF major_version(NEW.pg_version) IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    INSERT INTO results_last (machine_id, dist_version_id, pg_version, result_id, submit_date)
+         VALUES (NEW.machine_id, NEW.dist_version_id, major_version(NEW.pg_version), NEW.id, NEW.submit_date)
+    ON CONFLICT (machine_id, dist_version_id, pg_version) DO UPDATE
+            SET result_id = EXCLUDED.result_id, submit_date = EXCLUDED.submit_date
+          WHERE (results_last.submit_date, results_last.result_id) < (EXCLUDED.submit_date, EXCLUDED.result_id);
+
+    RETURN NULL;
+
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER results_last_insert AFTER INSERT ON results
+    FOR EACH ROW EXECUTE PROCEDURE results_last_insert();
+
+-- a new version replaces the last one for the distribution/status (unless it's older)
+CREATE OR REPLACE FUNCTION version_last_insert() RETURNS trigger AS $$
+BEGIN
+
+    INSERT INTO version_last (dist_id, version_status, version_id, version_date)
+         VALUES (NEW.dist_id, NEW.version_status, NEW.id, NEW.version_date)
+    ON CONFLICT (dist_id, version_status) DO UPDATE
+            SET version_id = EXCLUDED.version_id, version_date = EXCLUDED.version_date
+          WHERE (version_last.version_date, version_last.version_id) < (EXCLUDED.version_date, EXCLUDED.version_id);
+
+    RETURN NULL;
+
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER version_last_insert AFTER INSERT ON distribution_versions
+    FOR EACH ROW EXECUTE PROCEDURE version_last_insert();
+
+-- recompute the last versions of a distribution (there are only a few versions per distribution)
+CREATE OR REPLACE FUNCTION version_last_refresh(p_dist_id INT) RETURNS void AS $$
+BEGIN
+
+    -- serialize refreshes of the same distribution
+    PERFORM 1 FROM distributions WHERE id = p_dist_id FOR NO KEY UPDATE;
 
-CREATE UNIQUE INDEX version_last_idx ON version_last(dist_id, version_status);
+    DELETE FROM version_last WHERE dist_id = p_dist_id;
+
+    INSERT INTO version_last (dist_id, version_status, version_id, version_date)
+         SELECT DISTINCT ON (version_status) dist_id, version_status, id, version_date
+           FROM distribution_versions
+          WHERE dist_id = p_dist_id
+          ORDER BY version_status, version_date DESC, id DESC;
+
+END;
+$$ LANGUAGE plpgsql;
+
+-- updated / deleted version may change the last version in a way the upsert can't handle
+CREATE OR REPLACE FUNCTION version_last_update() RETURNS trigger AS $$
+BEGIN
+
+    PERFORM version_last_refresh(OLD.dist_id);
+
+    IF (TG_OP = 'UPDATE') AND (NEW.dist_id != OLD.dist_id) THEN
+        PERFORM version_last_refresh(NEW.dist_id);
+    END IF;
+
+    RETURN NULL;
+
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER version_last_update AFTER UPDATE OF dist_id, version_date, version_status OR DELETE ON distribution_versions
+    FOR EACH ROW EXECUTE PROCEDURE version_last_update();
+
+-- rebuild both tables from scratch (only needed when the results are modified directly, the
+-- triggers only handle inserts of new results)
+CREATE OR REPLACE FUNCTION rebuild_last() RETURNS void AS $$
+BEGIN
+
+    LOCK TABLE results_last, version_last IN EXCLUSIVE MODE;
+
+    -- the counters are rebuilt from scratch at the end (skip the triggers)
+    ALTER TABLE results_last DISABLE TRIGGER results_last_counters;
+    ALTER TABLE version_last DISABLE TRIGGER version_last_counters;
+
+    DELETE FROM results_last;
+
+    INSERT INTO results_last (machine_id, dist_version_id, pg_version, result_id, submit_date)
+         SELECT DISTINCT ON (machine_id, dist_version_id, major_version(pg_version))
+                machine_id, dist_version_id, major_version(pg_version), id, submit_date
+           FROM results
+          WHERE major_version(pg_version) IS NOT NULL
+          ORDER BY machine_id, dist_version_id, major_version(pg_version), submit_date DESC, id DESC;
+
+    DELETE FROM version_last;
+
+    INSERT INTO version_last (dist_id, version_status, version_id, version_date)
+         SELECT DISTINCT ON (dist_id, version_status) dist_id, version_status, id, version_date
+           FROM distribution_versions
+          ORDER BY dist_id, version_status, version_date DESC, id DESC;
+
+    ALTER TABLE results_last ENABLE TRIGGER results_last_counters;
+    ALTER TABLE version_last ENABLE TRIGGER version_last_counters;
+
+    PERFORM rebuild_counters();
+
+END;
+$$ LANGUAGE plpgsql;
+
+-- Summaries of the last results (from each machine / major version) - kept as counter tables,
+-- updated by triggers on results_last and version_last (see counters_add_result). The status of
+-- a result gets subtracted when it stops being the last one, and added when it becomes one.
 
 -- summary of the last version (per state) and last test (from each machine / per version)
-CREATE MATERIALIZED VIEW results_summary
-    AS SELECT
-        rl.pg_version,
-        version_status AS status,
-        COUNT (CASE WHEN install_result = 'ok' THEN 1 END) AS install_ok,
-        COUNT (CASE WHEN install_result = 'error' THEN 1 END) AS install_error,
-        COUNT (CASE WHEN load_result = 'ok' THEN 1 END) AS load_ok,
-        COUNT (CASE WHEN load_result = 'error' THEN 1 END) AS load_error,
-        COUNT (CASE WHEN check_result = 'ok' THEN 1 END) AS check_ok,
-        COUNT (CASE WHEN check_result = 'error' THEN 1 END) AS check_error,
-        COUNT (CASE WHEN check_result = 'missing' THEN 1 END) AS check_missing
-    FROM results r JOIN results_last rl ON (r.id = rl.result_id)               -- only last result from each machine/distribution/version
-                   JOIN version_last vl ON (r.dist_version_id = vl.version_id) -- only last version for each distribution/state
-    GROUP BY 1, 2 ORDER BY 1, 2;
+CREATE TABLE results_summary (
 
-CREATE UNIQUE INDEX results_summary_idx ON results_summary(pg_version, status);
+    pg_version      TEXT NOT NULL,
+    status          TEXT NOT NULL,
+
+    result_count    INT NOT NULL,
+
+    install_ok      INT NOT NULL,
+    install_error   INT NOT NULL,
+    load_ok         INT NOT NULL,
+    load_error      INT NOT NULL,
+    check_ok        INT NOT NULL,
+    check_error     INT NOT NULL,
+    check_missing   INT NOT NULL,
+
+    PRIMARY KEY (pg_version, status)
+
+);
 
 -- result summary per version and last test (from each machine)
-CREATE MATERIALIZED VIEW results_version
-    AS SELECT
-        rl.dist_version_id,
-        COUNT (CASE WHEN install_result = 'ok' THEN 1 END) AS install_ok,
-        COUNT (CASE WHEN install_result = 'error' THEN 1 END) AS install_error,
-        COUNT (CASE WHEN load_result = 'ok' THEN 1 END) AS load_ok,
-        COUNT (CASE WHEN load_result = 'error' THEN 1 END) AS load_error,
-        COUNT (CASE WHEN check_result = 'ok' THEN 1 END) AS check_ok,
-        COUNT (CASE WHEN check_result = 'error' THEN 1 END) AS check_error,
-        COUNT (CASE WHEN check_result = 'missing' THEN 1 END) AS check_missing
-    FROM results_last rl JOIN results r ON (r.id = rl.result_id) -- only last result from each machine/distribution/version
-    GROUP BY 1 ORDER BY 1;
-
-CREATE UNIQUE INDEX results_version_unique_idx ON results_version(dist_version_id);
+CREATE TABLE results_version (
+
+    dist_version_id INT NOT NULL,
+
+    result_count    INT NOT NULL,
+
+    install_ok      INT NOT NULL,
+    install_error   INT NOT NULL,
+    load_ok         INT NOT NULL,
+    load_error      INT NOT NULL,
+    check_ok        INT NOT NULL,
+    check_error     INT NOT NULL,
+    check_missing   INT NOT NULL,
+
+    PRIMARY KEY (dist_version_id)
+
+);
 
 -- result summary per distribution and last test (from each machine) / last version
-CREATE MATERIALIZED VIEW results_distribution
-    AS SELECT
-        vl.dist_id,
-        COUNT (CASE WHEN install_result = 'ok' THEN 1 END) AS install_ok,
-        COUNT (CASE WHEN install_result = 'error' THEN 1 END) AS install_error,
-        COUNT (CASE WHEN load_result = 'ok' THEN 1 END) AS load_ok,
-        COUNT (CASE WHEN load_result = 'error' THEN 1 END) AS load_error,
-        COUNT (CASE WHEN check_result = 'ok' THEN 1 END) AS check_ok,
-        COUNT (CASE WHEN check_result = 'error' THEN 1 END) AS check_error,
-        COUNT (CASE WHEN check_result = 'missing' THEN 1 END) AS check_missing
-    FROM results_last rl JOIN results r ON (r.id = rl.result_id) -- only last result from each machine/distribution/version
-                         JOIN version_last vl ON (vl.version_id = r.dist_version_id)
-    GROUP BY 1 ORDER BY 1;
-
-CREATE UNIQUE INDEX results_distribution_idx ON results_distribution(dist_id);
+CREATE TABLE results_distribution (
+
+    dist_id         INT NOT NULL,
+
+    result_count    INT NOT NULL,
+
+    install_ok      INT NOT NULL,
+    install_error   INT NOT NULL,
+    load_ok         INT NOT NULL,
+    load_error      INT NOT NULL,
+    check_ok        INT NOT NULL,
+    check_error     INT NOT NULL,
+    check_missing   INT NOT NULL,
+
+    PRIMARY KEY (dist_id)
+
+);
 
 -- result summary per distribution and last test (from each machine) / last version for each status
-CREATE MATERIALIZED VIEW results_distribution_status
-    AS SELECT
-        vl.dist_id,
-        vl.version_status,
-        COUNT (CASE WHEN install_result = 'ok' THEN 1 END) AS install_ok,
-        COUNT (CASE WHEN install_result = 'error' THEN 1 END) AS install_error,
-        COUNT (CASE WHEN load_result = 'ok' THEN 1 END) AS load_ok,
-        COUNT (CASE WHEN load_result = 'error' THEN 1 END) AS load_error,
-        COUNT (CASE WHEN check_result = 'ok' THEN 1 END) AS check_ok,
-        COUNT (CASE WHEN check_result = 'error' THEN 1 END) AS check_error,
-        COUNT (CASE WHEN check_result = 'missing' THEN 1 END) AS check_missing
-    FROM results_last rl JOIN results r ON (r.id = rl.result_id) -- only last result from each machine/distribution/version
-                         JOIN version_last vl ON (vl.version_id = r.dist_version_id)
-    GROUP BY 1, 2 ORDER BY 1, 2;
-
-CREATE UNIQUE INDEX results_distribution_status_idx ON results_distribution_status(dist_id, version_status);
+CREATE TABLE results_distribution_status (
+
+    dist_id         INT NOT NULL,
+    version_status  TEXT NOT NULL,
+
+    result_count    INT NOT NULL,
+
+    install_ok      INT NOT NULL,
+    install_error   INT NOT NULL,
+    load_ok         INT NOT NULL,
+    load_error      INT NOT NULL,
+    check_ok        INT NOT NULL,
+    check_error     INT NOT NULL,
+    check_missing   INT NOT NULL,
+
+    PRIMARY KEY (dist_id, version_status)
+
+);
 
 -- result summary per machine and last test (last version)
-CREATE MATERIALIZED VIEW results_machine
-    AS SELECT
-        rl.machine_id,
-        rl.pg_version,
-        version_status AS status,
-        COUNT (CASE WHEN install_result = 'ok' THEN 1 END) AS install_ok,
-        COUNT (CASE WHEN install_result = 'error' THEN 1 END) AS install_error,
-        COUNT (CASE WHEN load_result = 'ok' THEN 1 END) AS load_ok,
-        COUNT (CASE WHEN load_result = 'error' THEN 1 END) AS load_error,
-        COUNT (CASE WHEN check_result = 'ok' THEN 1 END) AS check_ok,
-        COUNT (CASE WHEN check_result = 'error' THEN 1 END) AS check_error,
-        COUNT (CASE WHEN check_result = 'missing' THEN 1 END) AS check_missing
-    FROM results r JOIN results_last rl ON (r.id = rl.result_id)               -- only last result from each machine/distribution/version
-                   JOIN version_last vl ON (rl.dist_version_id = vl.version_id) -- only last version for each distribution/state
-    GROUP BY 1, 2, 3 ORDER BY 1, 2, 3;
+CREATE TABLE results_machine (
+
+    machine_id      INT NOT NULL,
+    pg_version      TEXT NOT NULL,
+    status          TEXT NOT NULL,
+
+    result_count    INT NOT NULL,
+
+    install_ok      INT NOT NULL,
+    install_error   INT NOT NULL,
+    load_ok         INT NOT NULL,
+    load_error      INT NOT NULL,
+    check_ok        INT NOT NULL,
+    check_error     INT NOT NULL,
+    check_missing   INT NOT NULL,
+
+    PRIMARY KEY (machine_id, pg_version, status)
+
+);
+
+-- add (p_sign = 1) or subtract (p_sign = -1) the result to the counters - to results_version
+-- when p_version is true, and to the counters considering only the last versions when p_last
+-- is true (i.e. when the result is for one of the last versions)
+CREATE OR REPLACE FUNCTION counters_add_result(p_result_id INT, p_sign INT, p_version BOOLEAN, p_last BOOLEAN) RETURNS void AS $$
+DECLARE
+    v_machine_id        INT;
+    v_pg_version        TEXT;
+    v_dist_version_id   INT;
+    v_dist_id           INT;
+    v_status            TEXT;
+
+    v_install_ok        INT;
+    v_install_error     INT;
+    v_load_ok           INT;
+    v_load_error        INT;
+    v_check_ok          INT;
+    v_check_error       INT;
+    v_check_missing     INT;
+BEGIN
+
+    SELECT r.machine_id, major_version(r.pg_version), r.dist_version_id, v.dist_id, v.version_status,
+           (CASE WHEN install_result = 'ok' THEN p_sign ELSE 0 END),
+           (CASE WHEN install_result = 'error' THEN p_sign ELSE 0 END),
+           (CASE WHEN load_result = 'ok' THEN p_sign ELSE 0 END),
+           (CASE WHEN load_result = 'error' THEN p_sign ELSE 0 END),
+           (CASE WHEN check_result = 'ok' THEN p_sign ELSE 0 END),
+           (CASE WHEN check_result = 'error' THEN p_sign ELSE 0 END),
+           (CASE WHEN check_result = 'missing' THEN p_sign ELSE 0 END)
+      INTO v_machine_id, v_pg_version, v_dist_version_id, v_dist_id, v_status,
+           v_install_ok, v_install_error, v_load_ok, v_load_error, v_check_ok, v_check_error, v_check_missing
+      FROM results r JOIN distribution_versions v ON (v.id = r.dist_version_id)
+     WHERE r.id = p_result_id;
+
+    IF p_version THEN
+
+        INSERT INTO results_version (dist_version_id, result_count, install_ok, install_error, load_ok, load_error, check_ok, check_error, check_missing)
+             VALUES (v_dist_version_id, p_sign, v_install_ok, v_install_error, v_load_ok, v_load_error, v_check_ok, v_check_error, v_check_missing)
+        ON CONFLICT (dist_version_id) DO UPDATE
+                SET
+                    result_count = results_version.result_count + EXCLUDED.result_count,
+                    install_ok = results_version.install_ok + EXCLUDED.install_ok,
+                    install_error = results_version.install_error + EXCLUDED.install_error,
+                    load_ok = results_version.load_ok + EXCLUDED.load_ok,
+                    load_error = results_version.load_error + EXCLUDED.load_error,
+                    check_ok = results_version.check_ok + EXCLUDED.check_ok,
+                    check_error = results_version.check_error + EXCLUDED.check_error,
+                    check_missing = results_version.check_missing + EXCLUDED.check_missing;
+
+        IF p_sign < 0 THEN
+            DELETE FROM results_version WHERE dist_version_id = v_dist_version_id AND result_count = 0;
+        END IF;
+
+    END IF;
+
+    IF p_last THEN
+
+        INSERT INTO results_summary (pg_version, status, result_count, install_ok, install_error, load_ok, load_error, check_ok, check_error, check_missing)
+             VALUES (v_pg_version, v_status, p_sign, v_install_ok, v_install_error, v_load_ok, v_load_error, v_check_ok, v_check_error, v_check_missing)
+        ON CONFLICT (pg_version, status) DO UPDATE
+                SET
+                    result_count = results_summary.result_count + EXCLUDED.result_count,
+                    install_ok = results_summary.install_ok + EXCLUDED.install_ok,
+                    install_error = results_summary.install_error + EXCLUDED.install_error,
+                    load_ok = results_summary.load_ok + EXCLUDED.load_ok,
+                    load_error = results_summary.load_error + EXCLUDED.load_error,
+                    check_ok = results_summary.check_ok + EXCLUDED.check_ok,
+                    check_error = results_summary.check_error + EXCLUDED.check_error,
+                    check_missing = results_summary.check_missing + EXCLUDED.check_missing;
+
+        INSERT INTO results_distribution (dist_id, result_count, install_ok, install_error, load_ok, load_error, check_ok, check_error, check_missing)
+             VALUES (v_dist_id, p_sign, v_install_ok, v_install_error, v_load_ok, v_load_error, v_check_ok, v_check_error, v_check_missing)
+        ON CONFLICT (dist_id) DO UPDATE
+                SET
+                    result_count = results_distribution.result_count + EXCLUDED.result_count,
+                    install_ok = results_distribution.install_ok + EXCLUDED.install_ok,
+                    install_error = results_distribution.install_error + EXCLUDED.install_error,
+                    load_ok = results_distribution.load_ok + EXCLUDED.load_ok,
+                    load_error = results_distribution.load_error + EXCLUDED.load_error,
+                    check_ok = results_distribution.check_ok + EXCLUDED.check_ok,
+                    check_error = results_distribution.check_error + EXCLUDED.check_error,
+                    check_missing = results_distribution.check_missing + EXCLUDED.check_missing;
+
+        INSERT INTO results_distribution_status (dist_id, version_status, result_count, install_ok, install_error, load_ok, load_error, check_ok, check_error, check_missing)
+             VALUES (v_dist_id, v_status, p_sign, v_install_ok, v_install_error, v_load_ok, v_load_error, v_check_ok, v_check_error, v_check_missing)
+        ON CONFLICT (dist_id, version_status) DO UPDATE
+                SET
+                    result_count = results_distribution_status.result_count + EXCLUDED.result_count,
+                    install_ok = results_distribution_status.install_ok + EXCLUDED.install_ok,
+                    install_error = results_distribution_status.install_error + EXCLUDED.install_error,
+                    load_ok = results_distribution_status.load_ok + EXCLUDED.load_ok,
+                    load_error = results_distribution_status.load_error + EXCLUDED.load_error,
+                    check_ok = results_distribution_status.check_ok + EXCLUDED.check_ok,
+                    check_error = results_distribution_status.check_error + EXCLUDED.check_error,
+                    check_missing = results_distribution_status.check_missing + EXCLUDED.check_missing;
+
+        INSERT INTO results_machine (machine_id, pg_version, status, result_count, install_ok, install_error, load_ok, load_error, check_ok, check_error, check_missing)
+             VALUES (v_machine_id, v_pg_version, v_status, p_sign, v_install_ok, v_install_error, v_load_ok, v_load_error, v_check_ok, v_check_error, v_check_missing)
+        ON CONFLICT (machine_id, pg_version, status) DO UPDATE
+                SET
+                    result_count = results_machine.result_count + EXCLUDED.result_count,
+                    install_ok = results_machine.install_ok + EXCLUDED.install_ok,
+                    install_error = results_machine.install_error + EXCLUDED.install_error,
+                    load_ok = results_machine.load_ok + EXCLUDED.load_ok,
+                    load_error = results_machine.load_error + EXCLUDED.load_error,
+                    check_ok = results_machine.check_ok + EXCLUDED.check_ok,
+                    check_error = results_machine.check_error + EXCLUDED.check_error,
+                    check_missing = results_machine.check_missing + EXCLUDED.check_missing;
+
+        IF p_sign < 0 THEN
+            DELETE FROM results_summary WHERE pg_version = v_pg_version AND status = v_status AND result_count = 0;
+            DELETE FROM results_distribution WHERE dist_id = v_dist_id AND result_count = 0;
+            DELETE FROM results_distribution_status WHERE dist_id = v_dist_id AND version_status = v_status AND result_count = 0;
+            DELETE FROM results_machine WHERE machine_id = v_machine_id AND pg_version = v_pg_version AND status = v_status AND result_count = 0;
+        END IF;
+
+    END IF;
+
+END;
+$$ LANGUAGE plpgsql;
+
+-- a result replaced the last one (for the machine/version/major version)
+CREATE OR REPLACE FUNCTION results_last_counters() RETURNS trigger AS $$
+DECLARE
+    v_version_id INT;
+BEGIN
+
+    IF TG_OP = 'DELETE' THEN
+        v_version_id := OLD.dist_version_id;
+    ELSE
+        v_version_id := NEW.dist_version_id;
+    END IF;
+
+    -- serialize with version_last_counters (on the distribution, as version_last_refresh), so
+    -- that the check of the last version below sees a concurrent change of it (otherwise the
+    -- result might be missed by both triggers)
+    PERFORM 1 FROM distributions
+      WHERE id = (SELECT dist_id FROM distribution_versions WHERE id = v_version_id) FOR NO KEY UPDATE;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM counters_add_result(OLD.result_id, -1, true, EXISTS (SELECT 1 FROM version_last WHERE version_id = OLD.dist_version_id));
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM counters_add_result(NEW.result_id, 1, true, EXISTS (SELECT 1 FROM version_last WHERE version_id = NEW.dist_version_id));
+    END IF;
+
+    RETURN NULL;
+
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER results_last_counters AFTER INSERT OR UPDATE OR DELETE ON results_last
+    FOR EACH ROW EXECUTE PROCEDURE results_last_counters();
+
+-- a version replaced the last one (for the distribution/status), so the last results of the
+-- old version are not counted anymore, and those of the new one are
+CREATE OR REPLACE FUNCTION version_last_counters() RETURNS trigger AS $$
+BEGIN
+
+    IF (TG_OP = 'UPDATE') AND (OLD.version_id = NEW.version_id) THEN
+        RETURN NULL;
+    END IF;
+
+    -- serialize with results_last_counters, so that results_last read below includes the
+    -- results ingested concurrently (see above)
+    IF TG_OP = 'DELETE' THEN
+        PERFORM 1 FROM distributions WHERE id = OLD.dist_id FOR NO KEY UPDATE;
+    ELSE
+        PERFORM 1 FROM distributions WHERE id = NEW.dist_id FOR NO KEY UPDATE;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM counters_add_result(result_id, -1, false, true) FROM results_last WHERE dist_version_id = OLD.version_id;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM counters_add_result(result_id, 1, false, true) FROM results_last WHERE dist_version_id = NEW.version_id;
+    END IF;
 
-CREATE UNIQUE INDEX results_machine_unique_idx ON results_machine(machine_id, status, pg_version);
+    RETURN NULL;
+
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER version_last_counters AFTER INSERT OR UPDATE OR DELETE ON version_last
+    FOR EACH ROW EXECUTE PROCEDURE version_last_counters();
+
+-- recompute all the counters from scratch (e.g. after rebuilding results_last)
+CREATE OR REPLACE FUNCTION rebuild_counters() RETURNS void AS $$
+BEGIN
+
+    LOCK TABLE results_summary, results_version, results_distribution, results_distribution_status, results_machine IN EXCLUSIVE MODE;
+
+    DELETE FROM results_summary;
+
+    INSERT INTO results_summary (pg_version, status, result_count, install_ok, install_error, load_ok, load_error, check_ok, check_error, check_missing)
+         SELECT rl.pg_version, vl.version_status,
+                COUNT(*),
+                COUNT(CASE WHEN install_result = 'ok' THEN 1 END),
+                COUNT(CASE WHEN install_result = 'error' THEN 1 END),
+                COUNT(CASE WHEN load_result = 'ok' THEN 1 END),
+                COUNT(CASE WHEN load_result = 'error' THEN 1 END),
+                COUNT(CASE WHEN check_result = 'ok' THEN 1 END),
+                COUNT(CASE WHEN check_result = 'error' THEN 1 END),
+                COUNT(CASE WHEN check_result = 'missing' THEN 1 END)
+           FROM results_last rl JOIN results r ON (r.id = rl.result_id)
+                                JOIN version_last vl ON (vl.version_id = rl.dist_version_id)
+          GROUP BY 1, 2;
+
+    DELETE FROM results_version;
+
+    INSERT INTO results_version (dist_version_id, result_count, install_ok, install_error, load_ok, load_error, check_ok, check_error, check_missing)
+         SELECT rl.dist_version_id,
+                COUNT(*),
+                COUNT(CASE WHEN install_result = 'ok' THEN 1 END),
+                COUNT(CASE WHEN install_result = 'error' THEN 1 END),
+                COUNT(CASE WHEN load_result = 'ok' THEN 1 END),
+                COUNT(CASE WHEN load_result = 'error' THEN 1 END),
+                COUNT(CASE WHEN check_result = 'ok' THEN 1 END),
+                COUNT(CASE WHEN check_result = 'error' THEN 1 END),
+                COUNT(CASE WHEN check_result = 'missing' THEN 1 END)
+           FROM results_last rl JOIN results r ON (r.id = rl.result_id)
+          GROUP BY 1;
+
+    DELETE FROM results_distribution;
+
+    INSERT INTO results_distribution (dist_id, result_count, install_ok, install_error, load_ok, load_error, check_ok, check_error, check_missing)
+         SELECT vl.dist_id,
+                COUNT(*),
+                COUNT(CASE WHEN install_result = 'ok' THEN 1 END),
+                COUNT(CASE WHEN install_result = 'error' THEN 1 END),
+                COUNT(CASE WHEN load_result = 'ok' THEN 1 END),
+                COUNT(CASE WHEN load_result = 'error' THEN 1 END),
+                COUNT(CASE WHEN check_result = 'ok' THEN 1 END),
+                COUNT(CASE WHEN check_result = 'error' THEN 1 END),
+                COUNT(CASE WHEN check_result = 'missing' THEN 1 END)
+           FROM results_last rl JOIN results r ON (r.id = rl.result_id)
+                                JOIN version_last vl ON (vl.version_id = rl.dist_version_id)
+          GROUP BY 1;
+
+    DELETE FROM results_distribution_status;
+
+    INSERT INTO results_distribution_status (dist_id, version_status, result_count, install_ok, install_error, load_ok, load_error, check_ok, check_error, check_missing)
+         SELECT vl.dist_id, vl.version_status,
+                COUNT(*),
+                COUNT(CASE WHEN install_result = 'ok' THEN 1 END),
+                COUNT(CASE WHEN install_result = 'error' THEN 1 END),
+                COUNT(CASE WHEN load_result = 'ok' THEN 1 END),
+                COUNT(CASE WHEN load_result = 'error' THEN 1 END),
+                COUNT(CASE WHEN check_result = 'ok' THEN 1 END),
+                COUNT(CASE WHEN check_result = 'error' THEN 1 END),
+                COUNT(CASE WHEN check_result = 'missing' THEN 1 END)
+           FROM results_last rl JOIN results r ON (r.id = rl.result_id)
+                                JOIN version_last vl ON (vl.version_id = rl.dist_version_id)
+          GROUP BY 1, 2;
+
+    DELETE FROM results_machine;
+
+    INSERT INTO results_machine (machine_id, pg_version, status, result_count, install_ok, install_error, load_ok, load_error, check_ok, check_error, check_missing)
+         SELECT rl.machine_id, rl.pg_version, vl.version_status,
+                COUNT(*),
+                COUNT(CASE WHEN install_result = 'ok' THEN 1 END),
+                COUNT(CASE WHEN install_result = 'error' THEN 1 END),
+                COUNT(CASE WHEN load_result = 'ok' THEN 1 END),
+                COUNT(CASE WHEN load_result = 'error' THEN 1 END),
+                COUNT(CASE WHEN check_result = 'ok' THEN 1 END),
+                COUNT(CASE WHEN check_result = 'error' THEN 1 END),
+                COUNT(CASE WHEN check_result = 'missing' THEN 1 END)
+           FROM results_last rl JOIN results r ON (r.id = rl.result_id)
+                                JOIN version_last vl ON (vl.version_id = rl.dist_version_id)
+          GROUP BY 1, 2, 3;
+
+END;
+$$ LANGUAGE plpgsql;
 
 -- result summary per machine and last test (last version)
 CREATE MATERIALIZED VIEW results_version_details
@@ -262,17 +705,92 @@ CREATE MATERIALIZED VIEW results_version_details
 
 CREATE UNIQUE INDEX results_versio_details_idx ON results_version_details(result_id);
 
--- refresh all the views with current info
+-- state of the PGXN sync (src/pgxn-sync.py) - validators of the fetched documents, so that the
+-- next sync only fetches those that changed
+CREATE TABLE pgxn_sync_state (
+
+    uri             TEXT PRIMARY KEY,
+    etag            TEXT,
+    last_modified   TEXT,
+
+    -- the document itself, when needed even if unchanged (user lists)
+    document        JSON,
+
+    sync_time       TIMESTAMP NOT NULL DEFAULT now()
+
+);
+
+-- durations of view refreshes (recorded by src/refresh-views.py)
+CREATE TABLE view_refresh_log (
+
+    view_name       TEXT NOT NULL,
+    refresh_time    TIMESTAMP NOT NULL DEFAULT now(),
+    duration_ms     FLOAT NOT NULL
+
+);
+
+CREATE INDEX view_refresh_log_idx ON view_refresh_log (view_name, refresh_time);
+
+-- data generation, incremented whenever the data change (results submitted, views refreshed,
+-- PGXN synced) - cached API responses are valid only for the generation they were built for
+CREATE SEQUENCE data_generation;
+
+-- notifications about changed data on the 'pgxn_changes' channel, used to invalidate cached API
+-- responses (see src/invalidation.py) - the payload is a JSON array of tags, identifying what
+-- changed (e.g. ["results", "dist:pgtap", "user:theory", "machine:alpha"]), notifications with
+-- the same payload are sent only once per transaction
+CREATE OR REPLACE FUNCTION results_notify() RETURNS trigger AS $$
+BEGIN
+
+    PERFORM pg_notify('pgxn_changes', json_build_array('results', 'dist:' || d.dist_name, 'user:' || u.user_name, 'machine:' || m.name)::text)
+       FROM distribution_versions v JOIN distributions d ON (d.id = v.dist_id)
+                                    JOIN users u ON (u.id = d.user_id),
+            machines m
+      WHERE v.id = NEW.dist_version_id AND m.id = NEW.machine_id;
+
+    RETURN NULL;
+
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER results_notify AFTER INSERT ON results
+    FOR EACH ROW EXECUTE PROCEDURE results_notify();
+
+CREATE OR REPLACE FUNCTION versions_notify() RETURNS trigger AS $$
+DECLARE
+    v_dist_id   INT := (CASE WHEN TG_OP = 'DELETE' THEN OLD.dist_id ELSE NEW.dist_id END);
+BEGIN
+
+    PERFORM pg_notify('pgxn_changes', json_build_array('distributions', 'dist:' || d.dist_name, 'user:' || u.user_name)::text)
+       FROM distributions d JOIN users u ON (u.id = d.user_id)
+      WHERE d.id = v_dist_id;
+
+    RETURN NULL;
+
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER versions_notify AFTER INSERT OR UPDATE OR DELETE ON distribution_versions
+    FOR EACH ROW EXECUTE PROCEDURE versions_notify();
+
+CREATE OR REPLACE FUNCTION machines_notify() RETURNS trigger AS $$
+BEGIN
+
+    PERFORM pg_notify('pgxn_changes', json_build_array('machines', 'machine:' || (CASE WHEN TG_OP = 'DELETE' THEN OLD.name ELSE NEW.name END))::text);
+
+    RETURN NULL;
+
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER machines_notify AFTER INSERT OR UPDATE OR DELETE ON machines
+    FOR EACH ROW EXECUTE PROCEDURE machines_notify();
+
+-- refresh all the views with current info (src/refresh-views.py refreshes only views affected by changes)
 CREATE OR REPLACE FUNCTION refresh_views() RETURNS void AS $$
 BEGIN
-    REFRESH MATERIALIZED VIEW CONCURRENTLY results_last;
-    REFRESH MATERIALIZED VIEW CONCURRENTLY version_last;
-    REFRESH MATERIALIZED VIEW CONCURRENTLY results_summary;
-    REFRESH MATERIALIZED VIEW CONCURRENTLY results_version;
-    REFRESH MATERIALIZED VIEW CONCURRENTLY results_distribution;
-    REFRESH MATERIALIZED VIEW CONCURRENTLY results_machine;
+    -- results_last, version_last and the results_* summaries are maintained by triggers
     REFRESH MATERIALIZED VIEW CONCURRENTLY results_version_details;
-    REFRESH MATERIALIZED VIEW CONCURRENTLY results_distribution_status;
 
     -- now refresh all the stats views (delegated to a separate function)
     PERFORM refresh_stats();
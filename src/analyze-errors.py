@@ -0,0 +1,225 @@
+#!/usr/bin/python
+
+# This script (re)classifies errors of the failed results using the rules in error_rules, and stores
+# the results into error_analysis. New results are classified when submitted, so this is needed only
+# after the rules change.
+#
+# The failed results are streamed from the database (using a server-side cursor on a separate
+# connection), classified by a pool of worker processes and written back in batches, each batch
+# committed along with a checkpoint - so an interrupted run may be continued using --resume.
+
+import argparse
+import collections
+import multiprocessing
+import os
+import sys
+import time
+
+import psycopg2
+import psycopg2.extras
+
+import blobs
+import classifier
+
+def parse_arguments():
+
+	parser = argparse.ArgumentParser(description='PGXN Tester - classification of errors')
+
+	parser.add_argument('--workers', dest='workers', default=multiprocessing.cpu_count(), type=int, help='number of worker processes (default: %d)' % (multiprocessing.cpu_count(),))
+	parser.add_argument('--chunk', dest='chunk', default=100, type=int, help='number of results sent to a worker at once (default: 100)')
+	parser.add_argument('--batch', dest='batch', default=1000, type=int, help='number of results per transaction (default: 1000)')
+	parser.add_argument('--resume', dest='resume', action='store_true', default=False, help='continue after the last checkpoint')
+
+	parser.add_argument('--host', dest='host', default='localhost', help='DB host (default: localhost)')
+	parser.add_argument('--port', dest='port', default=5432, help='DB port (default: 5432)')
+	parser.add_argument('--db',   dest='db',   required=True, help='DB name')
+	parser.add_argument('--user', dest='user', default=os.getlogin(), help='DB user (default: %s)' % (os.getlogin(),))
+	parser.add_argument('--password', dest='password', default=None, help='DB password (default: None)')
+
+	return parser.parse_args()
+
+
+# failed results, with the logs (one row per log, ordered by result)
+FAILED_SQL = """SELECT r.id, r.install_result AS install, r.load_result AS load, r.check_result AS check, l.log_name, b.codec, b.blob_data
+				  FROM results r LEFT JOIN result_logs l ON (l.result_id = r.id)
+								 LEFT JOIN blobs b ON (b.hash = l.blob_hash)
+				 WHERE 'error' IN (r.install_result, r.load_result, r.check_result) AND r.id > %(last)s
+				 ORDER BY r.id"""
+
+COUNT_SQL = """SELECT COUNT(*) FROM results r WHERE 'error' IN (r.install_result, r.load_result, r.check_result) AND r.id > %(last)s"""
+
+def failed_results(conn, last, batch):
+	'''stream the failed results after the 'last' ID (using a server-side cursor, as there may be
+	a lot of them), yields (result, logs) pairs - the result is a dict with the status of each
+	phase, the logs are still compressed (name => (codec, data))'''
+
+	rows = conn.cursor('failed_results', cursor_factory=psycopg2.extras.DictCursor)
+	rows.itersize = batch
+	rows.execute(FAILED_SQL, {'last' : last})
+
+	current = None
+	for r in rows:
+
+		if (current is None) or (current[0]['id'] != r['id']):
+
+			if current is not None:
+				yield current
+
+			current = ({'id' : r['id'], 'install' : r['install'], 'load' : r['load'], 'check' : r['check']}, {})
+
+		if r['blob_data'] is not None:
+			current[1][r['log_name']] = (r['codec'], str(r['blob_data']))
+
+	if current is not None:
+		yield current
+
+	rows.close()
+
+
+def chunks(iterable, size):
+	'split the iterable into lists of the given size'
+
+	chunk = []
+	for item in iterable:
+		chunk.append(item)
+		if len(chunk) >= size:
+			yield chunk
+			chunk = []
+
+	if chunk:
+		yield chunk
+
+
+# classifier of the worker process (built once, in init_worker)
+worker_classifier = None
+
+def init_worker(rules):
+	global worker_classifier
+	worker_classifier = classifier.Classifier(rules)
+
+def classify_chunk(chunk):
+	'decompress and classify a chunk of results (in a worker process), returns (result_id, rule IDs) pairs'
+
+	analysis = []
+	for (result, logs) in chunk:
+		tmp = {name : blobs.decompress(codec, data) for (name, (codec, data)) in logs.items()}
+		analysis.append((result['id'], [r.id for r in worker_classifier.analyze(result, classifier.decode_logs(tmp))]))
+
+	return analysis
+
+
+class Progress(object):
+	'periodic progress report (on stderr)'
+
+	def __init__(self, total, interval=10):
+		self.total = total
+		self.interval = interval
+		self.done = 0
+		self.start = time.time()
+		self._reported = self.start
+
+	def update(self, count, last_id):
+
+		self.done += count
+		now = time.time()
+
+		if now - self._reported < self.interval:
+			return
+
+		self._reported = now
+		rate = self.done / max(now - self.start, 0.001)
+
+		sys.stderr.write("ANALYZE progress: %d/%d results (%.1f%%), %.0f results/s, last id %d\n" %
+						 (self.done, self.total, 100.0 * self.done / max(self.total, 1), rate, last_id))
+
+
+def reclassify(connect, workers, chunk_size, batch, resume):
+	'classify all the failed results (returns number of classified results)'
+
+	conn = connect()
+	cursor = conn.cursor()
+
+	# start after the last checkpoint, or from scratch
+	last = 0
+	if resume:
+		cursor.execute('SELECT last_result_id FROM error_analysis_checkpoint')
+		row = cursor.fetchone()
+		last = row and row[0] or 0
+
+	cursor.execute('DELETE FROM error_analysis_checkpoint')
+	cursor.execute('INSERT INTO error_analysis_checkpoint (last_result_id) VALUES (%(last)s)', {'last' : last})
+	conn.commit()
+
+	rules = classifier.load_rules(conn.cursor(cursor_factory=psycopg2.extras.DictCursor))
+	by_id = {r.id : r for r in rules}
+
+	# the results are read on a separate connection (the reading transaction stays open)
+	reader = connect()
+	reader.set_session(readonly=True)
+
+	tmp = reader.cursor()
+	tmp.execute(COUNT_SQL, {'last' : last})
+	progress = Progress(tmp.fetchone()[0])
+
+	pool = multiprocessing.Pool(workers, initializer=init_worker, initargs=(rules,))
+
+	analysis = collections.OrderedDict()
+
+	def write(chunk):
+		'collect the analysis of a chunk, write it when there is enough of it'
+
+		for (result_id, rule_ids) in chunk:
+			analysis[result_id] = [by_id[i] for i in rule_ids]
+
+		progress.update(len(chunk), chunk[-1][0])
+
+		if len(analysis) >= batch:
+			flush()
+
+	def flush():
+		'write the analysis and the checkpoint (in a single transaction)'
+
+		if not analysis:
+			return
+
+		classifier.store(cursor, analysis)
+		cursor.execute('UPDATE error_analysis_checkpoint SET last_result_id = %(last)s, updated = now()',
+					   {'last' : next(reversed(analysis))})
+		conn.commit()
+
+		analysis.clear()
+
+	# limit the number of chunks waiting for the workers, so that the memory usage is bounded
+	# (the chunks are processed in order, so the checkpoint is always the last written ID)
+	pending = collections.deque()
+
+	for chunk in chunks(failed_results(reader, last, batch), chunk_size):
+
+		pending.append(pool.apply_async(classify_chunk, (chunk,)))
+
+		if len(pending) >= workers * 2:
+			write(pending.popleft().get())
+
+	while pending:
+		write(pending.popleft().get())
+
+	flush()
+
+	pool.close()
+	pool.join()
+
+	reader.close()
+	conn.close()
+
+	return progress.done
+
+if __name__ == '__main__':
+
+	args = parse_arguments()
+
+	def connect():
+		return psycopg2.connect(host=args.host, port=args.port, dbname=args.db, user=args.user, password=args.password)
+
+	count = reclassify(connect, args.workers, args.chunk, args.batch, args.resume)
+
+	print "ANALYZE results=%d" % (count,)
@@ -0,0 +1,139 @@
+import collections
+import hashlib
+import threading
+import zlib
+
+import psycopg2
+import psycopg2.extras
+
+# compression level (zlib) - the blobs are mostly plain text, so even the fastest level works fine
+level = 1
+
+# number of hashes of stored blobs remembered in the process
+known_size = 100000
+
+def init_app(config):
+	global level, known_size
+	level = config.get('BLOB_COMPRESSION_LEVEL', 1)
+	known_size = config.get('BLOB_KNOWN_HASHES', 100000)
+
+
+def compress(data):
+	'compress the blob (returns the codec and compressed data)'
+
+	return ('zlib', zlib.compress(data, level))
+
+
+def decompress(codec, data):
+
+	if codec == 'zlib':
+		return zlib.decompress(str(data))
+
+	raise ValueError("unknown blob codec '%s'" % (codec,))
+
+
+def digest(data):
+	'content hash identifying the blob'
+
+	return hashlib.sha256(data).digest()
+
+
+class KnownHashes(object):
+	'''hashes of blobs known to be stored in the database (bounded, the least recently
+	used hashes are forgotten first) - used to skip compressing and sending those again'''
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._hashes = collections.OrderedDict()
+
+	def __contains__(self, key):
+
+		with self._lock:
+
+			if key not in self._hashes:
+				return False
+
+			# move to the end (most recently used)
+			self._hashes[key] = self._hashes.pop(key)
+
+			return True
+
+	def add(self, keys):
+
+		with self._lock:
+
+			for key in keys:
+				self._hashes.pop(key, None)
+				self._hashes[key] = True
+
+			while len(self._hashes) > known_size:
+				self._hashes.popitem(last=False)
+
+known = KnownHashes()
+
+
+class BlobSet(object):
+	'''blobs to be stored along with a result (or a batch of results) - hashes the data,
+	and compresses only blobs not known to be stored already'''
+
+	def __init__(self):
+		self._blobs = collections.OrderedDict()
+
+	def add(self, data):
+		'add the data (if not None), returns the hash'
+
+		if data is None:
+			return None
+
+		key = digest(data)
+
+		if (key not in self._blobs) and (key not in known):
+			(codec, compressed) = compress(data)
+			self._blobs[key] = (codec, len(data), compressed)
+
+		return key
+
+	def params(self):
+		'arrays of hashes, codecs, sizes and data (for BLOB_ROWS_SQL)'
+
+		return {
+			'blob_hashes' : [psycopg2.Binary(k) for k in self._blobs],
+			'blob_codecs' : [v[0] for v in self._blobs.values()],
+			'blob_sizes' : [v[1] for v in self._blobs.values()],
+			'blob_data' : [psycopg2.Binary(v[2]) for v in self._blobs.values()],
+		}
+
+	def stored(self):
+		'call after the transaction storing the blobs commits'
+
+		known.add(self._blobs.keys())
+
+
+# the blobs as rows (used with the arrays from BlobSet.params)
+BLOB_ROWS_SQL = """SELECT * FROM unnest(%(blob_hashes)s::bytea[], %(blob_codecs)s::text[], %(blob_sizes)s::int[], %(blob_data)s::bytea[])"""
+
+# store the blobs, skipping those that exist already
+INSERT_SQL = """INSERT INTO blobs (hash, codec, blob_size, blob_data) """ + BLOB_ROWS_SQL + """ ON CONFLICT (hash) DO NOTHING"""
+
+
+def store(cursor, blobset):
+	'store the blobs (in a separate statement)'
+
+	params = blobset.params()
+
+	if params['blob_hashes']:
+		cursor.execute(INSERT_SQL, params)
+
+
+def fetch(cursor, hashes):
+	'contents of the blobs (a dict hash => data)'
+
+	hashes = [h for h in hashes if h is not None]
+
+	if not hashes:
+		return {}
+
+	cursor.execute("SELECT hash, codec, blob_data FROM blobs WHERE hash = ANY(%(hashes)s::bytea[])",
+				   {'hashes' : [psycopg2.Binary(h) for h in hashes]})
+
+	return {str(r['hash']) : decompress(r['codec'], r['blob_data']) for r in cursor.fetchall()}
@@ -0,0 +1,212 @@
+import collections
+import threading
+
+from functools import wraps
+from flask import request, current_app
+
+from generation import current as current_generation
+from invalidation import ALL
+import invalidation
+
+# query parameters handled outside the cache (by the JSONP decorator, or cache busters)
+IGNORED_PARAMS = ['callback', '_']
+
+# paths never cached (the diagnostics need to be current)
+IGNORED_PATHS = ['/diagnostics/']
+
+# approximate memory overhead of an entry (key, headers, bookkeeping)
+ENTRY_OVERHEAD = 512
+
+class ResponseCache(object):
+	'''LRU cache of responses, bounded by the total size of the entries - each entry is tagged
+	with the version of the data it was computed for (e.g. the data generation), and entries of
+	other versions are misses, and with the tags of the data it depends on (see the invalidation
+	module), so that the entries may be invalidated selectively'''
+
+	def __init__(self, max_size):
+
+		self.max_size = max_size
+
+		self._lock = threading.Lock()
+		self._entries = collections.OrderedDict()
+		self._size = 0
+
+		# tag => keys of entries with the tag
+		self._tagged = {}
+
+		# number of invalidations so far, and the last invalidation of each tag
+		self._seq = 0
+		self._invalidated = {}
+
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self.invalidations = 0
+
+	def _remove(self, key):
+		'remove the entry (the lock needs to be held)'
+
+		entry = self._entries.pop(key, None)
+		if entry is None:
+			return None
+
+		self._size -= entry[1]
+
+		for tag in entry[3]:
+			self._tagged[tag].discard(key)
+			if not self._tagged[tag]:
+				del self._tagged[tag]
+
+		return entry
+
+	def get(self, key, version):
+
+		with self._lock:
+
+			entry = self._entries.get(key)
+
+			if (entry is None) or (entry[0] != version):
+				self._remove(key)
+				self.misses += 1
+				return None
+
+			# move to the end (most recently used)
+			self._entries[key] = self._entries.pop(key)
+			self.hits += 1
+
+			return entry[2]
+
+	def stamp(self):
+		'stamp to pass to put(), taken before computing the value'
+
+		with self._lock:
+			return self._seq
+
+	def put(self, key, version, value, size, tags=(), stamp=None):
+		'''add the entry - unless some of the tags were invalidated since the stamp was taken
+		(the value may have been computed from the data before the change)'''
+
+		size += len(key) + ENTRY_OVERHEAD
+
+		# don't let a single huge response flush the whole cache
+		if size > self.max_size / 4:
+			return
+
+		with self._lock:
+
+			if stamp is not None:
+
+				if (ALL in tags) and (self._seq > stamp):
+					return
+
+				if any([self._invalidated.get(t, 0) > stamp for t in list(tags) + [ALL]]):
+					return
+
+			self._remove(key)
+
+			self._entries[key] = (version, size, value, tuple(tags))
+			self._size += size
+
+			for tag in tags:
+				self._tagged.setdefault(tag, set()).add(key)
+
+			while self._size > self.max_size:
+				self._remove(next(iter(self._entries)))
+				self.evictions += 1
+
+	def invalidate(self, key=None):
+		'forget a single entry (or all of them)'
+
+		with self._lock:
+
+			if key is None:
+				self._entries.clear()
+				self._tagged.clear()
+				self._size = 0
+			else:
+				self._remove(key)
+
+	def invalidate_tags(self, tags):
+		'forget entries with any of the tags (or entries depending on everything)'
+
+		with self._lock:
+
+			self._seq += 1
+			self.invalidations += 1
+
+			for tag in tags:
+				self._invalidated[tag] = self._seq
+
+			if ALL in tags:
+				self._entries.clear()
+				self._tagged.clear()
+				self._size = 0
+				return
+
+			for tag in list(tags) + [ALL]:
+				for key in list(self._tagged.get(tag, [])):
+					self._remove(key)
+
+	def stats(self):
+
+		with self._lock:
+			return {'entries' : len(self._entries), 'size' : self._size, 'max_size' : self.max_size,
+					'hits' : self.hits, 'misses' : self.misses, 'evictions' : self.evictions,
+					'invalidations' : self.invalidations}
+
+
+# the cache of this process (None means caching is disabled)
+responses = None
+
+def init_app(config):
+	global responses
+
+	size = config.get('RESPONSE_CACHE_SIZE', 64*1024*1024)
+	responses = (size and ResponseCache(size)) or None
+
+	if responses is not None:
+		invalidation.add_hook(responses.invalidate_tags)
+
+
+def request_key(ignored=IGNORED_PARAMS):
+	'cache key for the current request (path and sorted query parameters)'
+
+	args = sorted([(k, v) for (k, v) in request.args.items(multi=True) if k not in ignored])
+
+	return request.path + '?' + '&'.join(['%s=%s' % (k, v) for (k, v) in args])
+
+
+def cached(f):
+	'''caches successful responses to GET requests - while the invalidation listener is connected
+	until a notification about a change of the data the response depends on, otherwise until the
+	data generation changes (meant to be applied before the CORS and JSONP decorators, which then
+	handle the cached responses)'''
+
+	@wraps(f)
+	def decorated_function(*args, **kwargs):
+
+		if (responses is None) or (request.method != 'GET') or any([request.path.startswith(p) for p in IGNORED_PATHS]):
+			return f(*args, **kwargs)
+
+		key = request_key()
+
+		# get the version first, so that data changed while building the response get a newer one
+		version = invalidation.version() or ('generation', current_generation())
+		stamp = responses.stamp()
+
+		entry = responses.get(key, version)
+		if entry is not None:
+			(status, headers, data) = entry
+			return current_app.response_class(data, status=status, headers=headers)
+
+		response = current_app.make_response(f(*args, **kwargs))
+
+		# the key does not include the request headers, so responses varying on them are not cached
+		if (response.status_code == 200) and (not response.direct_passthrough) and ('Vary' not in response.headers):
+			data = response.get_data()
+			responses.put(key, version, (response.status_code, response.headers.items(), data), len(data),
+						  tags=invalidation.tags(request.path), stamp=stamp)
+
+		return response
+
+	return decorated_function
@@ -0,0 +1,163 @@
+import logging
+import re
+import threading
+import time
+
+import psycopg2.extras
+
+log = logging.getLogger('pgxn.classifier')
+
+# phases of a test, and the logs each phase is classified by (the regression diff is usually
+# more interesting than the check log itself)
+PHASES = [
+	('install', ['install']),
+	('load', ['load']),
+	('check', ['check', 'diff']),
+]
+
+# python 2 supports at most 100 groups in a regular expression
+GROUPS_MAX = 99
+
+class Rule(object):
+
+	def __init__(self, id, phase, pattern, description):
+		self.id = id
+		self.phase = phase
+		self.pattern = pattern
+		self.description = description
+
+
+class Classifier(object):
+	'''matches logs against the rules of each phase - the patterns of a phase are compiled into
+	a single regular expression (one group per rule), so each log is scanned only once (the
+	patterns match within a line, ^ and $ match at line boundaries)'''
+
+	def __init__(self, rules):
+
+		# phase => list of (compiled regex, rules for the groups)
+		self._matchers = {}
+
+		for (phase, names) in PHASES:
+
+			tmp = []
+			for rule in [r for r in rules if r.phase == phase]:
+
+				try:
+					if re.compile(rule.pattern).groups > 0:
+						raise ValueError('capturing groups are not allowed')
+				except (re.error, ValueError) as ex:
+					log.warning("skipping invalid rule %s (%s): %s", rule.id, rule.pattern, ex)
+					continue
+
+				tmp.append(rule)
+
+			self._matchers[phase] = []
+			for i in range(0, len(tmp), GROUPS_MAX):
+				chunk = tmp[i:i+GROUPS_MAX]
+				regex = re.compile('|'.join(['(%s)' % (r.pattern,) for r in chunk]), re.MULTILINE)
+				self._matchers[phase].append((regex, chunk))
+
+		# position of each rule (lower wins)
+		self._rank = dict([(r.id, i) for (i, r) in enumerate(rules)])
+
+	def classify(self, phase, text):
+		'the first matching rule (by priority) for the phase, or None'
+
+		best = None
+		for (regex, rules) in self._matchers.get(phase, []):
+
+			# a rule may match within the match of another rule (starting earlier), so continue
+			# right after the start of each match, not after its end (as finditer would) - at
+			# each position, the alternative with the highest priority matches
+			match = regex.search(text)
+			while match:
+
+				rule = rules[match.lastindex - 1]
+
+				if (best is None) or (self._rank[rule.id] < self._rank[best.id]):
+					best = rule
+
+				match = regex.search(text, match.start() + 1)
+
+		return best
+
+	def analyze(self, result, logs):
+		'''rules matching the logs of the failed phases of a result (result is a dict phase => status,
+		logs is a dict name => text), at most one rule per phase'''
+
+		matched = []
+
+		for (phase, names) in PHASES:
+
+			if result.get(phase) != 'error':
+				continue
+
+			text = '\n'.join([logs[name] for name in names if logs.get(name)])
+
+			rule = self.classify(phase, text)
+			if rule:
+				matched.append(rule)
+
+		return matched
+
+
+def load_rules(cursor):
+	'rules from the error_rules table, in the order of priority'
+
+	cursor.execute('SELECT id, error_phase, pattern, description FROM error_rules ORDER BY priority, id')
+
+	return [Rule(r['id'], r['error_phase'], r['pattern'], r['description']) for r in cursor.fetchall()]
+
+
+def decode_logs(logs):
+	'logs (name => raw bytes) as text, ready for the classification'
+
+	return {name : value.decode('utf-8', 'replace').replace(u'\x00', '') for (name, value) in logs.items() if value is not None}
+
+
+def store(cursor, analysis, replace=True):
+	'''store the analysis (a dict result_id => list of rules), replacing the previous analysis
+	of those results (unless replace is False, e.g. for new results)'''
+
+	if not analysis:
+		return
+
+	if replace:
+		cursor.execute('DELETE FROM error_analysis WHERE result_id = ANY(%(ids)s)', {'ids' : analysis.keys()})
+
+	rows = [(result_id, rule.phase, rule.description, rule.id) for (result_id, rules) in analysis.items() for rule in rules]
+
+	if rows:
+		psycopg2.extras.execute_values(cursor, 'INSERT INTO error_analysis (result_id, error_phase, description, rule_id) VALUES %s',
+									   rows, page_size=len(rows))
+
+
+class CachedClassifier(object):
+	'classifier built from the rules in the database, reloaded after ttl seconds'
+
+	def __init__(self, ttl):
+		self.ttl = ttl
+
+		self._lock = threading.Lock()
+		self._classifier = None
+		self._loaded = 0
+
+	def get(self, cursor):
+
+		with self._lock:
+			if (self._classifier is not None) and (time.time() - self._loaded < self.ttl):
+				return self._classifier
+
+		classifier = Classifier(load_rules(cursor))
+
+		with self._lock:
+			self._classifier = classifier
+			self._loaded = time.time()
+
+		return classifier
+
+# the classifier used when results are submitted
+cached = CachedClassifier(ttl=300)
+
+def init_app(config):
+	cached.ttl = config.get('ERROR_RULES_TTL', 300)
@@ -0,0 +1,92 @@
+#!/usr/bin/python
+
+# This script clusters the failures not matching any of the rules in error_rules (i.e. failed phases
+# without a row in error_analysis) - the logs are normalized, fingerprinted and similar ones are
+# grouped together. The largest clusters are stored in error_clusters (replacing the previous ones),
+# and available at /stats/errors/unclassified.
+
+import argparse
+import os
+
+import psycopg2
+import psycopg2.extras
+
+import blobs
+import fingerprint
+import generation
+
+def parse_arguments():
+
+	parser = argparse.ArgumentParser(description='PGXN Tester - clustering of unclassified errors')
+
+	parser.add_argument('--batch', dest='batch', default=1000, type=int, help='number of logs fetched at once (default: 1000)')
+	parser.add_argument('--clusters', dest='clusters', default=100, type=int, help='number of largest clusters stored, per phase (default: 100)')
+	parser.add_argument('--threshold', dest='threshold', default=0.5, type=float, help='minimum similarity of logs in a cluster (default: 0.5)')
+	parser.add_argument('--max-clusters', dest='max_clusters', default=100000, type=int, help='clusters kept in memory, per phase (default: 100000)')
+
+	parser.add_argument('--host', dest='host', default='localhost', help='DB host (default: localhost)')
+	parser.add_argument('--port', dest='port', default=5432, help='DB port (default: 5432)')
+	parser.add_argument('--db',   dest='db',   required=True, help='DB name')
+	parser.add_argument('--user', dest='user', default=os.getlogin(), help='DB user (default: %s)' % (os.getlogin(),))
+	parser.add_argument('--password', dest='password', default=None, help='DB password (default: None)')
+
+	return parser.parse_args()
+
+
+# logs of failed phases without any analysis (for the check phase, the regression diff is used)
+UNCLASSIFIED_SQL = """SELECT r.id, p.phase, b.codec, b.blob_data
+						FROM results r CROSS JOIN LATERAL (VALUES ('install', r.install_result, 'install'),
+																  ('load', r.load_result, 'load'),
+																  ('check', r.check_result, 'diff')) AS p (phase, status, log_name)
+									   JOIN result_logs l ON (l.result_id = r.id AND l.log_name = p.log_name)
+									   JOIN blobs b ON (b.hash = l.blob_hash)
+					   WHERE p.status = 'error'
+						 AND NOT EXISTS (SELECT 1 FROM error_analysis ea WHERE ea.result_id = r.id AND ea.error_phase = p.phase)"""
+
+def cluster_errors(conn, batch, threshold, max_clusters):
+	'''cluster the unclassified logs (streamed using a server-side cursor), returns clusters per
+	phase and the number of logs'''
+
+	clusters = {}
+	count = 0
+
+	rows = conn.cursor('unclassified_results', cursor_factory=psycopg2.extras.DictCursor)
+	rows.itersize = batch
+	rows.execute(UNCLASSIFIED_SQL)
+
+	for r in rows:
+
+		if r['phase'] not in clusters:
+			clusters[r['phase']] = fingerprint.Clusters(threshold=threshold, max_clusters=max_clusters)
+
+		log = blobs.decompress(r['codec'], r['blob_data']).decode('utf-8', 'replace').replace(u'\x00', '')
+
+		clusters[r['phase']].add(log, r['id'])
+		count += 1
+
+	rows.close()
+
+	return (clusters, count)
+
+if __name__ == '__main__':
+
+	args = parse_arguments()
+
+	conn = psycopg2.connect(host=args.host, port=args.port, dbname=args.db, user=args.user, password=args.password)
+
+	(clusters, count) = cluster_errors(conn, args.batch, args.threshold, args.max_clusters)
+
+	rows = [(phase, c.count, c.result_id, c.sample) for (phase, tmp) in clusters.items() for c in tmp.largest(args.clusters)]
+
+	cursor = conn.cursor()
+	cursor.execute('DELETE FROM error_clusters')
+
+	if rows:
+		psycopg2.extras.execute_values(cursor, 'INSERT INTO error_clusters (error_phase, result_count, result_id, sample) VALUES %s', rows)
+
+	conn.commit()
+
+	generation.bump(cursor, ['clusters'])
+	conn.commit()
+
+	print "CLUSTER logs=%d clusters=%d" % (count, len(rows))
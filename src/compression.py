@@ -0,0 +1,195 @@
+import hashlib
+import threading
+import zlib
+
+from functools import wraps
+from flask import request, current_app
+
+from cache import ResponseCache
+
+# brotli is optional (without it the responses are only gzipped)
+try:
+	import brotli
+except ImportError:
+	brotli = None
+
+# only responses of these types get compressed
+MIMETYPES = ['application/json', 'application/javascript', 'text/html', 'text/plain']
+
+# don't compress responses smaller than this (bytes)
+min_size = 1024
+
+# stream (instead of compressing at once and caching) responses larger than this (bytes)
+stream_size = 1024*1024
+
+# compression levels
+gzip_level = 6
+brotli_quality = 5
+
+# size of the chunks of streamed responses
+CHUNK_SIZE = 64*1024
+
+def gzip_compress(data):
+	'gzip the data in one go (wbits=31 means a gzip header)'
+
+	c = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+	return c.compress(data) + c.flush()
+
+
+def gzip_stream(data):
+	'gzip the data chunk by chunk (so the client gets the first bytes sooner)'
+
+	c = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+	for i in range(0, len(data), CHUNK_SIZE):
+		tmp = c.compress(data[i:i+CHUNK_SIZE])
+		if tmp:
+			yield tmp
+
+	yield c.flush()
+
+
+def brotli_compress(data):
+	return brotli.compress(data, quality=brotli_quality)
+
+
+def brotli_stream(data):
+
+	c = brotli.Compressor(quality=brotli_quality)
+
+	for i in range(0, len(data), CHUNK_SIZE):
+		tmp = c.process(data[i:i+CHUNK_SIZE])
+		if tmp:
+			yield tmp
+
+	yield c.finish()
+
+
+def encodings():
+	'available encodings - (name, compress, stream), the preferred ones first'
+
+	tmp = []
+
+	if brotli is not None:
+		tmp.append(('br', brotli_compress, brotli_stream))
+
+	tmp.append(('gzip', gzip_compress, gzip_stream))
+
+	return tmp
+
+
+def negotiate(accept):
+	'the encoding to use for the Accept-Encoding (the best quality, our preference on ties)'
+
+	best = None
+	best_quality = 0
+
+	for encoding in encodings():
+		quality = accept[encoding[0]]
+		if quality > best_quality:
+			(best, best_quality) = (encoding, quality)
+
+	return best
+
+
+class Stats(object):
+
+	def __init__(self):
+
+		self._lock = threading.Lock()
+
+		self.compressed = 0
+		self.streamed = 0
+		self.cached = 0
+		self.bytes_in = 0
+		self.bytes_out = 0
+
+	def record(self, counter, size_in, size_out):
+
+		with self._lock:
+			setattr(self, counter, getattr(self, counter) + 1)
+			self.bytes_in += size_in
+			self.bytes_out += size_out
+
+	def report(self):
+
+		with self._lock:
+			return {'compressed' : self.compressed, 'streamed' : self.streamed, 'cached' : self.cached,
+					'bytes_in' : self.bytes_in, 'bytes_out' : self.bytes_out}
+
+
+stats = Stats()
+
+# compressed bodies of cacheable responses, by hash of the body and encoding - keeps the popular
+# responses compressed (whatever the key or data version of the response is), None disables it
+bodies = None
+
+def init_app(config):
+
+	global min_size, stream_size, gzip_level, brotli_quality, bodies
+
+	min_size = config.get('COMPRESSION_MIN_SIZE', 1024)
+	stream_size = config.get('COMPRESSION_STREAM_SIZE', 1024*1024)
+	gzip_level = config.get('COMPRESSION_GZIP_LEVEL', 6)
+	brotli_quality = config.get('COMPRESSION_BROTLI_QUALITY', 5)
+
+	size = config.get('COMPRESSION_CACHE_SIZE', 16*1024*1024)
+	bodies = (size and ResponseCache(size)) or None
+
+
+def compressed(f):
+	'''compresses the responses (gzip or brotli, depending on Accept-Encoding) - the compressed
+	bodies of successful GET responses are cached, large responses are streamed (and needs to
+	be applied before the conditional GET decorator, which sets the ETag of the encoding)'''
+
+	@wraps(f)
+	def decorated_function(*args, **kwargs):
+
+		response = current_app.make_response(f(*args, **kwargs))
+
+		if (response.direct_passthrough) or (response.mimetype not in MIMETYPES) or ('Content-Encoding' in response.headers):
+			return response
+
+		data = response.get_data()
+		if len(data) < min_size:
+			return response
+
+		response.vary.add('Accept-Encoding')
+
+		encoding = negotiate(request.accept_encodings)
+		if encoding is None:
+			return response
+
+		(name, compress, stream) = encoding
+
+		if len(data) > stream_size:
+
+			response.response = stream(data)
+			response.headers.pop('Content-Length', None)
+
+			# the compressed size is not known here
+			stats.record('streamed', 0, 0)
+
+		else:
+
+			cacheable = (bodies is not None) and (request.method == 'GET') and (response.status_code == 200)
+
+			key = cacheable and (hashlib.sha1(data).hexdigest() + '/' + name)
+			body = cacheable and bodies.get(key, None)
+
+			if body:
+				stats.record('cached', len(data), len(body))
+			else:
+				body = compress(data)
+				stats.record('compressed', len(data), len(body))
+
+				if cacheable:
+					bodies.put(key, None, body, len(body))
+
+			response.set_data(body)
+
+		response.headers['Content-Encoding'] = name
+
+		return response
+
+	return decorated_function
@@ -0,0 +1,142 @@
+import datetime
+import hashlib
+import re
+import time
+
+from functools import wraps
+from flask import request, current_app
+
+import cache
+import generation
+import invalidation
+
+# resources that never change once created (a test result and its logs)
+IMMUTABLE = [re.compile(r'^/results/[^/]+(/logs/[^/]+)?$')]
+
+# the batch endpoint is not a result
+MUTABLE = ['/results/batch']
+
+# encodings of the responses (the ETag of each encoding gets a suffix, see the compression module)
+ENCODINGS = ['gzip', 'br']
+
+# how long clients may keep immutable resources (a year)
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+def immutable(path):
+	return (path not in MUTABLE) and any([r.match(path) for r in IMMUTABLE])
+
+
+def generation_dates(changed, now, interval):
+	'''(settled, last_modified) for the current generation, noticed by this process at 'changed'
+
+	Each process notices a new generation on its own (up to an interval late), so the time
+	a process noticed it can't be compared with dates from the other processes. But once the
+	generation is 'settled' (all processes noticed it), an If-Modified-Since from after that
+	must come from a response with the current data. Last-Modified is therefore the response
+	time until a bit after that, so that a response with older data never gets a later date.'''
+
+	settled = changed + interval + 2
+	last_modified = min(now, settled + interval)
+
+	return (datetime.datetime.utcfromtimestamp(int(settled)), datetime.datetime.utcfromtimestamp(int(last_modified)))
+
+
+def matches(etag):
+	'the ETag (of any encoding) matched by If-None-Match, or None'
+
+	for tmp in [etag] + ['%s-%s' % (etag, encoding) for encoding in ENCODINGS]:
+		if request.if_none_match.contains(tmp):
+			return tmp
+
+	return None
+
+
+def set_etag(response, etag):
+	'set the ETag (with a suffix for encoded responses, which differ from the plain ones)'
+
+	encoding = response.headers.get('Content-Encoding')
+
+	response.set_etag(encoding and ('%s-%s' % (etag, encoding)) or etag)
+
+
+def not_modified(etag, last_modified=None, cache_control=None):
+	'empty 304 response, with the validators of the resource'
+
+	response = current_app.response_class(status=304)
+	response.set_etag(etag)
+
+	if last_modified is not None:
+		response.last_modified = last_modified
+
+	if cache_control:
+		response.headers['Cache-Control'] = cache_control
+
+	return response
+
+
+def conditional(f):
+	'''adds a strong ETag and caching headers to successful GET responses, and answers
+	conditional requests with 304 - without calling the resource when possible
+
+	Immutable resources get an ETag derived from the request alone (the response never
+	changes), everything else from the data generation and the request - so a matching
+	If-None-Match is answered without running any query (If-Modified-Since too, except
+	for immutable resources, where it's compared to Last-Modified set by the resource).
+	The JSONP callback is part of the request, so this needs to wrap the JSONP decorator.'''
+
+	@wraps(f)
+	def decorated_function(*args, **kwargs):
+
+		if (request.method not in ('GET', 'HEAD')) or any([request.path.startswith(p) for p in cache.IGNORED_PATHS]):
+			return f(*args, **kwargs)
+
+		key = hashlib.sha1(cache.request_key(ignored=['_'])).hexdigest()
+
+		if immutable(request.path):
+
+			etag = 'r-' + key[:32]
+			cache_control = 'public, max-age=%d, immutable' % (IMMUTABLE_MAX_AGE,)
+
+			matched = matches(etag)
+			if matched:
+				return not_modified(matched, cache_control=cache_control)
+
+			response = current_app.make_response(f(*args, **kwargs))
+
+			if response.status_code == 200:
+				set_etag(response, etag)
+				response.headers['Cache-Control'] = cache_control
+
+				# the resource sets Last-Modified, so this also handles If-Modified-Since
+				response.make_conditional(request)
+
+			return response
+
+		current = generation.current()
+		(settled, last_modified) = generation_dates(generation.changed(), time.time(), generation.interval)
+
+		etag = 'g%d-%s' % (current, key[:32])
+		cache_control = 'no-cache'
+
+		if request.if_none_match:
+
+			matched = matches(etag)
+			if matched:
+				return not_modified(matched, last_modified, cache_control)
+
+		elif request.if_modified_since and (request.if_modified_since >= settled):
+			return not_modified(etag, last_modified, cache_control)
+
+		response = current_app.make_response(f(*args, **kwargs))
+
+		if response.status_code == 200:
+			set_etag(response, etag)
+			response.last_modified = last_modified
+			response.headers['Cache-Control'] = cache_control
+
+			# for HTTP caches in front of the API, purged by the tags (see invalidation.ban)
+			response.headers['X-Cache-Tags'] = ' '.join(invalidation.tags(request.path))
+
+		return response
+
+	return decorated_function
@@ -14,6 +14,110 @@ api = dict(
 	# PostgreSQL connection string
 	DATABASE = 'host=... user=... dbname=... port=...',
 
+	# connection pool (size it to the number of threads per worker process)
+	DATABASE_POOL_MIN = 1,
+	DATABASE_POOL_MAX = 8,
+
+	# how long to wait for a free connection (seconds), before failing the request
+	DATABASE_POOL_TIMEOUT = 30,
+
+	# recycle connections older than this (seconds, None means never)
+	DATABASE_POOL_MAX_AGE = 3600,
+
+	# check connections idle for longer than this (seconds) with a query before handing them out
+	# (the server may have closed them, e.g. on restart), None means never
+	DATABASE_POOL_IDLE_CHECK = 30,
+
+	# run the static queries as prepared statements (disable when behind pgbouncer in transaction mode)
+	DATABASE_PREPARED_STATEMENTS = True,
+
+	# streaming replicas for the read-only requests (list of connection strings, each gets a pool)
+	DATABASE_REPLICAS = [],
+
+	# how to pick a replica - 'round-robin' or 'least-busy'
+	DATABASE_REPLICA_POLICY = 'round-robin',
+
+	# send reads to the primary when a replica lags more than this (seconds, None means no limit)
+	DATABASE_REPLICA_MAX_LAG = None,
+
+	# how often to re-check the replica lag (seconds)
+	DATABASE_REPLICA_LAG_CHECK = 5,
+
+	# log queries slower than this (miliseconds, None disables the slow query log)
+	SLOW_QUERY_THRESHOLD = 500,
+
+	# add EXPLAIN (ANALYZE, BUFFERS) output to the slow query log (runs the query again!)
+	SLOW_QUERY_EXPLAIN = False,
+
+	# query latency histograms are kept for QUERY_STATS_WINDOWS windows, QUERY_STATS_WINDOW seconds each
+	QUERY_STATS_WINDOW = 300,
+	QUERY_STATS_WINDOWS = 12,
+
+	# number of results per page on /results (default, and maximum allowed by the 'limit' parameter)
+	RESULTS_PAGE_SIZE = 20,
+	RESULTS_PAGE_SIZE_MAX = 100,
+
+	# maximum number of results submitted in a single POST to /results/batch
+	RESULTS_BATCH_MAX = 500,
+
+	# how long to cache machine secrets and distribution version IDs for result submissions (seconds)
+	LOOKUP_MACHINES_TTL = 60,
+	LOOKUP_VERSIONS_TTL = 3600,
+
+	# zlib compression level for the stored blobs - logs, pg_config and env_info (1 is the fastest)
+	BLOB_COMPRESSION_LEVEL = 1,
+
+	# number of hashes of stored blobs remembered by each process (those are not sent again)
+	BLOB_KNOWN_HASHES = 100000,
+
+	# how long to use the error classification rules before loading them again (seconds)
+	ERROR_RULES_TTL = 300,
+
+	# directory of the local spool for submitted results - when set, POST /results only checks
+	# the result, appends it to the spool and returns 202, and a background writer stores the
+	# spooled results in batches (None means the results are stored directly)
+	RESULTS_SPOOL = None,
+
+	# spool segments are closed at this size (bytes), or when older than RESULTS_SPOOL_INTERVAL seconds
+	RESULTS_SPOOL_SEGMENT_SIZE = 16*1024*1024,
+	RESULTS_SPOOL_INTERVAL = 1,
+
+	# delay before fsync, so that concurrent submissions share it (seconds)
+	RESULTS_SPOOL_FSYNC_DELAY = 0.002,
+
+	# number of spooled results stored in a single transaction
+	RESULTS_SPOOL_BATCH = 500,
+
+	# memory used by the cache of GET responses, per process (bytes, 0 disables the cache)
+	RESPONSE_CACHE_SIZE = 64*1024*1024,
+
+	# how often to check the data generation, i.e. how stale a cached response may get (seconds)
+	GENERATION_CHECK_INTERVAL = 1,
+
+	# listen for notifications about changed data (a connection per process), and invalidate
+	# only the cached responses depending on the data (instead of everything on any change)
+	CACHE_INVALIDATION = True,
+
+	# HTTP cache in front of the API (e.g. varnish), receiving BAN requests with the changed
+	# tags in the X-Cache-Tags header (None means no HTTP cache to purge)
+	CACHE_PURGE_URL = None,
+
+	# responses larger than COMPRESSION_MIN_SIZE (bytes) are compressed - brotli (when the module
+	# is installed) or gzip, depending on what the client accepts, and responses over
+	# COMPRESSION_STREAM_SIZE are compressed while being sent
+	COMPRESSION_MIN_SIZE = 1024,
+	COMPRESSION_STREAM_SIZE = 1024*1024,
+	COMPRESSION_GZIP_LEVEL = 6,
+	COMPRESSION_BROTLI_QUALITY = 5,
+
+	# memory for compressed bodies of the responses, so that the popular ones are not compressed
+	# over and over (bytes, per process, 0 disables it)
+	COMPRESSION_CACHE_SIZE = 16*1024*1024,
+
+	# directory with JSON snapshots of the stats, written by refresh-views.py --snapshots (needs
+	# to be the same directory), None means the stats are computed on each request
+	STATS_SNAPSHOTS = None,
+
 )
 
 # configuration for the UI
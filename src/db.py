@@ -1,24 +1,535 @@
+import re
+import threading
+import time
+
 import psycopg2
+import psycopg2.errorcodes
+import psycopg2.extensions
 import psycopg2.extras
 import psycopg2.pool
 
+import profiling
+
+
+class PoolTimeout(psycopg2.pool.PoolError):
+	'no connection became available within the acquire timeout'
+	pass
+
+
+class PooledConnection(psycopg2.extensions.connection):
+	'connection remembering when it was opened (so that old ones get recycled)'
+
+	def __init__(self, *args, **kwargs):
+		super(PooledConnection, self).__init__(*args, **kwargs)
+		self.created = time.time()
+
+		# when the connection was last returned to the pool
+		self.returned = self.created
+
+		# names of statements already prepared on this connection
+		self.prepared = set()
+
+
+class Statement(object):
+	'''static SQL statement, executed as a server-side prepared statement
+	(PREPARE on the first use on each connection, then EXECUTE by name)'''
+
+	# all the statements, by name (the names need to be unique)
+	registry = {}
+
+	def __init__(self, name, sql):
+
+		if name in Statement.registry:
+			raise ValueError("statement '%s' already defined" % (name,))
+
+		Statement.registry[name] = self
+
+		self.name = name
+		self.sql = sql
+
+		# translate the %(name)s placeholders to $1, $2, ... (a parameter may be used repeatedly)
+		self.params = []
+
+		def placeholder(match):
+
+			if match.group(0) == '%%':
+				return '%'
+
+			if match.group(1) not in self.params:
+				self.params.append(match.group(1))
+
+			return '$%d' % (self.params.index(match.group(1)) + 1,)
+
+		self.prepare_sql = 'PREPARE %s AS %s' % (name, re.sub(r'%\((\w+)\)s|%%', placeholder, sql))
+
+		if self.params:
+			self.execute_sql = 'EXECUTE %s (%s)' % (name, ', '.join(['%s'] * len(self.params)))
+		else:
+			self.execute_sql = 'EXECUTE %s' % (name,)
+
+	def arguments(self, vars):
+		'positional arguments for the EXECUTE'
+
+		return [vars[p] for p in self.params]
+
+	def __str__(self):
+		return self.sql
+
+
+class Cursor(psycopg2.extras.RealDictCursor):
+	'''cursor running Statement instances as prepared statements (other queries are executed
+	as usual), and timing all the queries (see the profiling module)'''
+
+	def execute(self, query, vars=None, name='adhoc'):
+		'execute the query (name identifies queries other than a Statement in the stats, e.g. dynamic ones)'
+
+		if not isinstance(query, Statement):
+			return self._timed(name, query, vars)
+
+		# not a pooled connection, or disabled prepared statements (e.g. behind pgbouncer) => plain query
+		prepared = getattr(self.connection, 'prepared', None)
+		if (prepared is None) or (not DB._prepared):
+			return self._timed(query.name, query.sql, vars)
+
+		try:
+
+			if query.name not in prepared:
+				super(Cursor, self).execute(query.prepare_sql)
+				prepared.add(query.name)
+
+			return self._timed(query.name, query.execute_sql, query.arguments(vars))
+
+		except psycopg2.ProgrammingError as ex:
+
+			# the statement disappeared (e.g. DISCARD ALL on the session) - in a read-only transaction
+			# we can simply start over, otherwise we'd silently lose the changes done so far
+			if (ex.pgcode != psycopg2.errorcodes.INVALID_SQL_STATEMENT_NAME) or (not self.connection.readonly):
+				raise
+
+			self.connection.rollback()
+			prepared.clear()
+
+			super(Cursor, self).execute(query.prepare_sql)
+			prepared.add(query.name)
+
+			return self._timed(query.name, query.execute_sql, query.arguments(vars))
+
+	def _timed(self, name, query, vars):
+		'execute the query, and record how long it took'
+
+		start = time.time()
+
+		result = super(Cursor, self).execute(query, vars)
+
+		profiling.record(self.connection, name, query, vars, 1000.0 * (time.time() - start))
+
+		return result
+
+
+class Pool(object):
+	'''thread-safe connection pool - requests over maxconn wait in a queue
+	(up to the timeout) instead of failing right away, connections found
+	dead or older than max_age are discarded on checkout (connections idle
+	for more than idle_check seconds are probed with a query first)'''
+
+	def __init__(self, connstr, minconn=1, maxconn=2, timeout=30, max_age=None, idle_check=None):
+
+		self._connstr = connstr
+		self._minconn = minconn
+		self._maxconn = maxconn
+		self._timeout = timeout
+		self._max_age = max_age
+		self._idle_check = idle_check
+
+		self._lock = threading.Condition()
+
+		# idle connections (LIFO, so that the recently used ones get reused)
+		self._idle = []
+
+		# number of open connections (both idle and checked out)
+		self._open = 0
+
+		# counters reported by stats()
+		self._in_use = 0
+		self._waiting = 0
+		self._acquired = 0
+		self._timeouts = 0
+		self._discarded = 0
+		self._acquire_time = 0.0
+		self._acquire_max = 0.0
+
+		for i in range(self._minconn):
+			self._idle.append(self._connect())
+			self._open += 1
+
+	def _connect(self):
+		'open a new connection'
+
+		return psycopg2.connect(self._connstr, connection_factory=PooledConnection)
+
+	def _discard(self, conn):
+		'close the connection and forget about it (must be called with the lock held)'
+
+		try:
+			conn.close()
+		except psycopg2.Error:
+			pass
+
+		self._open -= 1
+		self._discarded += 1
+
+	def _is_usable(self, conn):
+		'check that the connection is alive and not too old'
+
+		if conn.closed:
+			return False
+
+		if conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+			return False
+
+		if self._max_age and (time.time() - conn.created > self._max_age):
+			return False
+
+		return True
+
+	def _probe(self, conn):
+		'''check that a connection idle for a while still works (the server may have closed it,
+		e.g. after a restart or failover, which the client only notices on the next query)'''
+
+		if (self._idle_check is None) or (time.time() - conn.returned <= self._idle_check):
+			return True
+
+		try:
+			cursor = conn.cursor()
+			cursor.execute('SELECT 1')
+			cursor.close()
+			conn.rollback()
+		except psycopg2.OperationalError:
+			return False
+
+		return True
+
+	def getconn(self):
+		'get a connection from the pool, waiting for up to timeout seconds'
+
+		start = time.time()
+
+		while True:
+
+			conn = self._getconn(start)
+
+			# probe without holding the lock (a dead server may take a while to respond)
+			if self._probe(conn):
+				return conn
+
+			with self._lock:
+				self._in_use -= 1
+				self._discard(conn)
+				self._lock.notify()
+
+	def _getconn(self, start):
+		'get an idle connection (or open a new one), waiting for the rest of the timeout'
+
+		with self._lock:
+
+			self._waiting += 1
+
+			try:
+
+				while True:
+
+					# reuse an idle connection (if there's a valid one)
+					while self._idle:
+						conn = self._idle.pop()
+						if self._is_usable(conn):
+							return self._checkout(conn, start)
+						self._discard(conn)
+
+					# or reserve a slot for a new one, if still under the limit
+					if self._open < self._maxconn:
+						self._open += 1
+						break
+
+					# otherwise wait for someone to return a connection
+					remaining = None
+					if self._timeout is not None:
+						remaining = self._timeout - (time.time() - start)
+						if remaining <= 0:
+							self._timeouts += 1
+							raise PoolTimeout("no connection available in %s seconds" % (self._timeout,))
+
+					self._lock.wait(remaining)
+
+			finally:
+				self._waiting -= 1
+
+		# open the connection without holding the lock (this may take a while)
+		try:
+			conn = self._connect()
+		except:
+			with self._lock:
+				self._open -= 1
+				self._lock.notify()
+			raise
+
+		with self._lock:
+			return self._checkout(conn, start)
+
+	def _checkout(self, conn, start):
+		'update the counters when handing out a connection (lock held)'
+
+		elapsed = time.time() - start
+
+		self._in_use += 1
+		self._acquired += 1
+		self._acquire_time += elapsed
+		self._acquire_max = max(self._acquire_max, elapsed)
+
+		return conn
+
+	def putconn(self, conn):
+		'return the connection back to the pool (and wake up one of the waiters)'
+
+		with self._lock:
+
+			self._in_use -= 1
+
+			# terminate whatever transaction is still open, so that we don't hand out dirty connections
+			if not conn.closed:
+				try:
+					if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+						conn.rollback()
+				except psycopg2.Error:
+					pass
+
+			if self._is_usable(conn) and len(self._idle) < self._maxconn:
+				conn.returned = time.time()
+				self._idle.append(conn)
+			else:
+				self._discard(conn)
+
+			self._lock.notify()
+
+	def busy(self):
+		'number of connections in use plus requests waiting for one'
+
+		with self._lock:
+			return self._in_use + self._waiting
+
+	def closeall(self):
+		'close all idle connections (connections in use are closed when returned)'
+
+		with self._lock:
+			while self._idle:
+				self._discard(self._idle.pop())
+
+	def stats(self):
+		'snapshot of the pool counters'
+
+		with self._lock:
+			return {
+				'min' : self._minconn,
+				'max' : self._maxconn,
+				'open' : self._open,
+				'idle' : len(self._idle),
+				'in_use' : self._in_use,
+				'waiting' : self._waiting,
+				'acquired' : self._acquired,
+				'timeouts' : self._timeouts,
+				'discarded' : self._discarded,
+				'acquire_avg_ms' : (self._acquired and (1000.0 * self._acquire_time / self._acquired) or 0.0),
+				'acquire_max_ms' : 1000.0 * self._acquire_max,
+			}
+
+
+class ReplicaSet(object):
+	'''pools for streaming replicas, serving the read-only contexts - picks a replica
+	using the policy (round-robin or least-busy), and skips replicas lagging more than
+	max_lag seconds behind the primary (when none is usable, reads go to the primary)'''
+
+	# replay lag in seconds (zero when the replica replayed everything it received) - the xlog
+	# functions were renamed to wal in PostgreSQL 10
+	_lag_sql = """SELECT CASE WHEN pg_last_%(wal)s_receive_%(lsn)s() = pg_last_%(wal)s_replay_%(lsn)s() THEN 0
+						ELSE EXTRACT(epoch FROM now() - pg_last_xact_replay_timestamp()) END AS lag"""
+
+	def __init__(self, pools, policy='round-robin', max_lag=None, lag_check_interval=5):
+
+		if policy not in ('round-robin', 'least-busy'):
+			raise ValueError("unknown replica policy '%s'" % (policy,))
+
+		self._pools = pools
+		self._policy = policy
+		self._max_lag = max_lag
+		self._lag_check_interval = lag_check_interval
+
+		self._lock = threading.Lock()
+		self._next = 0
+
+		# last measured lag (None means unknown / failed) and when it was measured
+		self._lag = [None] * len(pools)
+		self._lag_checked = [0] * len(pools)
+		self._lag_checking = [False] * len(pools)
+
+		# when connecting to the replica last failed (it's skipped for lag_check_interval seconds)
+		self._failed = [0] * len(pools)
+
+	def _measure_lag(self, pool):
+		'query the replica for the current replay lag'
+
+		conn = pool.getconn()
+		try:
+			if conn.server_version >= 100000:
+				sql = ReplicaSet._lag_sql % {'wal' : 'wal', 'lsn' : 'lsn'}
+			else:
+				sql = ReplicaSet._lag_sql % {'wal' : 'xlog', 'lsn' : 'location'}
+
+			cursor = conn.cursor()
+			cursor.execute(sql)
+			return float(cursor.fetchone()[0] or 0)
+		finally:
+			pool.putconn(conn)
+
+	def _is_current(self, idx):
+		'check the replica lag is within the limit (re-measured at most every lag_check_interval seconds)'
+
+		if time.time() - self._failed[idx] < self._lag_check_interval:
+			return False
+
+		if self._max_lag is None:
+			return True
+
+		with self._lock:
+			measure = (not self._lag_checking[idx]) and (time.time() - self._lag_checked[idx] > self._lag_check_interval)
+			if measure:
+				self._lag_checking[idx] = True
+
+		# only a single thread measures the lag, the others use the last known value
+		if measure:
+
+			try:
+				lag = self._measure_lag(self._pools[idx])
+			except (psycopg2.Error, psycopg2.pool.PoolError):
+				lag = None
+
+			with self._lock:
+				self._lag[idx] = lag
+				self._lag_checked[idx] = time.time()
+				self._lag_checking[idx] = False
+
+		lag = self._lag[idx]
+
+		return (lag is not None) and (lag <= self._max_lag)
+
+	def choose(self):
+		'pick a replica pool for a read-only context (None means use the primary)'
+
+		if self._policy == 'least-busy':
+			order = sorted(range(len(self._pools)), key=lambda i: self._pools[i].busy())
+		else:
+			with self._lock:
+				start = self._next
+				self._next = (self._next + 1) % len(self._pools)
+			order = [(start + i) % len(self._pools) for i in range(len(self._pools))]
+
+		for idx in order:
+			if self._is_current(idx):
+				return self._pools[idx]
+
+		return None
+
+	def failed(self, pool):
+		'connecting to the replica failed, so skip it for a while'
+
+		with self._lock:
+			self._failed[self._pools.index(pool)] = time.time()
+
+	def stats(self):
+		return [dict(p.stats(), lag=l, failed=(time.time() - f < self._lag_check_interval))
+				for (p, l, f) in zip(self._pools, self._lag, self._failed)]
+
 
 class DB(object):
 	'database context manager'
 
 	_pool = None
 
+	# replicas for read-only contexts (None means everything goes to the primary)
+	_replicas = None
+
+	# use server-side prepared statements for Statement queries
+	_prepared = True
+
+	@classmethod
+	def init_pool(cls, connstr, minconn=1, maxconn=2, timeout=30, max_age=None, idle_check=None, prepared=True):
+		DB._pool = Pool(connstr, minconn=minconn, maxconn=maxconn, timeout=timeout, max_age=max_age, idle_check=idle_check)
+		DB._prepared = prepared
+
+	@classmethod
+	def init_app(cls, config):
+		'initialize the pools using the application config (DATABASE_* keys)'
+
+		DB.init_pool(config['DATABASE'],
+					 minconn=config.get('DATABASE_POOL_MIN', 1),
+					 maxconn=config.get('DATABASE_POOL_MAX', 2),
+					 timeout=config.get('DATABASE_POOL_TIMEOUT', 30),
+					 max_age=config.get('DATABASE_POOL_MAX_AGE'),
+					 idle_check=config.get('DATABASE_POOL_IDLE_CHECK'),
+					 prepared=config.get('DATABASE_PREPARED_STATEMENTS', True))
+
+		DB.init_replicas(config.get('DATABASE_REPLICAS', []),
+						 policy=config.get('DATABASE_REPLICA_POLICY', 'round-robin'),
+						 max_lag=config.get('DATABASE_REPLICA_MAX_LAG'),
+						 lag_check_interval=config.get('DATABASE_REPLICA_LAG_CHECK', 5),
+						 minconn=config.get('DATABASE_POOL_MIN', 1),
+						 maxconn=config.get('DATABASE_POOL_MAX', 2),
+						 timeout=config.get('DATABASE_POOL_TIMEOUT', 30),
+						 max_age=config.get('DATABASE_POOL_MAX_AGE'),
+						 idle_check=config.get('DATABASE_POOL_IDLE_CHECK'))
+
 	@classmethod
-	def init_pool(cls, connstr):
-		DB._pool = psycopg2.pool.ThreadedConnectionPool(1, 2, connstr)
+	def init_replicas(cls, connstrs, policy='round-robin', max_lag=None, lag_check_interval=5, **pool_options):
+		'create a pool for each replica (read-only contexts get routed there)'
+
+		if not connstrs:
+			DB._replicas = None
+			return
+
+		# the replica pools connect lazily, so that a replica that is down does not prevent the
+		# startup (it's marked as failed on the first attempt, and the reads go elsewhere)
+		pool_options['minconn'] = 0
+
+		DB._replicas = ReplicaSet([Pool(c, **pool_options) for c in connstrs],
+								  policy=policy, max_lag=max_lag, lag_check_interval=lag_check_interval)
+
+	@classmethod
+	def pool_stats(cls):
+		return {'primary' : DB._pool.stats(), 'replicas' : (DB._replicas and DB._replicas.stats() or [])}
 
 	def __init__(self, readonly=True):
 		self._readonly = readonly
 
 	def __enter__(self):
-		self._connection = DB._pool.getconn()
+
+		# writes always go to the primary, reads to a replica (if there's a current one)
+		self._pool = DB._pool
+		if self._readonly and DB._replicas:
+			self._pool = DB._replicas.choose() or DB._pool
+
+		try:
+			self._connection = self._pool.getconn()
+		except psycopg2.OperationalError:
+
+			# unreachable replica, fall back to the primary
+			if self._pool is DB._pool:
+				raise
+
+			DB._replicas.failed(self._pool)
+
+			self._pool = DB._pool
+			self._connection = self._pool.getconn()
+
 		self._connection.set_session(readonly=self._readonly, autocommit=False)
-		self._cursor = self._connection.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+		self._cursor = self._connection.cursor(cursor_factory=Cursor)
 		return (self._connection, self._cursor)
 
 	def __exit__(self, type, value, traceback):
@@ -31,4 +542,4 @@ class DB(object):
 			# FIXME handle the exception properly
 			pass
 
-		DB._pool.putconn(self._connection)
\ No newline at end of file
+		self._pool.putconn(self._connection)
@@ -0,0 +1,56 @@
+import flask
+from flask.ext.restful import Resource, abort, reqparse
+
+from db import DB
+import cache
+import compression
+import invalidation
+import profiling
+import spool
+
+class Pool(Resource):
+	'counters of the database connection pool (in use, waiting, acquire latency, timeouts)'
+
+	def get(self):
+
+		return DB.pool_stats()
+
+class Queries(Resource):
+	'query latency statistics per endpoint and statement (most expensive first)'
+
+	def get(self):
+
+		return profiling.stats.report()
+
+class Spool(Resource):
+	'state of the local result spool (pending segments, stored / rejected results, failures)'
+
+	def get(self):
+
+		if spool.writer is None:
+			abort(404, message="result spool not enabled")
+
+		return spool.writer.stats()
+
+class Cache(Resource):
+	'counters of the response cache (entries, size, hits / misses / evictions) and of the invalidation listener'
+
+	def get(self):
+
+		if cache.responses is None:
+			abort(404, message="response cache not enabled")
+
+		stats = cache.responses.stats()
+		stats['listener'] = (invalidation.listener and invalidation.listener.stats() or None)
+
+		return stats
+
+class Compression(Resource):
+	'counters of the response compression (compressed / streamed / cached bodies, bytes)'
+
+	def get(self):
+
+		stats = compression.stats.report()
+		stats['cache'] = (compression.bodies and compression.bodies.stats() or None)
+
+		return stats
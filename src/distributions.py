@@ -17,7 +17,7 @@ def result_parser():
 
 	return result_parser
 
-from db import DB
+from db import DB, Statement
 from utils import verify_signature, extract_prereqs
 import uuid
 
@@ -52,7 +52,7 @@ class DistributionList(Resource):
 		with DB() as (conn, cursor):
 
 			# list distributions, along with info about author
-			cursor.execute(sql, params)
+			cursor.execute(sql, params, name='distribution_list')
 			tmp = cursor.fetchall()
 
 		distributions = []
@@ -67,23 +67,23 @@ class DistributionList(Resource):
 class Distribution(Resource):
 
 	# basic distribution info
-	info_sql = """SELECT user_name AS user, dist_name AS name
+	info_sql = Statement('distribution_info', """SELECT user_name AS user, dist_name AS name
 					FROM distributions d JOIN users u ON (d.user_id = u.id)
-					WHERE dist_name = %(name)s"""
+					WHERE dist_name = %(name)s""")
 
 	# list of versions for the distribution
-	versions_sql = """SELECT version_number AS version, isodate(version_date) AS date, version_status AS status, version_meta AS meta,
+	versions_sql = Statement('distribution_versions', """SELECT version_number AS version, isodate(version_date) AS date, version_status AS status, version_meta AS meta,
 							 install_ok, install_error, load_ok, load_error, check_ok, check_error, check_missing
 						FROM distributions d JOIN distribution_versions v ON (d.id = v.dist_id)
 											 LEFT JOIN results_version rv ON (v.id = rv.dist_version_id)
-						WHERE dist_name = %(name)s ORDER BY version_date DESC"""
+						WHERE dist_name = %(name)s ORDER BY version_date DESC""")
 
 	# summary of distribution results (last result for each status)
-	summary_sql = """SELECT version_status,
+	summary_sql = Statement('distribution_summary', """SELECT version_status,
 							install_ok, install_error, load_ok, load_error, check_ok, check_error, check_missing
 						FROM distributions d JOIN users u ON (d.user_id = u.id)
 											 LEFT JOIN results_distribution_status rd ON (rd.dist_id = d.id)
-						WHERE dist_name = %(name)s"""
+						WHERE dist_name = %(name)s""")
 
 	def get(self, name):
 		'get info about distribution, along with info about author'
@@ -150,23 +150,23 @@ class Version(Resource):
 	'info about a distribution version'
 
 	# basic version info
-	info_sql = """SELECT user_name AS user, dist_name AS name, version_number AS version, isodate(version_date) AS date, version_status AS status, version_meta AS meta
+	info_sql = Statement('version_info', """SELECT user_name AS user, dist_name AS name, version_number AS version, isodate(version_date) AS date, version_status AS status, version_meta AS meta
 					FROM distributions d JOIN users u ON (d.user_id = u.id)
 										 JOIN distribution_versions v ON (d.id = v.dist_id)
-					WHERE dist_name = %(name)s AND version_number = %(version)s"""
+					WHERE dist_name = %(name)s AND version_number = %(version)s""")
 
-	stats_sql = """SELECT r.result_uuid, m.name AS machine, vd.pg_version, isodate(submit_date) AS date, install, load, "check"
+	stats_sql = Statement('version_stats', """SELECT r.result_uuid, m.name AS machine, vd.pg_version, isodate(submit_date) AS date, install, load, "check"
 					FROM results_version_details vd JOIN results r ON (r.id = vd.result_id)
 													JOIN distribution_versions dv ON (r.dist_version_id = dv.id)
 													JOIN distributions d ON (dv.dist_id = d.id)
 													JOIN machines m ON (r.machine_id = m.id)
 					WHERE dist_name = %(name)s AND version_number = %(version)s
-					ORDER BY m.name, pg_version DESC"""
+					ORDER BY m.name, pg_version DESC""")
 
-	summary_sql = """SELECT install_ok, install_error, load_ok, load_error, check_ok, check_error, check_missing
+	summary_sql = Statement('version_summary', """SELECT install_ok, install_error, load_ok, load_error, check_ok, check_error, check_missing
 						FROM results_version rv JOIN distribution_versions dv ON (rv.dist_version_id = dv.id)
 												JOIN distributions d ON (dv.dist_id = d.id)
-					WHERE dist_name = %(name)s AND version_number = %(version)s"""
+					WHERE dist_name = %(name)s AND version_number = %(version)s""")
 
 	def get(self, name, version):
 		'get info about distribution, along with info about author'
@@ -0,0 +1,154 @@
+import random
+import re
+import zlib
+
+# only the end of a log is fingerprinted (that's where the errors are)
+LINES_MAX = 200
+
+# parts of the logs specific to the machine / build, replaced by placeholders
+NORMALIZE = [
+	(re.compile(r'0x[0-9a-fA-F]+'), 'ADDR'),
+	(re.compile(r'(?:[A-Za-z]:)?(?:[\w.+-]*/)+[\w.+-]*'), 'PATH'),
+	(re.compile(r'\b\d+\b'), 'N'),
+	(re.compile(r'[ \t]+'), ' '),
+]
+
+def normalize(text):
+	'the (last lines of the) log with paths, line numbers, addresses etc. replaced by placeholders'
+
+	lines = text.splitlines()[-LINES_MAX:]
+
+	result = []
+	for line in lines:
+
+		for (regex, placeholder) in NORMALIZE:
+			line = regex.sub(placeholder, line)
+
+		line = line.strip()
+		if line:
+			result.append(line)
+
+	return result
+
+
+def shingles(lines, size=3):
+	'hashes of the word n-grams of the normalized log'
+
+	words = ' '.join(lines).encode('utf-8').split()
+
+	if len(words) < size:
+		return set([zlib.crc32(' '.join(words)) & 0xffffffff])
+
+	return set([zlib.crc32(' '.join(words[i:i+size])) & 0xffffffff for i in range(len(words) - size + 1)])
+
+
+# prime larger than the hashes, and random (but fixed) parameters of the permutations
+PRIME = 4294967311
+
+_random = random.Random(42)
+PERMUTATIONS = [(_random.randint(1, PRIME - 1), _random.randint(0, PRIME - 1)) for i in range(64)]
+
+def minhash(hashes):
+	'MinHash signature of the set of shingle hashes'
+
+	return tuple([min([(a * h + b) % PRIME for h in hashes]) for (a, b) in PERMUTATIONS])
+
+
+def similarity(a, b):
+	'estimated Jaccard similarity of the sets with the two signatures'
+
+	return sum([1 for (x, y) in zip(a, b) if x == y]) / float(len(a))
+
+
+class Cluster(object):
+
+	def __init__(self, signature, result_id, sample, tick=0):
+		self.signature = signature
+		self.result_id = result_id
+		self.sample = sample
+		self.count = 1
+
+		# when the cluster last grew (see Clusters.prune)
+		self.grown = tick
+
+
+class Clusters(object):
+	'''greedy clustering of similar logs using LSH on the MinHash signatures - a log joins the
+	most similar cluster found in the LSH buckets (if similar enough), or starts a new one with
+	the log as a representative; only the clusters are kept in memory, not the logs'''
+
+	def __init__(self, bands=16, threshold=0.5, max_clusters=100000):
+
+		self.bands = bands
+		self.rows = len(PERMUTATIONS) / bands
+		self.threshold = threshold
+		self.max_clusters = max_clusters
+
+		self.clusters = []
+		self._buckets = {}
+
+		# number of logs added so far
+		self._tick = 0
+
+	def _keys(self, signature):
+		return [(i, signature[i*self.rows:(i+1)*self.rows]) for i in range(self.bands)]
+
+	def add(self, text, result_id):
+		'add the log to a cluster (returns the cluster)'
+
+		self._tick += 1
+
+		lines = normalize(text)
+		signature = minhash(shingles(lines))
+
+		best = None
+		best_similarity = self.threshold
+		for key in self._keys(signature):
+			for cluster in self._buckets.get(key, []):
+				s = similarity(signature, cluster.signature)
+				if s >= best_similarity:
+					(best, best_similarity) = (cluster, s)
+
+		if best is not None:
+			best.count += 1
+			best.grown = self._tick
+			return best
+
+		cluster = Cluster(signature, result_id, sample(text), self._tick)
+		self.clusters.append(cluster)
+
+		for key in self._keys(signature):
+			self._buckets.setdefault(key, []).append(cluster)
+
+		if len(self.clusters) > self.max_clusters:
+			self.prune()
+
+		return cluster
+
+	def prune(self):
+		'''forget the smallest clusters (and of those the least recently grown ones), down to half
+		of max_clusters - so that the memory stays bounded, while new clusters get some time to
+		grow before the next prune'''
+
+		self.clusters = sorted(self.clusters, key=lambda c : (c.count, c.grown), reverse=True)[:self.max_clusters / 2]
+
+		self._buckets = {}
+		for cluster in self.clusters:
+			for key in self._keys(cluster.signature):
+				self._buckets.setdefault(key, []).append(cluster)
+
+	def largest(self, count=None, min_size=2):
+		'the largest clusters (with at least min_size logs)'
+
+		result = sorted([c for c in self.clusters if c.count >= min_size], key=lambda c : c.count, reverse=True)
+
+		return result[:count]
+
+
+def sample(text, lines=20):
+	'excerpt of the log - the lines mentioning errors (or the last lines, if there are none)'
+
+	tmp = text.splitlines()
+	errors = [l for l in tmp if 'error' in l.lower()]
+
+	return '\n'.join((errors or tmp)[-lines:])
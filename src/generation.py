@@ -0,0 +1,76 @@
+import json
+import threading
+import time
+
+# Data generation - a number that goes up whenever the data change (results submitted, views
+# refreshed, ...), so that anything computed from the data may be tagged with the generation
+# and thrown away once it changes. It's a sequence, so bumping it never blocks anyone.
+
+CURRENT_SQL = 'SELECT last_value FROM data_generation'
+BUMP_SQL = "SELECT nextval('data_generation')"
+NOTIFY_SQL = "SELECT pg_notify('pgxn_changes', %(payload)s)"
+
+# how often to check the current generation in the database (seconds)
+interval = 1
+
+_lock = threading.Lock()
+_current = None
+_checked = 0
+_changed = time.time()
+
+def init_app(config):
+	global interval
+	interval = config.get('GENERATION_CHECK_INTERVAL', 1)
+
+
+def current():
+	'the current generation (checked in the database at most once per interval)'
+
+	global _current, _checked, _changed
+
+	with _lock:
+		if (_current is not None) and (time.time() - _checked < interval):
+			return _current
+
+	# imported here, so that the scripts bumping the generation don't need flask
+	from db import DB
+
+	# always on the primary - on a replica, the sequence only moves in steps of 32
+	with DB(readonly=False) as (conn, cursor):
+		cursor.execute(CURRENT_SQL)
+		value = cursor.fetchone()['last_value']
+
+	with _lock:
+
+		if value != _current:
+			_changed = time.time()
+
+		_current = value
+		_checked = time.time()
+
+	return value
+
+
+def changed():
+	'''when this process noticed the current generation (other processes may notice it up to
+	one interval sooner or later)'''
+
+	with _lock:
+		return _changed
+
+
+def bump(cursor, tags=None):
+	'''increment the generation - needs to be called after the changes are committed (otherwise
+	someone might tag the old data with the new generation), optionally also notifying about
+	the changed data (tags, see the invalidation module)'''
+
+	global _checked
+
+	cursor.execute(BUMP_SQL)
+
+	if tags:
+		cursor.execute(NOTIFY_SQL, {'payload' : json.dumps(sorted(tags))})
+
+	# check the new value on the next call
+	with _lock:
+		_checked = 0
@@ -0,0 +1,235 @@
+import httplib
+import json
+import logging
+import re
+import select
+import threading
+import time
+import urlparse
+
+import psycopg2
+import psycopg2.extensions
+
+log = logging.getLogger('pgxn.invalidation')
+
+# channel the triggers (and scripts) send the notifications to - the payload is a JSON array
+# of tags identifying the changed data (see sql/create.sql)
+CHANNEL = 'pgxn_changes'
+
+# tag of everything (invalidated by any notification)
+ALL = '*'
+
+# tags of the resources - a resource is invalidated by notifications with any of the tags (the
+# named groups of the pattern are substituted into the tags), the first matching pattern wins
+RESOURCES = [
+	(re.compile(r'^/$'), []),
+	(re.compile(r'^/distributions$'), ['distributions', 'results']),
+	(re.compile(r'^/distributions/(?P<name>[^/]+)$'), ['dist:%(name)s']),
+	(re.compile(r'^/distributions/(?P<name>[^/]+)/[^/]+$'), ['dist:%(name)s', 'views']),
+	(re.compile(r'^/users$'), ['distributions', 'results']),
+	(re.compile(r'^/users/(?P<name>[^/]+)$'), ['user:%(name)s']),
+	(re.compile(r'^/machines$'), ['machines', 'results']),
+	(re.compile(r'^/machines/(?P<name>[^/]+)$'), ['machine:%(name)s']),
+	(re.compile(r'^/machines/(?P<name>[^/]+)/queue/[^/]+$'), ['machine:%(name)s', 'distributions']),
+	(re.compile(r'^/results$'), ['results']),
+	(re.compile(r'^/results/[^/]+(/logs/[^/]+)?$'), []),
+	(re.compile(r'^/stats$'), ['views', 'results']),
+	(re.compile(r'^/stats/errors/unclassified$'), ['clusters']),
+	(re.compile(r'^/stats/'), ['views']),
+]
+
+def tags(path):
+	'tags of the resource at the path (everything unknown depends on everything)'
+
+	for (regex, tmp) in RESOURCES:
+		match = regex.match(path)
+		if match:
+			return [t % match.groupdict() for t in tmp]
+
+	return [ALL]
+
+
+def parse(payload):
+	'tags from a notification payload (an invalid payload invalidates everything)'
+
+	try:
+		tmp = json.loads(payload)
+		if isinstance(tmp, list):
+			return set([unicode(t) for t in tmp])
+	except ValueError:
+		pass
+
+	log.warning("invalid notification payload: %s", payload)
+
+	return set([ALL])
+
+
+# functions called with the set of changed tags (after a reconnect, when notifications might
+# have been missed, with ALL), e.g. to invalidate the local cache or purge an HTTP cache
+hooks = []
+
+def add_hook(hook):
+	hooks.append(hook)
+
+
+def ban_regex(changed):
+	'regular expression matching X-Cache-Tags of the responses invalidated by the changed tags'
+
+	if ALL in changed:
+		return '.*'
+
+	return '(^| )(%s)( |$)' % ('|'.join([re.escape(t) for t in [ALL] + sorted(changed)]),)
+
+
+def ban(url, timeout=5):
+	'''hook purging an HTTP cache in front of the API (e.g. varnish) - sends a BAN request to
+	the url, with a regular expression matching the X-Cache-Tags header of the invalidated
+	responses in the X-Cache-Ban header'''
+
+	tmp = urlparse.urlparse(url)
+
+	def hook(changed):
+
+		conn = (tmp.scheme == 'https' and httplib.HTTPSConnection or httplib.HTTPConnection)(tmp.netloc, timeout=timeout)
+
+		try:
+			conn.request('BAN', tmp.path or '/', headers={'X-Cache-Ban' : ban_regex(changed)})
+			response = conn.getresponse()
+			response.read()
+
+			if response.status >= 400:
+				log.warning("purging %s failed: %d %s", url, response.status, response.reason)
+		finally:
+			conn.close()
+
+	return hook
+
+
+class Listener(threading.Thread):
+	'''background thread listening for the notifications (on a dedicated connection), calling
+	the hooks with the tags - notifications arriving together are handled at once'''
+
+	def __init__(self, connstr, timeout=5, max_backoff=60):
+
+		super(Listener, self).__init__(name='invalidation-listener')
+		self.daemon = True
+
+		self.connstr = connstr
+		self.timeout = timeout
+		self.max_backoff = max_backoff
+
+		# incremented on each (re)connect, anything cached before may be stale
+		self.epoch = 0
+		self.connected = False
+
+		self.notifications = 0
+		self.reconnects = 0
+		self.hook_errors = 0
+		self.last_error = None
+
+	def run(self):
+
+		backoff = 1
+		while True:
+
+			try:
+				self.listen()
+			except (psycopg2.Error, select.error) as ex:
+				log.warning("listening for notifications failed (retry in %d seconds): %s", backoff, ex)
+				self.last_error = str(ex)
+
+			# the connection worked for a while, so start with a short delay again
+			if self.connected:
+				backoff = 1
+
+			self.connected = False
+
+			time.sleep(backoff)
+			backoff = min(backoff * 2, self.max_backoff)
+
+			self.reconnects += 1
+
+	def listen(self):
+
+		conn = psycopg2.connect(self.connstr)
+
+		try:
+			conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+			conn.cursor().execute('LISTEN %s' % (CHANNEL,))
+
+			# notifications sent while not listening are lost, so throw away everything
+			self.epoch += 1
+			self.connected = True
+
+			if self.reconnects:
+				self.notify(set([ALL]))
+
+			while True:
+
+				if select.select([conn], [], [], self.timeout) == ([], [], []):
+					# check the connection is still alive
+					conn.cursor().execute('SELECT 1')
+					continue
+
+				conn.poll()
+
+				changed = set()
+				while conn.notifies:
+					changed.update(parse(conn.notifies.pop(0).payload))
+					self.notifications += 1
+
+				if changed:
+					self.notify(changed)
+		finally:
+			conn.close()
+
+	def notify(self, changed):
+
+		log.debug("data changed: %s", ', '.join(sorted(changed)))
+
+		for hook in hooks:
+			try:
+				hook(changed)
+			except Exception as ex:
+				log.exception("cache invalidation hook failed")
+				self.hook_errors += 1
+				self.last_error = str(ex)
+
+	def stats(self):
+
+		return {
+			'connected' : self.connected,
+			'epoch' : self.epoch,
+			'notifications' : self.notifications,
+			'reconnects' : self.reconnects,
+			'hook_errors' : self.hook_errors,
+			'last_error' : self.last_error,
+		}
+
+
+# the listener of this process (None when disabled)
+listener = None
+
+def version():
+	'''version of the cached data while the listener is connected (the cached data are valid
+	until invalidated by a notification), None otherwise'''
+
+	if (listener is None) or (not listener.connected):
+		return None
+
+	return ('listener', listener.epoch)
+
+
+def init_app(config):
+	'start the listener (unless CACHE_INVALIDATION is disabled), and the HTTP cache purging'
+
+	global listener
+
+	if not config.get('CACHE_INVALIDATION', True):
+		return
+
+	if config.get('CACHE_PURGE_URL'):
+		add_hook(ban(config['CACHE_PURGE_URL']))
+
+	listener = Listener(config['DATABASE'])
+	listener.start()
@@ -17,8 +17,13 @@ def support_jsonp(f):
 			callback = None
 
 		if callback:
-			content = str(callback) + '(' + str(f(*args,**kwargs).data).strip() + ')'
-			return current_app.response_class(content, mimetype='application/javascript')
+			response = f(*args,**kwargs)
+			content = str(callback) + '(' + str(response.data).strip() + ')'
+
+			# keep the validators (see the conditional module)
+			headers = [(k, v) for (k, v) in response.headers.items() if k == 'Last-Modified']
+
+			return current_app.response_class(content, mimetype='application/javascript', headers=headers)
 		else:
 			return f(*args, **kwargs)
 
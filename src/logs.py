@@ -0,0 +1,83 @@
+import psycopg2
+import psycopg2.extras
+
+import blobs
+
+# logs stored for each result (in the result_logs table), and the keys used in the API
+LOGS = [
+	('install', 'log_install'),
+	('load', 'log_load'),
+	('check', 'log_check'),
+	('diff', 'check_diff'),
+]
+
+LOG_NAMES = [name for (name, key) in LOGS]
+
+
+def parse_selector(value):
+	'''list of logs requested using the ?logs= parameter - either 'all', or a comma
+	separated list of names (raises ValueError for unknown names)'''
+
+	if value is None or value == '':
+		return []
+
+	if value == 'all':
+		return LOG_NAMES
+
+	names = [v.strip() for v in value.split(',')]
+
+	for name in names:
+		if name not in LOG_NAMES:
+			raise ValueError("unknown log '%s'" % (name,))
+
+	return names
+
+
+def add_logs(blobset, logs):
+	'add the logs (a dict name => log) to the blob set, returns a dict name => hash (skipping missing logs)'
+
+	return {name : blobset.add(logs[name]) for name in LOG_NAMES if logs.get(name) is not None}
+
+
+def log_params(hashes):
+	'arrays of names and hashes (for LOG_ROWS_SQL) from a dict name => hash'
+
+	names = [name for name in LOG_NAMES if name in hashes]
+
+	return {'log_names' : names, 'log_hashes' : [psycopg2.Binary(hashes[name]) for name in names]}
+
+# the logs as rows of result_logs (used with the arrays from log_params)
+LOG_ROWS_SQL = """SELECT * FROM unnest(%(log_names)s::text[], %(log_hashes)s::bytea[])"""
+
+
+def store_many(cursor, hashes):
+	'store logs for multiple results at once (hashes is a dict result_id => {name => hash})'
+
+	rows = []
+	for (result_id, tmp) in hashes.items():
+		for name in LOG_NAMES:
+			if name in tmp:
+				rows.append((result_id, name, psycopg2.Binary(tmp[name])))
+
+	if rows:
+		psycopg2.extras.execute_values(cursor, 'INSERT INTO result_logs (result_id, log_name, blob_hash) VALUES %s', rows, page_size=len(rows))
+
+
+def fetch(cursor, uuid, names):
+	'logs of a result (as a dict API key => text), missing logs are returned as None'
+
+	result = {key : None for (name, key) in LOGS if name in names}
+
+	if not names:
+		return result
+
+	cursor.execute("""SELECT log_name, codec, blob_data
+						FROM result_logs l JOIN results r ON (r.id = l.result_id)
+										   JOIN blobs b ON (b.hash = l.blob_hash)
+					   WHERE result_uuid = %(uuid)s AND log_name = ANY(%(names)s)""", {'uuid' : uuid, 'names' : names})
+
+	keys = dict(LOGS)
+	for r in cursor.fetchall():
+		result[keys[r['log_name']]] = blobs.decompress(r['codec'], r['blob_data']).decode('utf-8', 'replace')
+
+	return result
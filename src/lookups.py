@@ -0,0 +1,95 @@
+import threading
+import time
+
+class Lookup(object):
+	'''in-process cache of values loaded from the database - the keys missing in the cache
+	are loaded in a single query, and the cached entries expire after ttl seconds (keys not
+	found in the database are not cached, so new rows are visible immediately)'''
+
+	def __init__(self, load, ttl):
+
+		# load(cursor, keys) returns a dict (key => value) for the keys that exist
+		self._load = load
+		self.ttl = ttl
+
+		self._lock = threading.Lock()
+		self._cache = {}
+
+	def get(self, cursor, keys, refresh=False):
+		'values for the keys (a dict, keys that do not exist are omitted)'
+
+		now = time.time()
+		result = {}
+		missing = []
+
+		with self._lock:
+			for key in set(keys):
+				entry = self._cache.get(key)
+				if entry and (not refresh) and (entry[1] > now):
+					result[key] = entry[0]
+				else:
+					missing.append(key)
+
+		if missing:
+
+			loaded = self._load(cursor, missing)
+
+			with self._lock:
+				for (key, value) in loaded.items():
+					self._cache[key] = (value, now + self.ttl)
+
+			result.update(loaded)
+
+		return result
+
+	def cached(self, keys, expired=False):
+		'cached values for the keys (without accessing the database), optionally including expired entries'
+
+		now = time.time()
+
+		with self._lock:
+			entries = [(key, self._cache.get(key)) for key in set(keys)]
+
+		return {key : entry[0] for (key, entry) in entries if entry and (expired or entry[1] > now)}
+
+	def invalidate(self, key=None):
+		'forget a single key (or everything)'
+
+		with self._lock:
+			if key is None:
+				self._cache = {}
+			else:
+				self._cache.pop(key, None)
+
+
+def load_machines(cursor, names):
+	'approved and active machines, by name'
+
+	cursor.execute("SELECT id, name, secret_key FROM machines WHERE name = ANY(%(names)s) AND is_approved AND is_active", {'names' : names})
+
+	return {m['name'] : {'id' : m['id'], 'secret_key' : m['secret_key']} for m in cursor.fetchall()}
+
+
+def load_versions(cursor, keys):
+	'IDs of distribution versions, by (name, version) pairs'
+
+	cursor.execute("""SELECT v.id, dist_name, version_number
+						FROM distribution_versions v JOIN distributions d ON (d.id = v.dist_id)
+						WHERE (dist_name, version_number) IN (SELECT * FROM unnest(%(names)s::text[], %(versions)s::text[]))""",
+				   {'names' : [k[0] for k in keys], 'versions' : [k[1] for k in keys]})
+
+	return {(v['dist_name'], v['version_number']) : v['id'] for v in cursor.fetchall()}
+
+
+# machines may get disabled (or get a new secret), so don't cache them for too long
+machines = Lookup(load_machines, ttl=60)
+
+# distribution versions never change once created
+versions = Lookup(load_versions, ttl=3600)
+
+
+def init_app(config):
+	'set the expiration of the cached lookups from the application config'
+
+	machines.ttl = config.get('LOOKUP_MACHINES_TTL', 60)
+	versions.ttl = config.get('LOOKUP_VERSIONS_TTL', 3600)
@@ -1,7 +1,7 @@
 import flask
 from flask.ext.restful import Resource, abort, reqparse
 
-from db import DB
+from db import DB, Statement
 from utils import verify_signature, extract_prereqs, check_prereqs
 import uuid
 
@@ -10,7 +10,7 @@ class MachineList(Resource):
 
 	# list of machines with info about tested distributions, versions
 	# TODO add number of failures (total and for last versions)
-	list_sql = """SELECT m.name AS name, is_active, COALESCE(distributions, 0) AS distributions, COALESCE(versions, 0) AS versions, COALESCE(tests, 0) AS tests, last_test_date,
+	list_sql = Statement('machine_list', """SELECT m.name AS name, is_active, COALESCE(distributions, 0) AS distributions, COALESCE(versions, 0) AS versions, COALESCE(tests, 0) AS tests, last_test_date,
 							install_ok, install_error, load_ok, load_error, check_ok, check_error, check_missing
 					FROM machines m LEFT JOIN (
 						SELECT
@@ -27,7 +27,7 @@ class MachineList(Resource):
 							SUM(check_ok)::int AS check_ok, SUM(check_error)::int AS check_error, SUM(check_missing)::int AS check_missing
 						FROM results_machine GROUP BY 1
 					) AS stats ON (m.id = stats.machine_id)
-					ORDER BY m.name"""
+					ORDER BY m.name""")
 
 	def get(self, user=None, release=None, status=None, last=None, machine=None):
 		'list distributions, along with info about author (optional filtering)'
@@ -65,28 +65,28 @@ class Machine(Resource):
 
 	# basic user info
 	# TODO add info about extensions with failing / passing last version
-	info_sql = """SELECT m.name AS name, COALESCE(distributions, 0) AS distributions, COALESCE(versions, 0) AS versions, COALESCE(tests, 0) AS tests, is_active, m.description, last_test_date
+	info_sql = Statement('machine_info', """SELECT m.name AS name, COALESCE(distributions, 0) AS distributions, COALESCE(versions, 0) AS versions, COALESCE(tests, 0) AS tests, is_active, m.description, last_test_date
 					FROM machines m LEFT JOIN (
 						SELECT
 							machine_id,
 							COUNT(DISTINCT dist_id) AS distributions, COUNT(DISTINCT dist_version_id) AS versions, COUNT(*) AS tests,
 							isodate(MAX(submit_date)) AS last_test_date
 						FROM results r JOIN distribution_versions v ON (r.dist_version_id = v.id) JOIN distributions d ON (v.dist_id = d.id) GROUP BY 1
-					) AS s ON (m.id = s.machine_id) WHERE m.name = %(name)s"""
+					) AS s ON (m.id = s.machine_id) WHERE m.name = %(name)s""")
 
 	# list of distributions / versions already tested by this machine (only the last result)
-	results_sql = """SELECT dist_name AS name, version_number AS version, r.pg_version, rl.pg_version AS pg_version_major
+	results_sql = Statement('machine_results', """SELECT dist_name AS name, version_number AS version, r.pg_version, rl.pg_version AS pg_version_major
 							FROM results_last rl JOIN distribution_versions v ON (rl.dist_version_id = v.id)
 												 JOIN distributions d ON (v.dist_id = d.id)
 												 JOIN results r ON (r.id = rl.result_id)
 												 JOIN machines m ON (r.machine_id = m.id)
-							WHERE m.name = %(name)s"""
+							WHERE m.name = %(name)s""")
 
-	stats_sql = """SELECT
+	stats_sql = Statement('machine_stats', """SELECT
 						pg_version,
 						status,
 						install_ok, install_error, load_ok, load_error, check_ok, check_error, check_missing
-					FROM results_machine rm JOIN machines m ON (m.id = rm.machine_id) WHERE m.name = %(name)s"""
+					FROM results_machine rm JOIN machines m ON (m.id = rm.machine_id) WHERE m.name = %(name)s""")
 
 	def get(self, name):
 		'get info about distribution, along with info about author'
@@ -142,7 +142,7 @@ class Machine(Resource):
 class MachineQueue(Resource):
 
 	# list extensions not processed by a machine with a particular name
-	queue_sql = """SELECT
+	queue_sql = Statement('machine_queue', """SELECT
 						d.dist_name AS name,
 						dv.version_number AS version,
 						dv.version_meta AS meta
@@ -151,7 +151,7 @@ class MachineQueue(Resource):
 						SELECT dist_version_id
 							FROM results r JOIN machines m ON (m.id = r.machine_id)
 							WHERE m.name = %(name)s AND pg_version = %(pgversion)s)
-					ORDER BY dist_name, version_number"""
+					ORDER BY dist_name, version_number""")
 
 	def get(self, name, pgversion):
 		'get info about distribution, along with info about author'
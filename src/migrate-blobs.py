@@ -0,0 +1,88 @@
+#!/usr/bin/python
+
+# Moves the logs (the log_load, log_install, log_check and check_diff columns) and the pg_config
+# and env_info JSON values from the results table (used by older versions) to the blobs table,
+# compressing and deduplicating them on the way. Create the blobs and result_logs tables first
+# (see sql/create.sql), the old columns are dropped when all the results are moved (unless
+# --keep-columns is used).
+
+import argparse
+import os
+
+import psycopg2
+import psycopg2.extras
+
+import blobs
+import logs
+
+def parse_arguments():
+
+	parser = argparse.ArgumentParser(description='PGXN Tester - migration of logs, pg_config and env_info to blobs')
+
+	parser.add_argument('--batch', dest='batch', default=1000, type=int, help='number of results per transaction (default: 1000)')
+	parser.add_argument('--keep-columns', dest='keep', action='store_true', default=False, help='do not drop the old columns')
+
+	parser.add_argument('--host', dest='host', default='localhost', help='DB host (default: localhost)')
+	parser.add_argument('--port', dest='port', default=5432, help='DB port (default: 5432)')
+	parser.add_argument('--db',   dest='db',   required=True, help='DB name')
+	parser.add_argument('--user', dest='user', default=os.getlogin(), help='DB user (default: %s)' % (os.getlogin(),))
+	parser.add_argument('--password', dest='password', default=None, help='DB password (default: None)')
+
+	return parser.parse_args()
+
+if __name__ == '__main__':
+
+	args = parse_arguments()
+
+	conn = psycopg2.connect(host=args.host, port=args.port, dbname=args.db, user=args.user, password=args.password)
+	cursor = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+
+	# add the new columns (unless this is a restart of an interrupted migration)
+	cursor.execute("SELECT 1 FROM information_schema.columns WHERE table_name = 'results' AND column_name = 'pg_config_hash'")
+	if not cursor.fetchone():
+		cursor.execute("""ALTER TABLE results ADD COLUMN pg_config_hash BYTEA REFERENCES blobs(hash),
+											  ADD COLUMN env_info_hash BYTEA REFERENCES blobs(hash)""")
+		conn.commit()
+
+	last_id = 0
+	count = 0
+
+	# move the data in batches, each one in a separate transaction (results already moved are skipped)
+	while True:
+
+		cursor.execute("""SELECT id, pg_config::text AS config, env_info::text AS env,
+								 log_install AS install, log_load AS load, log_check AS check, check_diff AS diff
+							FROM results r
+						   WHERE id > %(last)s AND pg_config_hash IS NULL
+						   ORDER BY id LIMIT %(batch)s""", {'last' : last_id, 'batch' : args.batch})
+
+		rows = cursor.fetchall()
+
+		if not rows:
+			break
+
+		blobset = blobs.BlobSet()
+
+		hashes = [(r['id'], psycopg2.Binary(blobset.add(r['config'])), psycopg2.Binary(blobset.add(r['env']))) for r in rows]
+		log_hashes = {r['id'] : logs.add_logs(blobset, {name : r[name] for name in logs.LOG_NAMES}) for r in rows}
+
+		blobs.store(cursor, blobset)
+
+		psycopg2.extras.execute_values(cursor, """UPDATE results SET pg_config_hash = v.config, env_info_hash = v.env
+													FROM (VALUES %s) AS v (id, config, env) WHERE results.id = v.id""", hashes)
+
+		logs.store_many(cursor, log_hashes)
+
+		conn.commit()
+		blobset.stored()
+
+		last_id = rows[-1]['id']
+		count += len(rows)
+
+	if not args.keep:
+		cursor.execute("""ALTER TABLE results ALTER COLUMN pg_config_hash SET NOT NULL, ALTER COLUMN env_info_hash SET NOT NULL,
+											  DROP COLUMN pg_config, DROP COLUMN env_info,
+											  DROP COLUMN log_install, DROP COLUMN log_load, DROP COLUMN log_check, DROP COLUMN check_diff""")
+		conn.commit()
+
+	print "MIGRATE results=%d" % (count,)
@@ -3,14 +3,16 @@
 # This script performs a simple sync of users, releases and versions against the PGXN API (so we have it locally in the DB).
 
 import argparse
-import httplib
+import collections
 import json
 import os.path
+import Queue
 import re
 import shutil
 import subprocess
 import sys
 import StringIO
+import threading
 
 import psycopg2
 import psycopg2.extras
@@ -20,12 +22,21 @@ from pgxnclient.utils.semver import SemVer
 
 from datetime import datetime
 
+import generation
+import pgxn
+
 def parse_arguments():
 
 	parser = argparse.ArgumentParser(description='PGXN Sync')
 
 	parser.add_argument('-o', '--output', dest='output', default=None, metavar='FILENAME', type=str, help='JSON results file (default: results-YYYYMMDD-HHMI.json)')
 	parser.add_argument('-a', '--api', dest='api', default='api.pgxn.org', help='API root URI (default: api.pgxn.org).')
+	parser.add_argument('-m', '--mirror', dest='mirror', default=None, metavar='DIRECTORY', help='sync from a local mirror of PGXN instead of the API (e.g. rsync\'ed from master.pgxn.org)')
+	parser.add_argument('--workers', dest='workers', default=8, type=int, help='number of users fetched concurrently - threads, or processes with --mirror (default: 8)')
+	parser.add_argument('--connections', dest='connections', default=4, type=int, help='maximum number of connections (and requests in flight) to the API (default: 4)')
+	parser.add_argument('--retries', dest='retries', default=5, type=int, help='how many times to retry a failed request (default: 5)')
+	parser.add_argument('--full', dest='full', action='store_true', default=False, help='fetch all the users, even those unchanged since the last sync')
+	parser.add_argument('--batch', dest='batch', default=100, type=int, help='number of users written in a single batch (default: 100)')
 
 	parser.add_argument('--host', dest='host', default='localhost', help='DB host (default: localhost)')
 	parser.add_argument('--port', dest='port', default=5432, help='DB port (default: 5432)')
@@ -36,120 +47,182 @@ def parse_arguments():
 	return parser.parse_args()
 
 
-def get_data(conn, uri):
-	'a simple wrapper getting data for URI from an existing HTTP connection'
+# upserts of the synced entities - each inserts the new rows and updates the changed ones
+# (ON CONFLICT), and returns the ID and action for all the rows (existing unchanged rows are not
+# returned by the INSERT, so those come from the table itself)
+UPSERT_USERS_SQL = '''WITH data (user_name, full_name) AS (VALUES %s),
+							  ins AS (INSERT INTO users (user_name, full_name) SELECT * FROM data
+									  ON CONFLICT (user_name) DO UPDATE SET full_name = EXCLUDED.full_name
+									  WHERE users.full_name IS DISTINCT FROM EXCLUDED.full_name
+									  RETURNING id, user_name, (xmax = 0) AS inserted)
+						 SELECT id, user_name, (CASE WHEN inserted THEN 'inserted' ELSE 'updated' END) FROM ins
+						 UNION ALL
+						 SELECT id, user_name, 'unchanged' FROM users JOIN data USING (user_name)
+						  WHERE user_name NOT IN (SELECT user_name FROM ins)'''
 
-	# conn = httplib.HTTPConnection(host)
-	conn.request("GET", uri)
-	response = conn.getresponse().read()
+UPSERT_DISTRIBUTIONS_SQL = '''WITH data (user_id, dist_name) AS (VALUES %s),
+									  ins AS (INSERT INTO distributions (user_id, dist_name) SELECT * FROM data
+											  ON CONFLICT (dist_name) DO UPDATE SET user_id = EXCLUDED.user_id
+											  WHERE distributions.user_id IS DISTINCT FROM EXCLUDED.user_id
+											  RETURNING id, dist_name, (xmax = 0) AS inserted)
+								 SELECT id, dist_name, (CASE WHEN inserted THEN 'inserted' ELSE 'updated' END) FROM ins
+								 UNION ALL
+								 SELECT id, dist_name, 'unchanged' FROM distributions JOIN data USING (dist_name)
+								  WHERE dist_name NOT IN (SELECT dist_name FROM ins)'''
 
-	try:
-		return json.loads(response)
-	except Exception as ex:
-		return None
+UPSERT_VERSIONS_SQL = '''WITH data (dist_id, version_number, version_date, version_status, version_meta) AS (VALUES %s),
+								 ins AS (INSERT INTO distribution_versions AS v (dist_id, version_number, version_date, version_status, version_meta)
+										 SELECT * FROM data
+										 ON CONFLICT (dist_id, version_number) DO UPDATE
+											 SET version_date = EXCLUDED.version_date, version_status = EXCLUDED.version_status, version_meta = EXCLUDED.version_meta
+										   WHERE (v.version_date, v.version_status, v.version_meta::text) IS DISTINCT FROM
+												 (EXCLUDED.version_date, EXCLUDED.version_status, EXCLUDED.version_meta::text)
+										 RETURNING id, dist_id, version_number, (xmax = 0) AS inserted)
+							SELECT id, (CASE WHEN inserted THEN 'inserted' ELSE 'updated' END) FROM ins
+							UNION ALL
+							SELECT id, 'unchanged' FROM distribution_versions JOIN data USING (dist_id, version_number)
+							 WHERE (dist_id, version_number) NOT IN (SELECT dist_id, version_number FROM ins)'''
 
+UPSERT_MARKERS_SQL = '''INSERT INTO pgxn_sync_state (uri, etag, last_modified, document) VALUES %s
+						ON CONFLICT (uri) DO UPDATE SET etag = EXCLUDED.etag, last_modified = EXCLUDED.last_modified,
+														document = EXCLUDED.document, sync_time = now()'''
 
-def get_uri_templates(conn):
-	'fetches the actual URI templates from the API root'
+def upsert(cursor, sql, rows, template=None):
+	'''run one of the upserts for the rows (a dict key => row, so that each row is upserted only
+	once - ON CONFLICT can't update the same row twice), returns the result rows'''
 
-	return get_data(conn, '/index.json')
+	if not rows:
+		return []
 
+	return psycopg2.extras.execute_values(cursor, sql, rows.values(), template=template, page_size=len(rows), fetch=True)
 
-def get_users(conn, templates):
-	'loops through all the letters and collects list of all users'
 
-	users = []
-	for letter in "abcdefghijklmnopqrstuvwxyz":
-		uri = templates['userlist'].replace('{letter}', letter)
-		tmp = get_data(conn, uri)
-		if tmp is not None:
-			users.extend(tmp)
+def load_state(conn, full=False):
+	'''state of the previous syncs - markers of the fetched documents (unless doing a full
+	sync), and the versions stored already'''
 
-	return users
+	cursor = conn.cursor()
 
-def get_version_meta(conn, templates, release, version):
+	markers = {}
+	documents = {}
 
-	uri = templates['meta'].replace('{dist}', release.lower()).replace('{version}', version['version'])
-	return get_data(conn, uri)
+	if not full:
+		cursor.execute('SELECT uri, etag, last_modified, document FROM pgxn_sync_state')
+		for (uri, etag, last_modified, document) in cursor.fetchall():
+			markers[uri] = (etag, last_modified)
+			if document is not None:
+				documents[uri] = document
 
-def get_users_releases(conn, templates, user):
-	'fetches list of releases for a single user'
+	cursor.execute('SELECT dist_name, version_number FROM distributions d JOIN distribution_versions v ON (v.dist_id = d.id)')
+	versions = set([(r[0], r[1]) for r in cursor.fetchall()])
 
-	uri = templates['user'].replace('{user}', user)
-	info = get_data(conn, uri)
+	cursor.close()
 
-	return info['releases']
+	return pgxn.State(markers, documents, versions)
 
 
-def get_user_id(conn, user, name):
+def save_markers(cursor, markers):
+	'store the markers (a dict uri => (marker, document))'
 
-	try:
+	rows = dict([(uri, (uri, marker[0], marker[1], (document is not None) and json.dumps(document) or None))
+				 for (uri, (marker, document)) in markers.items() if marker])
 
-		cursor = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-		cursor.execute('SELECT id FROM users WHERE user_name = %(user)s', {'user' : user})
-		row = cursor.fetchone()
+	if rows:
+		psycopg2.extras.execute_values(cursor, UPSERT_MARKERS_SQL, rows.values(), page_size=len(rows))
 
-		if row:
-			return row['id']
 
-		cursor.execute('INSERT INTO users (user_name, full_name) VALUES (%(user)s, %(name)s)', {'user' : user, 'name' : name})
-		cursor.execute("SELECT currval('users_id_seq') AS id")
+class Writer(threading.Thread):
+	'''writes the crawled users (with releases and versions) into the database, on its own
+	thread (and connection), so that the crawler does not wait for the database - the users
+	are collected into batches, and each entity is upserted with a single statement per batch'''
 
-		row = cursor.fetchone()
+	def __init__(self, conn, batch=100):
 
-		return row['id']
+		super(Writer, self).__init__(name='sync-writer')
 
-	finally:
+		self.conn = conn
+		self.batch = batch
+		self.queue = Queue.Queue(maxsize=100)
+		self.error = None
 
-		cursor.close()
+		self.pending = []
 
+		# entity => action (inserted / updated / unchanged) => count
+		self.counts = dict([(e, collections.Counter()) for e in ('users', 'releases', 'versions')])
 
-def get_release_id(conn, uid, release):
+	def run(self):
 
-	try:
+		while True:
 
-		cursor = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-		cursor.execute('SELECT id FROM distributions WHERE dist_name = %(name)s', {'name' : release})
-		row = cursor.fetchone()
+			user = self.queue.get()
 
-		if row:
-			return row['id']
+			# keep consuming after a failure, so that the crawler does not block
+			if self.error is not None:
+				if user is None:
+					break
+				continue
 
-		cursor.execute('INSERT INTO distributions (user_id, dist_name) VALUES (%(uid)s, %(name)s)', {'name' : release, 'uid' : uid})
-		cursor.execute("SELECT currval('distributions_id_seq') AS id")
+			try:
+				if user is not None:
+					self.pending.append(user)
 
-		row = cursor.fetchone()
+				if (user is None) or (len(self.pending) >= self.batch):
+					self.write(self.pending)
+					self.pending = []
 
-		return row['id']
+			except Exception as ex:
+				self.error = ex
 
-	finally:
+			if user is None:
+				break
 
-		cursor.close()
+	def put(self, user):
+		'queue the user for writing (fails if the writer failed already)'
 
-def get_version_id(conn, rid, version, date, status, meta):
+		if self.error is not None:
+			raise self.error
 
-	try:
+		self.queue.put(user)
 
-		cursor = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-		cursor.execute('SELECT id FROM distribution_versions v WHERE dist_id = %(rid)s AND version_number = %(version)s', {'rid' : rid, 'version' : version})
-		row = cursor.fetchone()
+	def write(self, users):
+		'upsert a batch of users, with their releases and versions (and the markers)'
 
-		if row:
-			return row['id']
+		cursor = self.conn.cursor()
 
-		cursor.execute('INSERT INTO distribution_versions (dist_id, version_number, version_date, version_status, version_meta) VALUES (%(rid)s, %(version)s, %(date)s, %(status)s, %(meta)s)', {'rid' : rid, 'version' : version, 'date' : date, 'status' : status, 'meta' : meta})
-		cursor.execute("SELECT currval('distribution_versions_id_seq') AS id")
+		# the markers are stored with the data, so that a user is skipped only once stored
+		save_markers(cursor, dict([(u['uri'], (u['marker'], None)) for u in users]))
 
-		row = cursor.fetchone()
+		# ignore users with no releases
+		users = [u for u in users if u['releases']]
 
-		return row['id']
+		rows = dict([(u['user'], (u['user'], u['name'])) for u in users])
+		user_ids = {}
+		for (uid, name, action) in upsert(cursor, UPSERT_USERS_SQL, rows):
+			user_ids[name] = uid
+			self.counts['users'][action] += 1
 
-	finally:
+		rows = dict([(release, (user_ids[u['user']], release)) for u in users for release in u['releases']])
+		release_ids = {}
+		for (rid, name, action) in upsert(cursor, UPSERT_DISTRIBUTIONS_SQL, rows):
+			release_ids[name] = rid
+			self.counts['releases'][action] += 1
+
+		rows = dict([((release, v['version']), (release_ids[release], v['version'], v['date'], v['state'], json.dumps(v['meta'])))
+					 for u in users for (release, versions) in u['releases'].items() for v in versions])
+		for (vid, action) in upsert(cursor, UPSERT_VERSIONS_SQL, rows, template='(%s, %s, %s::timestamp, %s, %s::json)'):
+			self.counts['versions'][action] += 1
 
 		cursor.close()
 
-def get_spec_url(host, release, version):
-	return 'http://' + host + (templates['meta'].replace('{dist}', release).replace('{version}', version))
+		# commit each batch - the upserts lock the distributions (which the result ingestion
+		# locks too), and the markers are part of the batch, so an interrupted sync resumes
+		self.conn.commit()
+
+	def summary(self):
+		'the counts, in the format of the SYNC output line'
+
+		return ' '.join(['%s=%d/%d/%d' % (e, self.counts[e]['inserted'], self.counts[e]['updated'], self.counts[e]['unchanged'])
+						 for e in ('users', 'releases', 'versions')])
 
 if __name__ == '__main__':
 
@@ -159,55 +232,37 @@ if __name__ == '__main__':
 	# open connection to the database
 	dbconn = psycopg2.connect(host=args.host, port=args.port, dbname=args.db, user=args.user)
 
-	# open a HTTP connection to the API
-	httpconn = httplib.HTTPConnection(args.api)
+	# what the previous syncs fetched already (only changed users and new versions get fetched)
+	state = load_state(dbconn, args.full)
 
-	# now get URI templates
-	templates = get_uri_templates(httpconn)
-	users = get_users(httpconn, templates)
+	writer = Writer(dbconn, batch=args.batch)
+	writer.start()
 
-	user_count = 0
-	release_count = 0
-	version_count = 0
+	# crawl the API (or the mirror) concurrently, the writer stores the users as they arrive
+	if args.mirror:
+		client = pgxn.Mirror(args.mirror)
+		crawler = pgxn.MirrorCrawler(client, workers=args.workers, state=state)
+	else:
+		client = pgxn.Client(args.api, max_per_host=args.connections, retries=args.retries)
+		crawler = pgxn.Crawler(client, workers=args.workers, state=state)
 
-	# test the releases for each user
-	for user in users:
-
-		# fetch list of releases for the user
-		releases = get_users_releases(httpconn, templates, user['user'])
-
-		# ignore users with no releases
-		if len(releases) == 0:
-			continue
-
-		# make sure the user is in the database
-		uid = get_user_id(dbconn, user['user'], user['name'])
-
-		user_count += 1
-		release_count += len(releases)
-
-		# process all the user's releases
-		for release in releases:
-
-			rid = get_release_id(dbconn, uid, release)
-
-			versions = []
-
-			# collect versions from all three states
-			for state in ['testing', 'unstable', 'stable']:
-				if state in releases[release]:
-					versions.extend({'date' : v['date'], 'version' : v['version'], 'state' : state} for v in releases[release][state])
-
-			versions = sorted(versions, key = lambda x : x['date'], reverse=True)
-			version_count += len(versions)
+	try:
+		crawler.crawl(writer.put)
+	finally:
+		writer.queue.put(None)
+		writer.join()
+		client.close()
 
-			# process all the versions for this release
-			for version in versions:
+	if writer.error is not None:
+		raise writer.error
 
-				meta = get_version_meta(httpconn, templates, release, version)
+	# the user lists (their contents are needed even when unchanged)
+	save_markers(dbconn.cursor(), state.fetched)
 
-				vid = get_version_id(dbconn, rid, version['version'], version['date'], version['state'], json.dumps(meta))
+	dbconn.commit()
 
+	generation.bump(dbconn.cursor(), ['distributions'])
 	dbconn.commit()
 
-	print "SYNC users=%d releases=%d versions=%d" % (user_count, release_count, version_count)
\ No newline at end of file
+	# counts are inserted/updated/unchanged (users not fetched at all are in 'skipped')
+	print "SYNC %s skipped=%d requests=%d failures=%d" % (writer.summary(), crawler.unchanged, client.requests, client.failures)
@@ -0,0 +1,408 @@
+import email.utils
+import errno
+import httplib
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import urlparse
+
+from multiprocessing.pool import ThreadPool
+
+log = logging.getLogger('pgxn.sync')
+
+class HTTPError(Exception):
+	'request failed (even after the retries)'
+	pass
+
+
+class Document(object):
+	'fetched document - status, body and the validators (for conditional requests)'
+
+	def __init__(self, status, body, etag=None, last_modified=None):
+		self.status = status
+		self.body = body
+		self.etag = etag
+		self.last_modified = last_modified
+
+	@property
+	def marker(self):
+		'validators to use in the next fetch (None if the server sent none)'
+
+		if self.etag or self.last_modified:
+			return (self.etag, self.last_modified)
+
+		return None
+
+	def json(self):
+
+		try:
+			return json.loads(self.body)
+		except (TypeError, ValueError):
+			return None
+
+
+class Client(object):
+	'''HTTP client for the PGXN API - keeps the connections open (keep-alive) and reuses them,
+	at most max_per_host connections (and requests in flight) per host, failed requests are
+	retried with exponential backoff'''
+
+	def __init__(self, host, max_per_host=4, retries=5, timeout=30, backoff=1, max_backoff=30):
+
+		self.host = host
+		self.max_per_host = max_per_host
+		self.retries = retries
+		self.timeout = timeout
+		self.backoff = backoff
+		self.max_backoff = max_backoff
+
+		self._lock = threading.Lock()
+
+		# host => semaphore limiting the requests, and idle connections
+		self._limits = {}
+		self._idle = {}
+
+		self.requests = 0
+		self.failures = 0
+
+	def _slot(self, host):
+
+		with self._lock:
+			if host not in self._limits:
+				self._limits[host] = threading.BoundedSemaphore(self.max_per_host)
+				self._idle[host] = []
+
+			return self._limits[host]
+
+	def _connection(self, host):
+
+		with self._lock:
+			if self._idle[host]:
+				return self._idle[host].pop()
+
+		return httplib.HTTPConnection(host, timeout=self.timeout)
+
+	def _release(self, host, conn):
+
+		with self._lock:
+			self._idle[host].append(conn)
+
+	def request(self, uri, headers={}):
+		'''fetch the uri (a path on the default host, or an absolute URL), returns a Document
+		(with no body when the resource does not exist, or was not modified)'''
+
+		tmp = urlparse.urlparse(uri)
+		(host, path) = (tmp.netloc or self.host, tmp.path + (tmp.query and ('?' + tmp.query) or ''))
+
+		backoff = self.backoff
+		for attempt in range(self.retries + 1):
+
+			with self._slot(host):
+
+				conn = self._connection(host)
+
+				try:
+					self.requests += 1
+
+					conn.request('GET', path, headers=headers)
+					response = conn.getresponse()
+					body = response.read()
+
+				except (socket.error, httplib.HTTPException) as ex:
+
+					# the server may have closed the idle connection, so don't reuse it
+					conn.close()
+					error = str(ex)
+
+				else:
+
+					self._release(host, conn)
+
+					if response.status in (200, 304, 404):
+						return Document(response.status, (response.status == 200) and body or None,
+										response.getheader('ETag'), response.getheader('Last-Modified'))
+					elif (response.status < 500) and (response.status != 429):
+						raise HTTPError("GET %s failed: %d %s" % (uri, response.status, response.reason))
+
+					error = '%d %s' % (response.status, response.reason)
+
+			self.failures += 1
+
+			if attempt < self.retries:
+				log.warning("GET %s failed (retry in %.1f seconds): %s", uri, backoff, error)
+				time.sleep(backoff)
+				backoff = min(backoff * 2, self.max_backoff)
+
+		raise HTTPError("GET %s failed after %d attempts: %s" % (uri, self.retries + 1, error))
+
+	def get(self, uri):
+		'fetch and parse a JSON document (None when missing or not valid JSON)'
+
+		return self.request(uri).json()
+
+	def fetch(self, uri, marker=None):
+		'''fetch the uri unless it did not change since the marker (etag, last_modified) of an
+		earlier fetch - conditional request, returns a Document (status 304 when unchanged)'''
+
+		headers = {}
+
+		if marker is not None:
+			(etag, last_modified) = marker
+			if etag:
+				headers['If-None-Match'] = etag
+			if last_modified:
+				headers['If-Modified-Since'] = last_modified
+
+		return self.request(uri, headers)
+
+	def close(self):
+
+		with self._lock:
+			for conns in self._idle.values():
+				for conn in conns:
+					conn.close()
+			self._idle = dict([(h, []) for h in self._idle])
+
+
+class Mirror(object):
+	'''local mirror of PGXN (e.g. rsync'ed from master.pgxn.org) with the same interface as Client -
+	the URIs are resolved against the mirror directory, and the modification time of the file
+	serves as the marker (so unchanged files are skipped, as with conditional requests)'''
+
+	def __init__(self, root):
+
+		self.root = root
+
+		# files read (and failures, for compatibility with Client)
+		self.requests = 0
+		self.failures = 0
+
+	def _path(self, uri):
+		return os.path.join(self.root, urlparse.urlparse(uri).path.lstrip('/'))
+
+	def fetch(self, uri, marker=None):
+		'read the file (a Document with status 404 when it does not exist, 304 when not modified)'
+
+		path = self._path(uri)
+
+		try:
+			last_modified = email.utils.formatdate(os.stat(path).st_mtime, usegmt=True)
+
+			if (marker is not None) and (marker[1] == last_modified):
+				return Document(304, None, None, last_modified)
+
+			self.requests += 1
+
+			with open(path, 'rb') as f:
+				return Document(200, f.read(), None, last_modified)
+
+		except (IOError, OSError) as ex:
+			if ex.errno == errno.ENOENT:
+				return Document(404, None)
+			raise
+
+	def get(self, uri):
+		'read and parse a JSON document (None when missing or not valid JSON)'
+
+		return self.fetch(uri).json()
+
+	def close(self):
+		pass
+
+
+def expand(template, **kwargs):
+	'fill the {name} placeholders of an URI template'
+
+	for (name, value) in kwargs.items():
+		template = template.replace('{%s}' % (name,), value)
+
+	return template
+
+
+def release_versions(releases, release):
+	'versions of the release from all three states, newest first'
+
+	versions = []
+
+	for state in ['testing', 'unstable', 'stable']:
+		if state in releases[release]:
+			versions.extend({'date' : v['date'], 'version' : v['version'], 'state' : state} for v in releases[release][state])
+
+	return sorted(versions, key = lambda x : x['date'], reverse=True)
+
+
+class State(object):
+	'''what the previous syncs fetched already - the validators of the documents (and the
+	contents of those needed even when unchanged, i.e. the user lists), and the versions
+	already stored (release, version) - plus the documents fetched by this sync'''
+
+	def __init__(self, markers=None, documents=None, versions=None):
+
+		self.markers = markers or {}
+		self.documents = documents or {}
+		self.versions = versions or set()
+
+		# uri => (marker, document) fetched in this sync
+		self._lock = threading.Lock()
+		self.fetched = {}
+
+	def marker(self, uri):
+		return self.markers.get(uri)
+
+	def fetched_document(self, uri, marker, document=None):
+		'remember the document fetched in this sync (to be stored along with the data)'
+
+		with self._lock:
+			self.fetched[uri] = (marker, document)
+
+
+class Crawler(object):
+	'''fetches users, their releases and the META documents of new versions concurrently (using
+	a pool of worker threads) - the users are handled by the workers independently, and each
+	user that changed since the last sync is passed to the callback (in the calling thread)
+
+	Documents fetched by earlier syncs (see State) are requested conditionally, so unchanged
+	users cost a single 304 response, and META is fetched only for versions not stored yet.'''
+
+	def __init__(self, client, workers=8, state=None):
+
+		self.client = client
+		self.workers = workers
+		self.state = state or State()
+
+		self.templates = None
+
+		self.unchanged = 0
+
+	def userlist(self, uri):
+		'users from a single user list (the previous contents when not modified)'
+
+		marker = (uri in self.state.documents) and self.state.marker(uri) or None
+
+		doc = self.client.fetch(uri, marker)
+
+		if doc.status == 304:
+			return self.state.documents[uri]
+
+		users = doc.json()
+
+		if (users is not None) and doc.marker:
+			self.state.fetched_document(uri, doc.marker, users)
+
+		return users
+
+	def userlists(self):
+		'URIs of the user lists (one per first letter of the name)'
+
+		return [expand(self.templates['userlist'], letter=letter) for letter in 'abcdefghijklmnopqrstuvwxyz']
+
+	def users(self, pool):
+		'all the users (from all the user lists)'
+
+		users = []
+		for tmp in pool.imap_unordered(self.userlist, self.userlists()):
+			if tmp is not None:
+				users.extend(tmp)
+
+		return users
+
+	def user(self, user):
+		'''releases of the user, with the META of each new version - returns a dict with the user
+		info, {release => list of new versions} and the marker of the user document (to be stored
+		with the data), or None when the user did not change since the last sync'''
+
+		uri = expand(self.templates['user'], user=user['user'])
+
+		doc = self.client.fetch(uri, self.state.marker(uri))
+
+		if doc.status == 304:
+			return None
+
+		info = doc.json()
+
+		releases = {}
+		for release in ((info and info.get('releases')) or {}):
+
+			versions = [v for v in release_versions(info['releases'], release) if (release, v['version']) not in self.state.versions]
+
+			for version in versions:
+				version['meta'] = self.client.get(expand(self.templates['meta'], dist=release.lower(), version=version['version']))
+
+			releases[release] = versions
+
+		return {'user' : user['user'], 'name' : user['name'], 'releases' : releases, 'uri' : uri, 'marker' : doc.marker}
+
+	def crawl(self, callback):
+		'crawl the whole API, calling callback(user) for each changed user'
+
+		self.templates = self.client.get('/index.json')
+		if self.templates is None:
+			raise HTTPError("no URI templates in /index.json")
+
+		pool = ThreadPool(self.workers)
+
+		try:
+			for user in pool.imap_unordered(self.user, self.users(pool)):
+				if user is None:
+					self.unchanged += 1
+				else:
+					callback(user)
+		finally:
+			pool.terminate()
+
+
+# the crawler of the mirror, in the worker processes (inherited from the parent)
+_mirror_crawler = None
+
+def _mirror_user(user):
+	'process a user in a worker process - returns the number of files read, and the user'
+
+	before = _mirror_crawler.client.requests
+	result = _mirror_crawler.user(user)
+
+	return (_mirror_crawler.client.requests - before, result)
+
+
+class MirrorCrawler(Crawler):
+	'''crawls a local mirror (see Mirror) - the user and META documents are read and parsed by
+	worker processes (that's CPU-bound, so threads would not help), the user lists in the
+	calling process (so that they get recorded in the state)'''
+
+	def users(self, pool=None):
+
+		users = []
+		for uri in self.userlists():
+			users.extend(self.userlist(uri) or [])
+
+		return users
+
+	def crawl(self, callback):
+		'crawl the whole mirror, calling callback(user) for each changed user'
+
+		global _mirror_crawler
+
+		self.templates = self.client.get('/index.json')
+		if self.templates is None:
+			raise IOError(errno.ENOENT, "no URI templates in %s" % (self.client._path('/index.json'),))
+
+		users = self.users()
+
+		# the workers are forked, so they get the crawler (including the state) for free
+		_mirror_crawler = self
+		pool = multiprocessing.Pool(self.workers)
+
+		try:
+			for (requests, user) in pool.imap_unordered(_mirror_user, users, chunksize=16):
+
+				self.client.requests += requests
+
+				if user is None:
+					self.unchanged += 1
+				else:
+					callback(user)
+		finally:
+			pool.terminate()
+			_mirror_crawler = None
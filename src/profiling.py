@@ -0,0 +1,179 @@
+import bisect
+import collections
+import logging
+import threading
+import time
+
+from flask import has_request_context, request
+
+# slow queries get logged here (with parameters, and optionally the EXPLAIN output)
+slow_log = logging.getLogger('pgxn.slow')
+
+# histogram bucket boundaries (upper bounds in miliseconds, powers of two up to ~1 minute)
+BUCKETS = [0.125 * (2 ** i) for i in range(20)]
+
+class Histogram(object):
+	'latency histogram with fixed (exponential) buckets'
+
+	def __init__(self):
+		self.counts = [0] * (len(BUCKETS) + 1)
+		self.count = 0
+		self.total = 0.0
+		self.max = 0.0
+
+	def add(self, duration):
+		self.counts[bisect.bisect_left(BUCKETS, duration)] += 1
+		self.count += 1
+		self.total += duration
+		self.max = max(self.max, duration)
+
+	def merge(self, other):
+		self.counts = [a + b for (a, b) in zip(self.counts, other.counts)]
+		self.count += other.count
+		self.total += other.total
+		self.max = max(self.max, other.max)
+
+	def percentile(self, p):
+		'upper bound of the bucket containing the p-th percentile'
+
+		if self.count == 0:
+			return None
+
+		rank = p * self.count / 100.0
+		seen = 0
+		for (idx, c) in enumerate(self.counts):
+			seen += c
+			if seen >= rank:
+				return (idx < len(BUCKETS)) and BUCKETS[idx] or self.max
+
+		return self.max
+
+
+class QueryStats(object):
+	'''rolling query latency histograms, per (endpoint, statement) - the durations are
+	collected in windows of 'window' seconds, and only the last 'windows' are kept'''
+
+	def __init__(self, window=300, windows=12):
+		self._window = window
+		self._windows = windows
+		self._lock = threading.Lock()
+		self._stats = collections.defaultdict(lambda: collections.deque(maxlen=windows))
+
+	def add(self, endpoint, statement, duration):
+
+		current = int(time.time() / self._window)
+
+		with self._lock:
+
+			windows = self._stats[(endpoint, statement)]
+
+			if not windows or windows[-1][0] != current:
+				windows.append((current, Histogram()))
+
+			windows[-1][1].add(duration)
+
+	def report(self):
+		'summary of the histograms, ordered by total time (most expensive first)'
+
+		oldest = int(time.time() / self._window) - self._windows + 1
+
+		with self._lock:
+			items = [(k, list(v)) for (k, v) in self._stats.items()]
+
+		result = []
+		for ((endpoint, statement), windows) in items:
+
+			histogram = Histogram()
+			for (w, h) in windows:
+				if w >= oldest:
+					histogram.merge(h)
+
+			if histogram.count == 0:
+				continue
+
+			result.append({
+				'endpoint' : endpoint,
+				'statement' : statement,
+				'count' : histogram.count,
+				'total_ms' : histogram.total,
+				'avg_ms' : histogram.total / histogram.count,
+				'p50_ms' : histogram.percentile(50),
+				'p95_ms' : histogram.percentile(95),
+				'p99_ms' : histogram.percentile(99),
+				'max_ms' : histogram.max,
+			})
+
+		return sorted(result, key=lambda r : r['total_ms'], reverse=True)
+
+
+# statistics for the whole process
+stats = QueryStats()
+
+# log statements slower than this (miliseconds, None disables the slow log)
+slow_threshold = None
+
+# run EXPLAIN (ANALYZE, BUFFERS) on slow queries (only in read-only transactions)
+slow_explain = False
+
+def init_app(config):
+	'configure the slow query log using the application config'
+
+	global stats, slow_threshold, slow_explain
+
+	stats = QueryStats(window=config.get('QUERY_STATS_WINDOW', 300), windows=config.get('QUERY_STATS_WINDOWS', 12))
+	slow_threshold = config.get('SLOW_QUERY_THRESHOLD')
+	slow_explain = config.get('SLOW_QUERY_EXPLAIN', False)
+
+
+def current_endpoint():
+	'name of the Flask endpoint handling the current request (if any)'
+
+	if has_request_context():
+		return request.endpoint
+
+	return None
+
+
+def explain(connection, query, vars):
+	'''EXPLAIN (ANALYZE, BUFFERS) output for the query - the query already succeeded, so this
+	must not fail it (errors are logged and returned instead of the plan)'''
+
+	try:
+
+		# use a savepoint, so that a failed EXPLAIN does not abort the whole transaction
+		cursor = connection.cursor()
+		try:
+			cursor.execute('SAVEPOINT explain_slow_query')
+			try:
+				cursor.execute('EXPLAIN (ANALYZE, BUFFERS) ' + query, vars)
+				plan = "\n".join([r[0] for r in cursor.fetchall()])
+			except Exception as ex:
+				plan = 'EXPLAIN failed: %s' % (ex,)
+				cursor.execute('ROLLBACK TO SAVEPOINT explain_slow_query')
+			cursor.execute('RELEASE SAVEPOINT explain_slow_query')
+		finally:
+			cursor.close()
+
+	except Exception as ex:
+		slow_log.error("EXPLAIN of a slow query failed: %s", ex)
+		plan = 'EXPLAIN failed: %s' % (ex,)
+
+	return plan
+
+
+def record(connection, name, query, vars, duration):
+	'account the duration of a query, and log it if it was slow'
+
+	endpoint = current_endpoint()
+
+	stats.add(endpoint, name, duration)
+
+	if (slow_threshold is None) or (duration < slow_threshold):
+		return
+
+	plan = None
+	if slow_explain and connection.readonly:
+		plan = explain(connection, query, vars)
+
+	slow_log.warning("slow query: %.1f ms endpoint=%s statement=%s params=%r%s",
+					 duration, endpoint, name, vars, (plan and ("\n" + plan) or ''))
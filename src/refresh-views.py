@@ -0,0 +1,97 @@
+#!/usr/bin/python
+
+# Keeps the materialized views (see refresh.VIEWS) up to date - checks the tables the views are
+# computed from every few seconds, and refreshes only the views affected by the changes (once
+# the changes calm down). Replaces the periodic "SELECT refresh_views()" from cron.
+
+import argparse
+import logging
+import os
+import time
+
+import psycopg2
+
+import db
+import generation
+import refresh
+import snapshots
+import stats
+
+def parse_arguments():
+
+	parser = argparse.ArgumentParser(description='PGXN Tester - refresh of materialized views')
+
+	parser.add_argument('--interval', dest='interval', default=5, type=float, help='how often to check for changes (seconds, default: 5)')
+	parser.add_argument('--quiet', dest='quiet', default=10, type=float, help='refresh once there are no changes for this long (seconds, default: 10)')
+	parser.add_argument('--max-delay', dest='max_delay', default=300, type=float, help='refresh at most this long after the first change (seconds, default: 300)')
+	parser.add_argument('--workers', dest='workers', default=4, type=int, help='number of views refreshed in parallel (default: 4)')
+	parser.add_argument('--once', dest='once', action='store_true', default=False, help='refresh all the views once, and exit')
+	parser.add_argument('--snapshots', dest='snapshots', default=None, help='directory for JSON snapshots of the stats (STATS_SNAPSHOTS in the API config)')
+
+	parser.add_argument('--host', dest='host', default='localhost', help='DB host (default: localhost)')
+	parser.add_argument('--port', dest='port', default=5432, help='DB port (default: 5432)')
+	parser.add_argument('--db',   dest='db',   required=True, help='DB name')
+	parser.add_argument('--user', dest='user', default=os.getlogin(), help='DB user (default: %s)' % (os.getlogin(),))
+	parser.add_argument('--password', dest='password', default=None, help='DB password (default: None)')
+
+	return parser.parse_args()
+
+if __name__ == '__main__':
+
+	args = parse_arguments()
+
+	logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+	def connect():
+		return psycopg2.connect(host=args.host, port=args.port, dbname=args.db, user=args.user, password=args.password)
+
+	refresher = refresh.Refresher(connect, workers=args.workers)
+	debouncer = refresh.Debouncer(quiet=args.quiet, max_delay=args.max_delay)
+
+	tables = refresh.sources(refresh.VIEWS)
+
+	conn = None
+
+	while True:
+
+		try:
+
+			if conn is None:
+				conn = connect()
+				conn.autocommit = True
+
+			counters = refresh.change_counters(conn.cursor(), tables)
+
+			changed = debouncer.check(counters)
+
+			if changed:
+
+				views = refresh.affected(refresh.VIEWS, changed)
+
+				logging.info("tables changed: %s, refreshing %d views", ', '.join(sorted(changed)), len(views))
+
+				durations = refresher.refresh(views)
+
+				logging.info("refreshed %d views in %.1f ms", len(durations), sum(durations.values()))
+
+				debouncer.done(counters)
+
+				# the stats are served from the snapshots, so render them with the fresh data (the
+				# failures are only logged - the views are refreshed, so the caches need to know)
+				if args.snapshots:
+					try:
+						snapshots.write(args.snapshots, stats.SNAPSHOTS, conn.cursor(cursor_factory=db.Cursor))
+					except (IOError, OSError) as ex:
+						logging.error("writing snapshots failed: %s", ex)
+
+				# the cached API responses are stale now
+				generation.bump(conn.cursor(), ['views'])
+
+		except psycopg2.Error as ex:
+			logging.error("refresh failed: %s", ex)
+			conn = None
+
+		if args.once:
+			break
+
+		time.sleep(args.interval)
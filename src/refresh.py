@@ -0,0 +1,182 @@
+import collections
+import logging
+import threading
+import time
+
+from multiprocessing.pool import ThreadPool
+
+log = logging.getLogger('pgxn.refresh')
+
+# materialized views, and the relations each of them is computed from - relations that are not
+# views themselves are tables, watched for changes (results_last and version_last are tables
+# maintained by triggers, so they change along with results and distribution_versions, and so
+# are the results_* summaries, which therefore are not listed here)
+VIEWS = collections.OrderedDict([
+	('results_version_details', ['results', 'results_last']),
+	('stats_current', ['distribution_versions', 'results', 'results_last', 'version_last']),
+	('stats_current_versions', ['distribution_versions', 'results', 'results_last', 'version_last']),
+	('stats_current_version_status', ['distribution_versions', 'results', 'results_last', 'version_last']),
+	('stats_monthly', ['distribution_versions', 'results', 'results_last']),
+	('stats_monthly_versions', ['distribution_versions', 'results', 'results_last']),
+	('stats_monthly_version_status', ['distribution_versions', 'results', 'results_last']),
+	('stats_errors', ['error_analysis', 'results_last']),
+	('stats_errors_by_status', ['error_analysis', 'results', 'results_last', 'version_last']),
+])
+
+
+def sources(views):
+	'tables the views are (directly or indirectly) computed from'
+
+	return sorted(set([d for deps in views.values() for d in deps if d not in views]))
+
+
+def levels(views):
+	'''the views split into levels - each view depends only on views from the preceding levels,
+	so views on the same level may be refreshed in parallel (raises ValueError on cycles)'''
+
+	done = set()
+	result = []
+
+	while len(done) < len(views):
+
+		level = [v for v in views if (v not in done) and all([(d in done) or (d not in views) for d in views[v]])]
+
+		if not level:
+			raise ValueError("cyclic dependency between views: %s" % (', '.join([v for v in views if v not in done]),))
+
+		result.append(level)
+		done.update(level)
+
+	return result
+
+
+def affected(views, changed):
+	'views that need a refresh when the changed tables (or views) were modified'
+
+	result = set()
+
+	for level in levels(views):
+		for v in level:
+			if any([(d in changed) or (d in result) for d in views[v]]):
+				result.add(v)
+
+	return result
+
+
+def change_counters(cursor, tables):
+	'''number of rows inserted, updated and deleted in each table (from the statistics collector,
+	so this is cheap, but may lag a bit behind the commits - a reset just causes a refresh)'''
+
+	cursor.execute("""SELECT relname, n_tup_ins + n_tup_upd + n_tup_del AS changes
+						FROM pg_stat_user_tables WHERE relname = ANY(%(tables)s)""", {'tables' : tables})
+
+	return {r[0] : r[1] for r in cursor.fetchall()}
+
+
+class Debouncer(object):
+	'''decides when to refresh - only when some of the tables changed since the last refresh, and
+	then only once the changes stop for 'quiet' seconds (but never later than 'max_delay' seconds
+	after the first change was noticed), so that a burst of results causes a single refresh'''
+
+	def __init__(self, quiet=10, max_delay=300):
+
+		self.quiet = quiet
+		self.max_delay = max_delay
+
+		# counters at the last refresh (None forces a refresh of everything)
+		self.refreshed = None
+
+		self._last = None
+		self._last_change = None
+		self._first_change = None
+
+	def check(self, counters, now=None):
+		'tables changed since the last refresh, if it is time to refresh (otherwise None)'
+
+		if now is None:
+			now = time.time()
+
+		if self.refreshed is None:
+			return set(counters.keys())
+
+		changed = set([t for t in counters if counters[t] != self.refreshed.get(t)])
+
+		if not changed:
+			self._first_change = None
+			self._last = counters
+			return None
+
+		if self._first_change is None:
+			self._first_change = now
+
+		# still changing (since the previous check)
+		if counters != self._last:
+			self._last = counters
+			self._last_change = now
+
+		if (now - self._last_change < self.quiet) and (now - self._first_change < self.max_delay):
+			return None
+
+		return changed
+
+	def done(self, counters):
+		'the views were refreshed with the data as of the counters'
+
+		self.refreshed = counters
+		self._first_change = None
+
+
+class Refresher(object):
+	'''refreshes the views level by level, views on the same level in parallel (each worker
+	thread uses a separate connection), and records the duration of each refresh'''
+
+	def __init__(self, connect, views=VIEWS, workers=4):
+
+		self.connect = connect
+		self.views = views
+
+		self._pool = ThreadPool(workers)
+		self._local = threading.local()
+
+	def _connection(self):
+
+		if getattr(self._local, 'conn', None) is None:
+			self._local.conn = self.connect()
+			self._local.conn.autocommit = True
+
+		return self._local.conn
+
+	def _refresh(self, view):
+
+		start = time.time()
+
+		try:
+			cursor = self._connection().cursor()
+			cursor.execute('REFRESH MATERIALIZED VIEW CONCURRENTLY %s' % (view,))
+		except Exception:
+			# the connection may be broken, so open a new one next time
+			self._local.conn = None
+			raise
+
+		duration = (time.time() - start) * 1000.0
+
+		cursor.execute('INSERT INTO view_refresh_log (view_name, duration_ms) VALUES (%(view)s, %(duration)s)',
+					   {'view' : view, 'duration' : duration})
+
+		log.info("refreshed %s in %.1f ms", view, duration)
+
+		return (view, duration)
+
+	def refresh(self, views):
+		'refresh the views (in the order given by dependencies), returns durations (view => ms)'
+
+		durations = {}
+
+		for level in levels(self.views):
+
+			tmp = [v for v in level if v in views]
+
+			if tmp:
+				durations.update(self._pool.map(self._refresh, tmp))
+
+		return durations
@@ -1,42 +1,153 @@
 import flask
-from flask import request
+from flask import request, current_app
 from flask.ext.restful import Resource, abort, reqparse
-
-from db import DB
+from werkzeug.http import http_date
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+import psycopg2.pool
+
+from db import DB, Statement
+from blobs import BlobSet
+import blobs
+import classifier
+import generation
+import logs
+import lookups
+import spool
 from utils import verify_signature, get_pg_version
 import uuid
 import base64
+import json
+import urllib
+
+# fields of a submitted result - (name, type, required)
+RESULT_FIELDS = [
+	('distribution', str, True),
+	('version', str, True),
+	('machine', str, True),
+	('signature', str, True),
+	('load', str, False),
+	('install', str, False),
+	('check', str, False),
+	('install_log', str, False),
+	('install_duration', int, False),
+	('load_log', str, False),
+	('load_duration', int, False),
+	('check_log', str, False),
+	('check_duration', int, False),
+	('check_diff', str, False),
+	('config', str, False),
+	('env', str, False),
+	('uuid', str, False),
+]
 
 def result_parser():
 
 	result_parser = reqparse.RequestParser()
-	result_parser.add_argument('distribution', type=str, required=True, location='json')
-	result_parser.add_argument('version', type=str, required=True, location='json')
-	result_parser.add_argument('machine', type=str, required=True, location='json')
-	result_parser.add_argument('signature', type=str, required=True, location='json')
-	result_parser.add_argument('load', type=str, location='json')
-	result_parser.add_argument('install', type=str, location='json')
-	result_parser.add_argument('check', type=str, location='json')
-	result_parser.add_argument('install_log', type=str, location='json')
-	result_parser.add_argument('install_duration', type=int, location='json')
-	result_parser.add_argument('load_log', type=str, location='json')
-	result_parser.add_argument('load_duration', type=int, location='json')
-	result_parser.add_argument('check_log', type=str, location='json')
-	result_parser.add_argument('check_duration', type=int, location='json')
-	result_parser.add_argument('check_diff', type=str, location='json')
-	result_parser.add_argument('config', type=str, location='json')
-	result_parser.add_argument('env', type=str, location='json')
-	result_parser.add_argument('uuid', type=str, location='json')
+	for (name, type, required) in RESULT_FIELDS:
+		result_parser.add_argument(name, type=type, required=required, location='json')
 
 	return result_parser
 
-class ResultList(Resource):
+def parse_result(item):
+	'''validate a single result from a batch, the same way result_parser does it (so that
+	the signatures match) - returns a dict with all the fields, or raises ValueError'''
+
+	if not isinstance(item, dict):
+		raise ValueError("result is not an object")
+
+	result = {}
+	for (name, type, required) in RESULT_FIELDS:
+
+		if item.get(name) is None:
+			if required:
+				raise ValueError("missing required field '%s'" % (name,))
+			result[name] = None
+			continue
+
+		try:
+			result[name] = type(item[name])
+		except (TypeError, ValueError):
+			raise ValueError("invalid value of field '%s'" % (name,))
+
+	return result
+
+# values of the test_result enum (plus 'unknown', stored as NULL)
+TEST_RESULTS = ('ok', 'error', 'missing', 'unknown')
+
+def check_result(result):
+	'''check the parsed result can be stored (NOT NULL and enum columns), so that a single bad
+	result does not fail the whole batch - raises ValueError'''
+
+	for name in ('uuid', 'env'):
+		if not result[name]:
+			raise ValueError("missing field '%s'" % (name,))
+
+	for name in ('load', 'install', 'check'):
+		if (result[name] is not None) and (result[name] not in TEST_RESULTS):
+			raise ValueError("invalid value of field '%s'" % (name,))
+
+# columns of the results table, filled from a submitted result (see result_row)
+INSERT_SQL = '''INSERT INTO results (result_uuid, machine_id, dist_version_id, pg_version, pg_config_hash, env_info_hash, load_result, install_result, check_result,
+										   load_duration, install_duration, check_duration)'''
+
+INSERT_VALUES = '''(%(uuid)s, %(machine)s, %(version)s, %(pgversion)s, %(config)s, %(env)s, %(load)s, %(install)s, %(check)s,
+					%(load_duration)s, %(install_duration)s, %(check_duration)s)'''
+
+# insert a single result along with the logs and blobs (pg_config, env_info and logs, unless
+# already stored), in a single statement - returns no row when the uuid is a duplicate (the
+# logs are not inserted in that case, the blobs may be)
+INSERT_WITH_LOGS_SQL = '''WITH b AS (''' + blobs.INSERT_SQL + '''),
+							   r AS (''' + INSERT_SQL + ''' VALUES ''' + INSERT_VALUES + ''' ON CONFLICT (result_uuid) DO NOTHING RETURNING id),
+							   l AS (INSERT INTO result_logs (result_id, log_name, blob_hash)
+									 SELECT r.id, l.* FROM r, (''' + logs.LOG_ROWS_SQL + ''') AS l)
+						  SELECT id FROM r'''
+
+def load_json(value):
+	'parse a JSON blob (pg_config or env_info), returns None for missing / invalid values'
 
-	# FIXME implement proper paging (using submit_date)
+	try:
+		return json.loads(value)
+	except (TypeError, ValueError):
+		return None
+
+def decode_log(value):
+	return (value is not None) and base64.b64decode(value) or None
+
+def result_logs(args):
+	'decoded logs of a submitted result (name => log)'
+
+	return {'install' : decode_log(args['install_log']), 'load' : decode_log(args['load_log']), 'check' : decode_log(args['check_log']), 'diff' : decode_log(args['check_diff'])}
+
+def result_row(args, machine_id, version_id, blobset):
+	'parameters for INSERT_VALUES, from a submitted result (pg_config and env_info get added to the blob set)'
+
+	return {'uuid' : args['uuid'], 'machine' : machine_id, 'version' : version_id, 'pgversion' : get_pg_version(args['config']),
+			'load' : (args['load'] != 'unknown' and args['load'] or None), 'install' : (args['install'] != 'unknown' and args['install'] or None), 'check' : (args['check'] != 'unknown' and args['check'] or None),
+			'install_duration' : args['install_duration'], 'load_duration' : args['load_duration'], 'check_duration' : args['check_duration'],
+			'config' : psycopg2.Binary(blobset.add(args['config'])), 'env' : psycopg2.Binary(blobset.add(args['env']))}
+
+def encode_cursor(submit_date, rid):
+	'opaque paging token, pointing just after the (submit_date, id) result'
+
+	return base64.urlsafe_b64encode(json.dumps([submit_date.isoformat(), rid]))
+
+def decode_cursor(token):
+	'inverse to encode_cursor (returns (submit_date, id), the date as an ISO string)'
+
+	try:
+		(submit_date, rid) = json.loads(base64.urlsafe_b64decode(str(token)))
+		return (str(submit_date), int(rid))
+	except (TypeError, ValueError):
+		abort(400, message="invalid 'after' token")
+
+class ResultList(Resource):
 
 	# basic list of results with basic info (no detailed logs)
 	# TODO consider showing only the last test from each machine/version/release (who cares if it failed before, when it passes now)
-	list_sql = """SELECT result_uuid AS uuid, user_name AS user, dist_name AS dist, m.name AS machine, isodate(submit_date) AS test_date,
+	list_sql = """SELECT r.id AS result_id, submit_date, result_uuid AS uuid, user_name AS user, dist_name AS dist, m.name AS machine, isodate(submit_date) AS test_date,
 						 version_number AS version, isodate(version_date) AS version_date, version_status AS status, pg_version,
 						 install_result AS install, load_result AS load, check_result AS "check"
 					FROM distributions d JOIN users u ON (d.user_id = u.id)
@@ -45,16 +156,30 @@ class ResultList(Resource):
 										 JOIN machines m ON (r.machine_id = m.id)"""
 
 	def get(self):
-		'get info about distribution, along with info about author'
+		'''list of results, newest first - paging uses a keyset cursor (the 'after' token
+		from the 'next' link), so that all pages cost the same'''
 
-		# TODO add some basic paging of results (using submit_date of the results)
 		where = []
 		params = {}
 
-		if 'page' in request.args:
-			params.update({'offset' : int(request.args['page']) * 20})
-		else:
-			params.update({'offset' : 0})
+		# page size (limited, so that clients can't request everything at once)
+		limit = current_app.config.get('RESULTS_PAGE_SIZE', 20)
+		if 'limit' in request.args:
+			try:
+				limit = int(request.args['limit'])
+			except ValueError:
+				abort(400, message="invalid 'limit' value")
+
+		limit = max(1, min(limit, current_app.config.get('RESULTS_PAGE_SIZE_MAX', 100)))
+
+		# fetch one more row, so that we know whether there's a next page
+		params.update({'limit' : limit + 1})
+
+		# continue after the last result of the previous page
+		if 'after' in request.args:
+			(after_date, after_id) = decode_cursor(request.args['after'])
+			where.append('(submit_date, r.id) < (%(after_date)s::timestamp, %(after_id)s)')
+			params.update({'after_date' : after_date, 'after_id' : after_id})
 
 		# filter only distributions published by the particular user
 		if 'user' in request.args:
@@ -96,7 +221,7 @@ class ResultList(Resource):
 			where.append('pg_version = %(pgversion)s')
 			params.update({'pgversion' : request.args['pg_version']})
 
-		# paging (using the submit_date + LIMIT)
+		# only results submitted before the date
 		if 'date' in request.args:
 			where.append('submit_date <= %(date)s')
 			params.update({'date' : request.args['date']})
@@ -120,14 +245,27 @@ class ResultList(Resource):
 		if where:
 			sql += ' WHERE ' + (' AND '.join(where))
 
-		sql += " ORDER BY submit_date DESC LIMIT 20 OFFSET %(offset)s"
+		sql += " ORDER BY submit_date DESC, r.id DESC LIMIT %(limit)s"
 
 		with DB() as (conn, cursor):
 			# info about distribution
-			cursor.execute(sql, params)
+			cursor.execute(sql, params, name='results_list')
 			results = cursor.fetchall()
 
-		return results
+		# link to the next page (with the same filters), if there is one
+		next_uri = None
+		if len(results) > limit:
+			results = results[:limit]
+			args = dict((k, v) for (k, v) in request.args.items() if k != 'after')
+			args['after'] = encode_cursor(results[-1]['submit_date'], results[-1]['result_id'])
+			next_uri = request.path + '?' + urllib.urlencode(sorted(args.items()))
+
+		# the paging columns are internal
+		for r in results:
+			del r['result_id']
+			del r['submit_date']
+
+		return {'results' : results, 'next' : next_uri}
 
 	def post(self):
 
@@ -136,66 +274,299 @@ class ResultList(Resource):
 
 		args = result_parser().parse_args()
 
-		# fetch info about the machine
-		with DB() as (conn, cursor):
-			
-			cursor.execute('SELECT id, secret_key FROM machines WHERE name = %(name)s AND is_approved AND is_active', {'name' : args.machine})
-			machine = cursor.fetchone()
+		if spool.spool is not None:
+			return spool_result(args)
 
-			if not machine:
-				abort(401, message="unknown / inactive machine")
+		# a single connection - the machine and version usually come from the in-process caches,
+		# so in most cases the INSERT is the only statement
+		with DB(False) as (conn, cursor):
 
-			# verify the signature
-			if not verify_signature(args, secret=machine['secret_key'], signature=args.signature):
-				abort(401, message='invalid signature')
+			machine = check_machine(cursor, args)
 
-			cursor.execute('SELECT v.id AS id FROM distribution_versions v JOIN distributions d ON (d.id = v.dist_id) WHERE dist_name = %(name)s AND version_number = %(version)s',
-							{'name' : args.distribution, 'version' : args.version})
-			version = cursor.fetchone()
+			version = lookups.versions.get(cursor, [(args.distribution, args.version)]).get((args.distribution, args.version))
 
 			if not version:
 				abort(401, message="unknown distribution/version")
 
-			# check that we haven't seen the UUID before (this means someone bad can't replay the message over and over)
-			cursor.execute('SELECT result_uuid AS uuid FROM results WHERE result_uuid = %(uuid)s LIMIT 1', {'uuid' : args.uuid})
-			result = cursor.fetchone()
+			blobset = BlobSet()
+			submitted = result_logs(args)
+
+			params = result_row(args, machine['id'], version, blobset)
+			params.update(logs.log_params(logs.add_logs(blobset, submitted)))
+			params.update(blobset.params())
 
-			if result:
+			# the UNIQUE constraint on result_uuid rejects replays (someone bad can't replay the message over and over)
+			cursor.execute(INSERT_WITH_LOGS_SQL, params)
+
+			row = cursor.fetchone()
+			if not row:
 				abort(401, message="duplicate uuid")
 
-		# OK, so the submitted result seems to be OK ... let's store the data
-		with DB(False) as (conn, cursor):
-			
-			cursor.execute('''INSERT INTO results (result_uuid, machine_id, dist_version_id, pg_version, pg_config, env_info, load_result, install_result, check_result,
-												   load_duration, install_duration, check_duration, log_load, log_install, log_check, check_diff)
-							  VALUES (%(uuid)s, %(machine)s, %(version)s, %(pgversion)s, %(config)s, %(env)s, %(load)s, %(install)s, %(check)s,
-									  %(load_duration)s, %(install_duration)s, %(check_duration)s, %(load_log)s, %(install_log)s, %(check_log)s, %(diff)s)''',
-							  {'uuid' : args.uuid, 'machine' : machine['id'], 'version' : version['id'], 'pgversion' : get_pg_version(args.config),
-							   'load' : (args.load != 'unknown' and args.load or None), 'install' : (args.install != 'unknown' and args.install or None), 'check' : (args.check != 'unknown' and args.check or None),
-							   'install_log' : base64.b64decode(args.install_log), 'load_log' : base64.b64decode(args.load_log), 'check_log' : base64.b64decode(args.check_log), 'diff' : base64.b64decode(args.check_diff),
-							   'install_duration' : args.install_duration, 'load_duration' : args.load_duration, 'check_duration' : args.check_duration, 
-							   'config' : args.config, 'env' : args.env})
+			# classify the errors (if any) right away
+			analysis = classifier.cached.get(cursor).analyze(args, classifier.decode_logs(submitted))
+			if analysis:
+				classifier.store(cursor, {row['id'] : analysis}, replace=False)
 
 			conn.commit()
 
+			blobset.stored()
+			generation.bump(cursor)
+
 		return {'uuid' : args.uuid}
 
 
+def spool_result(args):
+	'''check the result and append it to the local spool (the background writer stores it into
+	the database later) - the machine and version come from the in-process caches if possible,
+	and expired entries are used when the database is not available'''
+
+	if not args.uuid:
+		abort(400, message="missing uuid")
+
+	# reject invalid results now, the writer could not store them anyway
+	try:
+		get_pg_version(args.config)
+		result_logs(args)
+	except (KeyError, IndexError, TypeError, ValueError):
+		abort(400, message="invalid config or logs")
+
+	key = (args.distribution, args.version)
+
+	machine = lookups.machines.cached([args.machine]).get(args.machine)
+	version = lookups.versions.cached([key]).get(key)
+
+	if not (machine and version and verify_signature(args, secret=machine['secret_key'], signature=args.signature)):
+
+		try:
+			with DB() as (conn, cursor):
+				machine = check_machine(cursor, args)
+				version = lookups.versions.get(cursor, [key]).get(key)
+
+		except (psycopg2.OperationalError, psycopg2.pool.PoolError):
+
+			machine = lookups.machines.cached([args.machine], expired=True).get(args.machine)
+			version = lookups.versions.cached([key], expired=True).get(key)
+
+			if not (machine and version):
+				abort(503, message="database not available, try again later")
+
+			if not verify_signature(args, secret=machine['secret_key'], signature=args.signature):
+				abort(401, message='invalid signature')
+
+	if not version:
+		abort(401, message="unknown distribution/version")
+
+	# duplicate uuids are skipped by the writer (the client can't be told anymore)
+	spool.spool.append({'result' : dict(args), 'machine' : machine['id'], 'version' : version})
+
+	return ({'uuid' : args.uuid}, 202)
+
+
+def check_machine(cursor, args):
+	'lookup the (approved and active) machine submitting the result, and verify the signature'
+
+	machine = lookups.machines.get(cursor, [args.machine]).get(args.machine)
+
+	if not machine:
+		abort(401, message="unknown / inactive machine")
+
+	if verify_signature(args, secret=machine['secret_key'], signature=args.signature):
+		return machine
+
+	# the secret might have changed since we cached it, so try once more with fresh data
+	machine = lookups.machines.get(cursor, [args.machine], refresh=True).get(args.machine)
+
+	if not machine:
+		abort(401, message="unknown / inactive machine")
+
+	if not verify_signature(args, secret=machine['secret_key'], signature=args.signature):
+		abort(401, message='invalid signature')
+
+	return machine
+
+
+def insert_results(cursor, blobset, rows, submitted_logs, analysis):
+	'''store results (rows from result_row, hashes of their logs and the error analysis by uuid)
+	with a single multi-row INSERT - the UNIQUE constraint on result_uuid rejects the replays,
+	returns the inserted uuids'''
+
+	if not rows:
+		return set()
+
+	# the blobs first (only those not known to be stored already)
+	blobs.store(cursor, blobset)
+
+	# the triggers lock the distributions (and the counters) row by row, so insert the rows in
+	# the same order in all transactions, to make deadlocks between them less likely
+	rows = sorted(rows, key=lambda r : (r['version'], r['uuid']))
+
+	tmp = psycopg2.extras.execute_values(cursor, INSERT_SQL + ' VALUES %s ON CONFLICT (result_uuid) DO NOTHING RETURNING id, result_uuid',
+										 rows, template=INSERT_VALUES, page_size=len(rows), fetch=True)
+
+	# and the logs and error analysis for the inserted results
+	logs.store_many(cursor, {r['id'] : submitted_logs[r['result_uuid']] for r in tmp})
+	classifier.store(cursor, {r['id'] : analysis[r['result_uuid']] for r in tmp if analysis.get(r['result_uuid'])}, replace=False)
+
+	return set([r['result_uuid'] for r in tmp])
+
+
+def store_spooled(records):
+	'''store a batch of spooled results (see the spool module) in a single transaction - the
+	results were checked before spooling, and duplicates (replays of the spool) are skipped'''
+
+	with DB(False) as (conn, cursor):
+
+		rows = []
+		submitted_logs = {}
+		analysis = {}
+		blobset = BlobSet()
+
+		rules = classifier.cached.get(cursor)
+
+		for r in records:
+
+			submitted = result_logs(r['result'])
+
+			rows.append(result_row(r['result'], r['machine'], r['version'], blobset))
+			submitted_logs[r['result']['uuid']] = logs.add_logs(blobset, submitted)
+			analysis[r['result']['uuid']] = rules.analyze(r['result'], classifier.decode_logs(submitted))
+
+		insert_results(cursor, blobset, rows, submitted_logs, analysis)
+
+		conn.commit()
+
+		blobset.stored()
+		generation.bump(cursor)
+
+
+# how many times to retry a batch that failed on a deadlock (or serialization failure)
+DEADLOCK_RETRIES = 3
+
+class ResultBatch(Resource):
+	'''submission of multiple results at once - all the results are checked together (a few
+	set-based lookups) and stored in a single transaction, with a status for each result'''
+
+	def post(self):
+
+		items = request.get_json(force=True, silent=True)
+
+		if not isinstance(items, list):
+			abort(400, message="expected a list of results")
+
+		if len(items) > current_app.config.get('RESULTS_BATCH_MAX', 500):
+			abort(413, message="too many results in a batch")
+
+		# status of each item (in the same order as submitted)
+		status = [None] * len(items)
+
+		results = {}
+		for (idx, item) in enumerate(items):
+			try:
+				results[idx] = parse_result(item)
+				check_result(results[idx])
+			except ValueError as ex:
+				results.pop(idx, None)
+				status[idx] = {'status' : 'error', 'message' : str(ex)}
+
+		rows = []
+		with DB(False) as (conn, cursor):
+
+			machines = lookups.machines.get(cursor, [r['machine'] for r in results.values()])
+			versions = lookups.versions.get(cursor, [(r['distribution'], r['version']) for r in results.values()])
+
+			# the secrets of machines with invalid signatures might have changed since we cached them
+			stale = set([r['machine'] for r in results.values() if (r['machine'] in machines) and
+						 not verify_signature(r, secret=machines[r['machine']]['secret_key'], signature=r['signature'])])
+
+			if stale:
+				for name in stale:
+					machines.pop(name)
+				machines.update(lookups.machines.get(cursor, stale, refresh=True))
+
+			seen = set()
+			submitted_logs = {}
+			analysis = {}
+			blobset = BlobSet()
+
+			rules = classifier.cached.get(cursor)
+			for (idx, args) in sorted(results.items()):
+
+				machine = machines.get(args['machine'])
+				version = versions.get((args['distribution'], args['version']))
+
+				if not machine:
+					status[idx] = {'status' : 'error', 'message' : 'unknown / inactive machine'}
+				elif not verify_signature(args, secret=machine['secret_key'], signature=args['signature']):
+					status[idx] = {'status' : 'error', 'message' : 'invalid signature'}
+				elif not version:
+					status[idx] = {'status' : 'error', 'message' : 'unknown distribution/version'}
+				elif args['uuid'] in seen:
+					status[idx] = {'status' : 'error', 'message' : 'duplicate uuid'}
+				else:
+
+					try:
+						submitted = result_logs(args)
+						row = result_row(args, machine['id'], version, blobset)
+						hashes = logs.add_logs(blobset, submitted)
+					except (KeyError, IndexError, TypeError, ValueError):
+						status[idx] = {'status' : 'error', 'message' : 'invalid config, env or logs'}
+						continue
+
+					seen.add(args['uuid'])
+					rows.append((idx, row))
+					submitted_logs[args['uuid']] = hashes
+					analysis[args['uuid']] = rules.analyze(args, classifier.decode_logs(submitted))
+
+			# concurrent inserts may still deadlock (e.g. on the counters), so retry a few times
+			for attempt in range(DEADLOCK_RETRIES + 1):
+				try:
+					inserted = insert_results(cursor, blobset, [r for (idx, r) in rows], submitted_logs, analysis)
+					conn.commit()
+					break
+				except psycopg2.extensions.TransactionRollbackError:
+					conn.rollback()
+					if attempt == DEADLOCK_RETRIES:
+						raise
+
+			blobset.stored()
+
+			if inserted:
+				generation.bump(cursor)
+
+		for (idx, row) in rows:
+			if row['uuid'] in inserted:
+				status[idx] = {'status' : 'ok'}
+			else:
+				status[idx] = {'status' : 'error', 'message' : 'duplicate uuid'}
+
+		# attach the uuid (if there's one) to each status
+		for (idx, item) in enumerate(items):
+			status[idx]['uuid'] = isinstance(item, dict) and item.get('uuid') or None
+
+		return {'results' : status}
+
+
 class Result(Resource):
 	'info about a particular test (identified by UUID)'
 
 	# basic version info
-	info_sql = """SELECT result_uuid AS uuid, m.name AS machine, user_name AS user, dist_name AS dist, version_number AS version, isodate(version_date) AS date, version_status AS state,
-						 isodate(submit_date) AS test_date, pg_version, pg_config, env_info, load_result, install_result, check_result,
-						 load_duration, install_duration, check_duration, log_load, log_install, log_check, check_diff
+	info_sql = Statement('result_info', """SELECT result_uuid AS uuid, m.name AS machine, user_name AS user, dist_name AS dist, version_number AS version, isodate(version_date) AS date, version_status AS state,
+						 isodate(submit_date) AS test_date, submit_date, pg_version, pg_config_hash, env_info_hash, load_result, install_result, check_result,
+						 load_duration, install_duration, check_duration
 					FROM distributions d JOIN users u ON (d.user_id = u.id)
 										 JOIN distribution_versions v ON (d.id = v.dist_id)
 										 JOIN results r ON (r.dist_version_id = v.id)
 										 JOIN machines m ON (m.id = r.machine_id)
-					WHERE result_uuid = %(uuid)s"""
+					WHERE result_uuid = %(uuid)s""")
 
 	def get(self, rid):
-		'get info about distribution, along with info about author'
+		'''get info about the result - the logs are only included when requested using
+		the ?logs= parameter (either 'all' or a list of names, e.g. 'install,check')'''
+
+		try:
+			names = logs.parse_selector(request.args.get('logs'))
+		except ValueError as ex:
+			abort(400, message=str(ex))
 
 		with DB() as (conn, cursor):
 
@@ -207,4 +578,37 @@ class Result(Resource):
 			if not info:
 				abort(404, message="unknown result UUID")
 
-		return (info)
\ No newline at end of file
+			# pg_config and env_info are stored as (deduplicated) blobs
+			config_hash = str(info.pop('pg_config_hash'))
+			env_hash = str(info.pop('env_info_hash'))
+
+			tmp = blobs.fetch(cursor, [config_hash, env_hash])
+
+			info['pg_config'] = load_json(tmp.get(config_hash))
+			info['env_info'] = load_json(tmp.get(env_hash))
+
+			info.update(logs.fetch(cursor, rid, names))
+
+		# results never change, so the submit date is when the resource was last modified
+		return (info, 200, {'Last-Modified' : http_date(info.pop('submit_date'))})
+
+
+class ResultLog(Resource):
+	'a single log of a result (install, load, check or diff)'
+
+	def get(self, rid, name):
+
+		if name not in logs.LOG_NAMES:
+			abort(404, message="unknown log")
+
+		with DB() as (conn, cursor):
+
+			cursor.execute('SELECT submit_date FROM results WHERE result_uuid = %(uuid)s', {'uuid' : rid})
+
+			result = cursor.fetchone()
+			if not result:
+				abort(404, message="unknown result UUID")
+
+			log = logs.fetch(cursor, rid, [name]).values()[0]
+
+		return ({'uuid' : rid, 'name' : name, 'log' : log}, 200, {'Last-Modified' : http_date(result['submit_date'])})
\ No newline at end of file
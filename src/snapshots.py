@@ -0,0 +1,102 @@
+import gzip
+import json
+import logging
+import os
+import StringIO
+
+from flask import request, current_app
+
+log = logging.getLogger('pgxn.snapshots')
+
+# directory with the snapshots (None means the resources are always computed)
+directory = None
+
+def init_app(config):
+	global directory
+	directory = config.get('STATS_SNAPSHOTS')
+
+
+def _replace(path, data):
+	'write the file atomically (readers see either the old or the new contents)'
+
+	with open(path + '.tmp', 'wb') as f:
+		f.write(data)
+		f.flush()
+		os.fsync(f.fileno())
+
+	os.rename(path + '.tmp', path)
+
+
+def compress(data):
+	'gzip the data (with a fixed timestamp, so that the same data compress to the same bytes)'
+
+	tmp = StringIO.StringIO()
+
+	with gzip.GzipFile(fileobj=tmp, mode='wb', compresslevel=9, mtime=0) as f:
+		f.write(data)
+
+	return tmp.getvalue()
+
+
+def write(path, resources, cursor):
+	'''render the resources (with a 'snapshot' name and a 'render(cursor)' method) into the
+	directory, each as plain and gzipped JSON - a failed resource is logged and skipped (the
+	previous snapshot stays), returns the names of the failed ones'''
+
+	if not os.path.isdir(path):
+		os.makedirs(path)
+
+	failed = []
+	for resource in resources:
+
+		try:
+			data = json.dumps(resource.render(cursor)) + '\n'
+
+			_replace(os.path.join(path, resource.snapshot + '.json.gz'), compress(data))
+			_replace(os.path.join(path, resource.snapshot + '.json'), data)
+
+		except Exception as ex:
+			log.error("snapshot %s failed: %s", resource.snapshot, ex)
+			failed.append(resource.snapshot)
+			continue
+
+		log.info("snapshot %s written (%d bytes)", resource.snapshot, len(data))
+
+	return failed
+
+
+def _read(path):
+	try:
+		with open(path, 'rb') as f:
+			return f.read()
+	except IOError:
+		return None
+
+
+def response(name):
+	'''response with the snapshot (gzipped when the client accepts that, except for JSONP
+	requests, which need the plain JSON), or None when there's no snapshot'''
+
+	if (directory is None) or (name is None):
+		return None
+
+	path = os.path.join(directory, name + '.json')
+
+	data = None
+	if ('callback' not in request.args) and (request.accept_encodings['gzip'] > 0):
+		data = _read(path + '.gz')
+
+	response = None
+
+	if data is not None:
+		response = current_app.response_class(data, mimetype='application/json')
+		response.headers['Content-Encoding'] = 'gzip'
+	else:
+		data = _read(path)
+		if data is None:
+			return None
+		response = current_app.response_class(data, mimetype='application/json')
+
+	response.vary.add('Accept-Encoding')
+
+	return response
@@ -0,0 +1,306 @@
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+import psycopg2
+
+log = logging.getLogger('pgxn.spool')
+
+class Spool(object):
+	'''local append-only spool of submitted results, drained into the database by a background
+	writer - the records are JSON lines in segment files (named <pid>-<uuid>-<seq>.spool), the
+	segment being appended to is locked (flock) so that writers only drain closed or orphaned
+	segments'''
+
+	def __init__(self, directory, segment_size=16*1024*1024, fsync_delay=0.002):
+
+		self.directory = directory
+		self.segment_size = segment_size
+		self.fsync_delay = fsync_delay
+
+		if not os.path.isdir(directory):
+			os.makedirs(directory)
+
+		# protects the current segment (writes and rotation)
+		self._lock = threading.Lock()
+
+		# serializes the fsyncs (appenders arriving during a fsync share the next one)
+		self._sync_lock = threading.Lock()
+
+		# segment names must not repeat even across restarts (a restarted process may get the
+		# same pid, while segments of the crashed one are still waiting to be drained)
+		self._prefix = '%d-%s' % (os.getpid(), uuid.uuid4().hex)
+
+		self._file = None
+		self._seq = 0
+		self._opened = None
+		self._written = 0
+		self._synced = 0
+
+		self.appended = 0
+		self.fsyncs = 0
+
+	def _open(self):
+		'start a new segment (locked before it gets its final name, so no writer can grab it)'
+
+		self._seq += 1
+		name = os.path.join(self.directory, '%s-%010d' % (self._prefix, self._seq))
+
+		f = os.fdopen(os.open(name + '.tmp', os.O_WRONLY | os.O_APPEND | os.O_CREAT | os.O_EXCL, 0644), 'ab')
+		fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+		# link (unlike rename) fails if the segment exists, instead of silently replacing it
+		try:
+			os.link(name + '.tmp', name + '.spool')
+		finally:
+			os.unlink(name + '.tmp')
+
+		self._file = f
+		self._opened = time.time()
+
+	def append(self, record):
+		'append the record to the spool, and return once it is fsynced'
+
+		line = json.dumps(record) + '\n'
+
+		with self._lock:
+
+			if self._file is None:
+				self._open()
+
+			self._file.write(line)
+			self._file.flush()
+
+			self._written += 1
+			self.appended += 1
+
+			ticket = self._written
+			full = (self._file.tell() >= self.segment_size)
+
+		self._sync(ticket)
+
+		if full:
+			self.rotate()
+
+	def _sync(self, ticket):
+		'fsync the current segment, unless a fsync covering the ticket already happened'
+
+		with self._sync_lock:
+
+			if self._synced >= ticket:
+				return
+
+			# wait a bit, so that more appenders can share this fsync
+			if self.fsync_delay:
+				time.sleep(self.fsync_delay)
+
+			with self._lock:
+				target = self._written
+				f = self._file
+
+			os.fsync(f.fileno())
+
+			self._synced = target
+			self.fsyncs += 1
+
+	def rotate(self, min_age=0):
+		'close the current segment (if not empty and older than min_age seconds), so that it can be drained'
+
+		with self._sync_lock:
+			with self._lock:
+
+				if (self._file is None) or (self._file.tell() == 0):
+					return
+
+				if time.time() - self._opened < min_age:
+					return
+
+				os.fsync(self._file.fileno())
+				self._synced = self._written
+
+				# closing the file releases the lock
+				self._file.close()
+				self._file = None
+
+	def segments(self):
+		'spool segments, oldest first (within each process)'
+
+		return sorted(glob.glob(os.path.join(self.directory, '*.spool')))
+
+	def claim(self, path):
+		'''lock a segment for draining, returns the open file (or None when the segment is still
+		being appended to, or drained by some other process)'''
+
+		try:
+			f = open(path, 'rb')
+		except IOError:
+			return None
+
+		try:
+			fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+		except IOError:
+			f.close()
+			return None
+
+		# already drained (and removed) by someone else while we were waiting
+		if os.fstat(f.fileno()).st_nlink == 0:
+			f.close()
+			return None
+
+		return f
+
+	def reject(self, record, reason):
+		'keep a record that can not be stored (so that it is not retried forever)'
+
+		with open(os.path.join(self.directory, 'rejected.log'), 'ab') as f:
+			f.write(json.dumps({'reason' : reason, 'record' : record}) + '\n')
+
+
+def read_records(f):
+	'records from a spool segment (a torn line at the end, after a crash, is skipped)'
+
+	records = []
+	for line in f:
+		try:
+			records.append(json.loads(line))
+		except ValueError:
+			log.warning("skipping invalid record in spool segment %s", f.name)
+
+	return records
+
+
+class Writer(threading.Thread):
+	'''background thread draining the spool into the database in batches - store(records)
+	is expected to store the batch in a single transaction (and to ignore records stored
+	already, as a segment is replayed whole after a crash)'''
+
+	def __init__(self, spool, store, batch=500, interval=1, max_backoff=60):
+
+		super(Writer, self).__init__(name='spool-writer')
+		self.daemon = True
+
+		self.spool = spool
+		self.store = store
+		self.batch = batch
+		self.interval = interval
+		self.max_backoff = max_backoff
+
+		self.stored = 0
+		self.rejected = 0
+		self.failures = 0
+		self.last_error = None
+
+	def run(self):
+
+		while True:
+
+			time.sleep(self.interval)
+
+			try:
+				self.spool.rotate(min_age=self.interval)
+				self.drain()
+			except Exception as ex:
+				log.exception("draining the spool failed")
+				self.last_error = str(ex)
+
+	def drain(self):
+		'store all the segments that are not being appended to'
+
+		for path in self.spool.segments():
+
+			f = self.spool.claim(path)
+			if f is None:
+				continue
+
+			try:
+				records = read_records(f)
+
+				for i in range(0, len(records), self.batch):
+					self.write(records[i:i+self.batch])
+
+				os.unlink(path)
+			finally:
+				f.close()
+
+	def write(self, records):
+		'store a batch of records, retrying (with backoff) until the database accepts it'
+
+		backoff = 1
+		while True:
+
+			try:
+				self.store(records)
+				self.stored += len(records)
+				return
+
+			except (psycopg2.DataError, psycopg2.IntegrityError) as ex:
+
+				# the data itself is the problem, so retrying the batch won't help
+				self.split(records, ex)
+				return
+
+			except psycopg2.Error as ex:
+
+				self.failures += 1
+				self.last_error = str(ex)
+
+				log.warning("storing spooled results failed (retry in %d seconds): %s", backoff, ex)
+
+				time.sleep(backoff)
+				backoff = min(backoff * 2, self.max_backoff)
+
+			except Exception as ex:
+
+				# not a database error, so most likely a malformed record - retrying won't help
+				# either, and the segment (and all the following ones) would be stuck forever
+				self.split(records, ex)
+				return
+
+	def split(self, records, ex):
+		'store the records one by one, and set aside those that fail'
+
+		if len(records) == 1:
+			log.error("rejecting spooled record: %s", ex)
+			self.spool.reject(records[0], str(ex))
+			self.rejected += 1
+			return
+
+		for record in records:
+			self.write([record])
+
+	def stats(self):
+
+		return {
+			'segments' : len(self.spool.segments()),
+			'appended' : self.spool.appended,
+			'fsyncs' : self.spool.fsyncs,
+			'stored' : self.stored,
+			'rejected' : self.rejected,
+			'failures' : self.failures,
+			'last_error' : self.last_error,
+		}
+
+
+# the spool (and writer) of this process, None when results are stored directly
+spool = None
+writer = None
+
+def init_app(config, store):
+	'enable the spool when RESULTS_SPOOL (a directory) is set, and start the writer'
+
+	global spool, writer
+
+	if not config.get('RESULTS_SPOOL'):
+		return
+
+	spool = Spool(config['RESULTS_SPOOL'], segment_size=config.get('RESULTS_SPOOL_SEGMENT_SIZE', 16*1024*1024),
+				  fsync_delay=config.get('RESULTS_SPOOL_FSYNC_DELAY', 0.002))
+
+	writer = Writer(spool, store, batch=config.get('RESULTS_SPOOL_BATCH', 500),
+					interval=config.get('RESULTS_SPOOL_INTERVAL', 1))
+	writer.start()
@@ -1,36 +1,55 @@
 import flask
 from flask.ext.restful import Resource, abort, reqparse
 
-from db import DB
+from db import DB, Statement
+import snapshots
 
-class Overview(Resource):
+class Snapshot(Resource):
+	'''resource rendered by the refresh daemon into a JSON snapshot (see the snapshots module),
+	served as it is - the query runs only when there's no snapshot (subclasses implement
+	a static render(cursor) method, returning the response data)'''
+
+	# name of the snapshot
+	snapshot = None
+
+	def get(self):
+
+		response = snapshots.response(self.snapshot)
+		if response is not None:
+			return response
+
+		with DB() as (conn, cursor):
+			return self.render(cursor)
+
+
+class Overview(Snapshot):
 	'''Simple summary statistics
 	(a) number of distributions, distribution versions and executed tests
 	(b) result stats per PostgreSQL major version and distribution status
 	'''
 
 	# basic distribution statistics
-	_basic_sql = """SELECT
+	_basic_sql = Statement('stats_overview_basic', """SELECT
 						COUNT(DISTINCT dist_id) AS distributions,
 						COUNT(DISTINCT v.id) AS versions,
 						COUNT(*) AS tests
-					FROM distribution_versions v JOIN results r ON (r.dist_version_id = v.id)"""
+					FROM distribution_versions v JOIN results r ON (r.dist_version_id = v.id)""")
 
 	# stats of install/load/check phases (per PostgreSQL major version and distribution status)
-	_summary_sql = """SELECT * FROM results_summary"""
+	_summary_sql = Statement('stats_overview_summary', """SELECT * FROM results_summary""")
 
-	def get(self):
-		'list distributions, along with info about author (optional filtering)'
+	snapshot = 'stats'
 
-		with DB() as (conn, cursor):
+	@staticmethod
+	def render(cursor):
 
-			# basic summary stats
-			cursor.execute(Overview._basic_sql)
-			basic = cursor.fetchone()
+		# basic summary stats
+		cursor.execute(Overview._basic_sql)
+		basic = cursor.fetchone()
 
-			# stats per major version
-			cursor.execute(Overview._summary_sql)
-			summary = cursor.fetchall()
+		# stats per major version
+		cursor.execute(Overview._summary_sql)
+		summary = cursor.fetchall()
 
 		# get PostgreSQL (major) versions in the result
 		pg_versions = sorted(set([row['pg_version'] for row in summary]))
@@ -53,7 +72,7 @@ class Overview(Resource):
 		return {'basic' : basic, 'versions' : pg_versions, 'results' : results}
 
 
-class CurrentTotals(Resource):
+class CurrentTotals(Snapshot):
 	'''current summary stats, i.e. number of tests (single row), computed from
 
 	(a) last version per distribution status
@@ -65,7 +84,7 @@ class CurrentTotals(Resource):
 	'testing' then the last version for each status will be considered.
 	'''
 
-	_sql = """SELECT
+	_sql = Statement('stats_current', """SELECT
 					total_count,
 					version_count,
 					install_errors,
@@ -73,19 +92,20 @@ class CurrentTotals(Resource):
 					check_errors,
 					check_missing,
 					ok_count
-				FROM stats_current"""
+				FROM stats_current""")
 
-	def get(self):
+	snapshot = 'stats-current'
 
-		with DB() as (conn, cursor):
+	@staticmethod
+	def render(cursor):
 
-			cursor.execute(CurrentTotals._sql)
-			stats = cursor.fetchone()
+		cursor.execute(CurrentTotals._sql)
+		stats = cursor.fetchone()
 
 		return stats
 
 
-class CurrentVersions(Resource):
+class CurrentVersions(Snapshot):
 	'''current stats, i.e. number of tests, per major version, computed using:
 
 	(a) last version per distribution status
@@ -100,7 +120,7 @@ class CurrentVersions(Resource):
 	PostgreSQL major version.
 	'''
 
-	_sql = """SELECT
+	_sql = Statement('stats_current_versions', """SELECT
 					major_version,
 					total_count,
 					version_count,
@@ -110,18 +130,19 @@ class CurrentVersions(Resource):
 					check_missing,
 					ok_count
 				FROM stats_current_versions
-				ORDER BY major_version"""
+				ORDER BY major_version""")
 
-	def get(self):
+	snapshot = 'stats-current-version'
 
-		with DB() as (conn, cursor):
+	@staticmethod
+	def render(cursor):
 
-			cursor.execute(CurrentVersions._sql)
-			stats = cursor.fetchall()
+		cursor.execute(CurrentVersions._sql)
+		stats = cursor.fetchall()
 
 		return stats
 
-class CurrentStatus(Resource):
+class CurrentStatus(Snapshot):
 	'''current stats, i.e. number of tests, per release status, computed using:
 
 	(a) last version per distribution status
@@ -136,7 +157,7 @@ class CurrentStatus(Resource):
 	release status. The results are returned as a dict {status => data}.
 	'''
 
-	_sql = """SELECT
+	_sql = Statement('stats_current_status', """SELECT
 					version_status,
 					total_count,
 					version_count,
@@ -146,14 +167,15 @@ class CurrentStatus(Resource):
 					check_missing,
 					ok_count
 				FROM stats_current_version_status
-				ORDER BY version_status"""
+				ORDER BY version_status""")
 
-	def get(self):
+	snapshot = 'stats-current-version-status'
 
-		with DB() as (conn, cursor):
+	@staticmethod
+	def render(cursor):
 
-			cursor.execute(CurrentStatus._sql)
-			stats = cursor.fetchall()
+		cursor.execute(CurrentStatus._sql)
+		stats = cursor.fetchall()
 
 		result = {}
 
@@ -166,7 +188,7 @@ class CurrentStatus(Resource):
 		return result
 
 
-class MonthlyTotals(Resource):
+class MonthlyTotals(Snapshot):
 	'''monthly summary, i.e. number of tests (single row), computed from
 
 	(a) last version per distribution status
@@ -181,7 +203,7 @@ class MonthlyTotals(Resource):
 	month of the distribution release.
 	'''
 
-	_sql = """SELECT
+	_sql = Statement('stats_monthly', """SELECT
 					isodate(release_month) as month,
 					total_count,
 					version_count,
@@ -191,19 +213,20 @@ class MonthlyTotals(Resource):
 					check_missing,
 					ok_count
 				FROM stats_monthly
-				ORDER BY release_month"""
+				ORDER BY release_month""")
 
-	def get(self):
+	snapshot = 'stats-monthly'
 
-		with DB() as (conn, cursor):
+	@staticmethod
+	def render(cursor):
 
-			cursor.execute(MonthlyTotals._sql)
-			stats = cursor.fetchall()
+		cursor.execute(MonthlyTotals._sql)
+		stats = cursor.fetchall()
 
 		return stats
 
 
-class MonthlyVersions(Resource):
+class MonthlyVersions(Snapshot):
 	'''current stats, i.e. number of tests, per major version, computed using:
 
 	(a) last version per distribution status
@@ -218,7 +241,7 @@ class MonthlyVersions(Resource):
 	month of the distribution release.
 	'''
 
-	_sql = """SELECT
+	_sql = Statement('stats_monthly_versions', """SELECT
 					isodate(release_month) as release_month,
 					major_version,
 					total_count,
@@ -229,19 +252,20 @@ class MonthlyVersions(Resource):
 					check_missing,
 					ok_count
 				FROM stats_monthly_versions
-				ORDER BY release_month, major_version"""
+				ORDER BY release_month, major_version""")
 
-	def get(self):
+	snapshot = 'stats-monthly-version'
 
-		with DB() as (conn, cursor):
+	@staticmethod
+	def render(cursor):
 
-			cursor.execute(MonthlyVersions._sql)
-			stats = cursor.fetchall()
+		cursor.execute(MonthlyVersions._sql)
+		stats = cursor.fetchall()
 
 		return stats
 
 
-class MonthlyStatus(Resource):
+class MonthlyStatus(Snapshot):
 	'''current stats, i.e. number of tests, per release status, computed using:
 
 	(a) last version per distribution status
@@ -256,7 +280,7 @@ class MonthlyStatus(Resource):
 	release status. The results are returned as a dict {status => data}.
 	'''
 
-	_sql = """SELECT
+	_sql = Statement('stats_monthly_status', """SELECT
 					isodate(release_month) as release_month,
 					version_status,
 					total_count,
@@ -267,14 +291,15 @@ class MonthlyStatus(Resource):
 					check_missing,
 					ok_count
 				FROM stats_monthly_version_status
-				ORDER BY release_month, version_status"""
+				ORDER BY release_month, version_status""")
 
-	def get(self):
+	snapshot = 'stats-monthly-version-status'
 
-		with DB() as (conn, cursor):
+	@staticmethod
+	def render(cursor):
 
-			cursor.execute(MonthlyStatus._sql)
-			stats = cursor.fetchall()
+		cursor.execute(MonthlyStatus._sql)
+		stats = cursor.fetchall()
 
 		results = []
 		month = {}
@@ -302,43 +327,45 @@ class MonthlyStatus(Resource):
 		return results
 
 
-class ErrorsOverview(Resource):
+class ErrorsOverview(Snapshot):
 	'''summary of causes of failures (all releases, last test for each)'''
 
-	_sql = """SELECT
+	_sql = Statement('stats_errors', """SELECT
 					error_phase,
 					description,
 					count
 				FROM stats_errors
-				ORDER BY count DESC"""
+				ORDER BY count DESC""")
 
-	def get(self):
+	snapshot = 'stats-errors'
 
-		with DB() as (conn, cursor):
+	@staticmethod
+	def render(cursor):
 
-			cursor.execute(ErrorsOverview._sql)
-			stats = cursor.fetchall()
+		cursor.execute(ErrorsOverview._sql)
+		stats = cursor.fetchall()
 
 		return stats
 
 
-class ErrorsPerStatus(Resource):
+class ErrorsPerStatus(Snapshot):
 	'''summary of causes of failures, per release status'''
 
-	_sql = """SELECT
+	_sql = Statement('stats_errors_status', """SELECT
 					error_phase,
 					version_status,
 					description,
 					count
-				FROM stats_errors_status
-				ORDER BY count DESC"""
+				FROM stats_errors_by_status
+				ORDER BY count DESC""")
 
-	def get(self):
+	snapshot = 'stats-errors-status'
 
-		with DB() as (conn, cursor):
+	@staticmethod
+	def render(cursor):
 
-			cursor.execute(ErrorsPerStatus._sql)
-			stats = cursor.fetchall()
+		cursor.execute(ErrorsPerStatus._sql)
+		stats = cursor.fetchall()
 
 		result = {}
 
@@ -352,3 +379,30 @@ class ErrorsPerStatus(Resource):
 			result[status].append(s)
 
 		return result
+
+
+class ErrorsUnclassified(Resource):
+	'''largest clusters of similar failures not matching any of the rules (computed periodically
+	by src/cluster-errors.py), each with a representative result and an excerpt of its log'''
+
+	_sql = Statement('stats_errors_unclassified', """SELECT
+					error_phase,
+					result_count AS count,
+					result_uuid AS uuid,
+					sample AS log
+				FROM error_clusters c JOIN results r ON (r.id = c.result_id)
+				ORDER BY result_count DESC LIMIT 50""")
+
+	def get(self):
+
+		with DB() as (conn, cursor):
+
+			cursor.execute(ErrorsUnclassified._sql)
+			clusters = cursor.fetchall()
+
+		return clusters
+
+
+# resources rendered into snapshots (the trends and index pages)
+SNAPSHOTS = [Overview, CurrentTotals, CurrentVersions, CurrentStatus, MonthlyTotals, MonthlyVersions, MonthlyStatus,
+			 ErrorsOverview, ErrorsPerStatus]
@@ -1,7 +1,7 @@
 import flask
 from flask.ext.restful import Resource, abort, reqparse
 
-from db import DB
+from db import DB, Statement
 from utils import verify_signature
 import uuid
 
@@ -10,7 +10,7 @@ class UserList(Resource):
 
 	# list of users with info about published distributions, versions
 	# TODO add number of failures (total and for last versions)
-	list_sql = """SELECT user_name AS user, full_name, COALESCE(distributions, 0) AS distributions, COALESCE(versions, 0) AS versions,
+	list_sql = Statement('user_list', """SELECT user_name AS user, full_name, COALESCE(distributions, 0) AS distributions, COALESCE(versions, 0) AS versions,
 							install_ok, install_error, load_ok, load_error, check_ok, check_error, check_missing
 					FROM users u LEFT JOIN (
 						SELECT user_id, COUNT(DISTINCT dist_id) AS distributions, COUNT(*) AS versions
@@ -27,7 +27,7 @@ class UserList(Resource):
 							JOIN distributions d ON (d.id = dv.dist_id)
 						GROUP BY user_id
 					) AS stats ON (stats.user_id = u.id)
-					ORDER BY user_name"""
+					ORDER BY user_name""")
 
 	def get(self, user=None, release=None, status=None, last=None, machine=None):
 		'list distributions, along with info about author (optional filtering)'
@@ -51,21 +51,21 @@ class User(Resource):
 
 	# basic user info
 	# TODO add info about extensions with failing / passing last version
-	info_sql = """SELECT user_name AS user, full_name AS name, COALESCE(distributions, 0) AS distributions, COALESCE(versions, 0) AS versions
+	info_sql = Statement('user_info', """SELECT user_name AS user, full_name AS name, COALESCE(distributions, 0) AS distributions, COALESCE(versions, 0) AS versions
 					FROM users u LEFT JOIN (
 						SELECT user_id, COUNT(DISTINCT dist_id) AS distributions, COUNT(*) AS versions
 						FROM distributions d JOIN distribution_versions v ON (v.dist_id = d.id)
 						GROUP BY 1
-					) AS s ON (u.id = s.user_id) WHERE user_name = %(name)s"""
+					) AS s ON (u.id = s.user_id) WHERE user_name = %(name)s""")
 
 	# list of versions published by the user user
 	# TODO add number of successes / failures for each version
-	versions_sql = """SELECT dist_name AS name, version_number AS version, isodate(version_date) AS date, version_status AS status,
+	versions_sql = Statement('user_versions', """SELECT dist_name AS name, version_number AS version, isodate(version_date) AS date, version_status AS status,
 							 install_ok, install_error, load_ok, load_error, check_ok, check_error, check_missing
 						FROM distributions d JOIN distribution_versions v ON (d.id = v.dist_id)
 											 JOIN users u ON (d.user_id = u.id)
 											 LEFT JOIN results_version rv ON (v.id = rv.dist_version_id)
-						WHERE user_name = %(name)s ORDER BY dist_name, version_number DESC"""
+						WHERE user_name = %(name)s ORDER BY dist_name, version_number DESC""")
 
 	def get(self, name):
 		'get info about distribution, along with info about author'
@@ -0,0 +1,106 @@
+import sys
+import os.path
+import unittest
+
+# the libraries are located in the '../src', so add it to the python path
+sys.path.append(os.path.join(os.path.split(os.path.dirname(os.path.abspath(__file__)))[0], 'src'))
+
+from cache import ResponseCache, ENTRY_OVERHEAD
+
+class TestResponseCache(unittest.TestCase):
+	'LRU cache of responses, invalidated by the data generation'
+
+	def test_hit(self):
+
+		cache = ResponseCache(1024*1024)
+		cache.put('/stats?', 1, 'response', 100)
+
+		self.assertEqual(cache.get('/stats?', 1), 'response')
+		self.assertEqual(cache.get('/users?', 1), None)
+
+		stats = cache.stats()
+		self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (1, 1, 1))
+
+	def test_generation(self):
+
+		cache = ResponseCache(1024*1024)
+		cache.put('/stats?', 1, 'response', 100)
+
+		# a newer generation is a miss, and the stale entry is gone
+		self.assertEqual(cache.get('/stats?', 2), None)
+		self.assertEqual(cache.stats()['entries'], 0)
+		self.assertEqual(cache.stats()['size'], 0)
+
+	def test_eviction(self):
+
+		# room for four entries
+		size = 1000 + len('/a?') + ENTRY_OVERHEAD
+		cache = ResponseCache(size * 4 + 10)
+
+		for key in ['/a?', '/b?', '/c?', '/d?']:
+			cache.put(key, 1, key, 1000)
+
+		# touch the oldest entry, so that the second one gets evicted
+		self.assertEqual(cache.get('/a?', 1), '/a?')
+		cache.put('/e?', 1, '/e?', 1000)
+
+		self.assertEqual(cache.get('/b?', 1), None)
+		self.assertEqual(cache.get('/a?', 1), '/a?')
+		self.assertEqual(cache.get('/e?', 1), '/e?')
+		self.assertEqual(cache.stats()['evictions'], 1)
+		self.assertTrue(cache.stats()['size'] <= cache.max_size)
+
+	def test_large(self):
+
+		# responses larger than a quarter of the cache are not cached
+		cache = ResponseCache(10000)
+		cache.put('/large?', 1, 'response', 5000)
+
+		self.assertEqual(cache.get('/large?', 1), None)
+
+	def test_invalidate(self):
+
+		cache = ResponseCache(1024*1024)
+		cache.put('/a?', 1, 'a', 100)
+		cache.put('/b?', 1, 'b', 100)
+
+		cache.invalidate('/a?')
+		self.assertEqual(cache.get('/a?', 1), None)
+		self.assertEqual(cache.get('/b?', 1), 'b')
+
+		cache.invalidate()
+		self.assertEqual(cache.stats()['entries'], 0)
+
+	def test_tags(self):
+
+		cache = ResponseCache(1024*1024)
+		cache.put('/distributions/a?', 1, 'a', 100, tags=['dist:a'])
+		cache.put('/distributions/b?', 1, 'b', 100, tags=['dist:b'])
+		cache.put('/unknown?', 1, 'u', 100, tags=['*'])
+
+		# only entries with the tag (and those depending on everything) are invalidated
+		cache.invalidate_tags(set(['dist:a']))
+
+		self.assertEqual(cache.get('/distributions/a?', 1), None)
+		self.assertEqual(cache.get('/distributions/b?', 1), 'b')
+		self.assertEqual(cache.get('/unknown?', 1), None)
+
+		cache.invalidate_tags(set(['*']))
+		self.assertEqual(cache.stats()['entries'], 0)
+
+	def test_stamp(self):
+
+		cache = ResponseCache(1024*1024)
+
+		# the data changed while the response was being computed
+		stamp = cache.stamp()
+		cache.invalidate_tags(set(['dist:a']))
+
+		cache.put('/distributions/a?', 1, 'a', 100, tags=['dist:a'], stamp=stamp)
+		cache.put('/distributions/b?', 1, 'b', 100, tags=['dist:b'], stamp=stamp)
+
+		self.assertEqual(cache.get('/distributions/a?', 1), None)
+		self.assertEqual(cache.get('/distributions/b?', 1), 'b')
+
+if __name__ == '__main__':
+	unittest.main()
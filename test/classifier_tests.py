@@ -0,0 +1,76 @@
+import sys
+import os.path
+import unittest
+
+# the libraries are located in the '../src', so add it to the python path
+sys.path.append(os.path.join(os.path.split(os.path.dirname(os.path.abspath(__file__)))[0], 'src'))
+
+from classifier import Classifier, Rule, GROUPS_MAX
+
+class TestClassifier(unittest.TestCase):
+	'classification of errors using the rules'
+
+	def setUp(self):
+
+		self.rules = [
+			Rule(1, 'install', r'Makefile\.global', 'missing Makefile.global'),
+			Rule(2, 'install', r'No such file or directory', 'no such file or directory'),
+			Rule(3, 'install', r"error: '.*' undeclared", 'undeclared identifier'),
+			Rule(4, 'check', r'server closed the connection unexpectedly', 'crash'),
+			Rule(5, 'install', r'(invalid', 'invalid pattern'),
+			Rule(6, 'install', r'(group)', 'capturing group'),
+		]
+
+		self.classifier = Classifier(self.rules)
+
+	def test_priority(self):
+
+		log = "foo.c:10: error: 'x' undeclared\n/usr/lib/pgxs/src/Makefile.global: No such file or directory\n"
+
+		# the rule with the highest priority wins, even if it matches later in the log
+		self.assertEqual(self.classifier.classify('install', log).id, 1)
+		self.assertEqual(self.classifier.classify('install', "foo.c:10: error: 'x' undeclared").id, 3)
+		self.assertEqual(self.classifier.classify('install', 'all fine'), None)
+
+	def test_overlapping(self):
+
+		rules = [
+			Rule(10, 'install', r'Makefile\.global', 'missing Makefile.global'),
+			Rule(210, 'install', r'cannot create regular file .*: Permission denied', 'permission denied'),
+		]
+
+		log = "install: cannot create regular file '/usr/lib/pgxs/src/Makefile.global': Permission denied"
+
+		# the higher-priority rule matches within the match of the other one
+		self.assertEqual(Classifier(rules).classify('install', log).id, 10)
+
+	def test_within_line(self):
+
+		self.assertEqual(self.classifier.classify('install', "error: 'x\n' undeclared"), None)
+
+	def test_invalid_rules(self):
+
+		self.assertEqual(self.classifier.classify('install', '(invalid'), None)
+		self.assertEqual(self.classifier.classify('install', 'group'), None)
+
+	def test_analyze(self):
+
+		result = {'install' : 'ok', 'load' : 'ok', 'check' : 'error'}
+
+		matched = self.classifier.analyze(result, {'check' : u'make installcheck', 'diff' : u'server closed the connection unexpectedly'})
+		self.assertEqual([r.id for r in matched], [4])
+
+		# only the failed phases are classified
+		matched = self.classifier.analyze(result, {'install' : u'Makefile.global'})
+		self.assertEqual(matched, [])
+
+	def test_many_rules(self):
+
+		rules = [Rule(i, 'install', 'pattern %d$' % (i,), 'rule %d' % (i,)) for i in range(GROUPS_MAX * 2 + 10)]
+		classifier = Classifier(rules)
+
+		self.assertEqual(classifier.classify('install', 'pattern 150').id, 150)
+		self.assertEqual(classifier.classify('install', 'pattern 5\npattern 205').id, 5)
+
+if __name__ == '__main__':
+	unittest.main()
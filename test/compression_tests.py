@@ -0,0 +1,75 @@
+import gzip
+import json
+import sys
+import os.path
+import StringIO
+import unittest
+
+# the libraries are located in the '../src', so add it to the python path
+sys.path.append(os.path.join(os.path.split(os.path.dirname(os.path.abspath(__file__)))[0], 'src'))
+
+from flask import Flask
+
+import compression
+
+def gunzip(data):
+	return gzip.GzipFile(fileobj=StringIO.StringIO(data)).read()
+
+
+class TestCompression(unittest.TestCase):
+	'gzip / brotli compression of the responses'
+
+	def setUp(self):
+
+		app = Flask(__name__)
+
+		compression.init_app({'COMPRESSION_MIN_SIZE' : 100, 'COMPRESSION_STREAM_SIZE' : 10000})
+
+		self.small = json.dumps({'a' : 1})
+		self.large = json.dumps({'log' : 'error ' * 1000})
+		self.huge = json.dumps({'log' : 'error ' * 10000})
+
+		@app.route('/<name>')
+		@compression.compressed
+		def resource(name):
+			return app.response_class(getattr(self, name), mimetype='application/json')
+
+		self.client = app.test_client()
+
+	def test_small(self):
+
+		response = self.client.get('/small', headers={'Accept-Encoding' : 'gzip'})
+		self.assertFalse('Content-Encoding' in response.headers)
+		self.assertEqual(response.data, self.small)
+
+	def test_gzip(self):
+
+		response = self.client.get('/large', headers={'Accept-Encoding' : 'gzip, deflate'})
+		self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+		self.assertTrue('Accept-Encoding' in response.vary)
+		self.assertEqual(gunzip(response.data), self.large)
+
+		# the compressed body is reused
+		self.client.get('/large', headers={'Accept-Encoding' : 'gzip'})
+		self.assertEqual(compression.bodies.stats()['hits'], 1)
+
+	def test_identity(self):
+
+		response = self.client.get('/large')
+		self.assertFalse('Content-Encoding' in response.headers)
+		self.assertTrue('Accept-Encoding' in response.vary)
+
+		# brotli only (not available without the module)
+		if compression.brotli is None:
+			response = self.client.get('/large', headers={'Accept-Encoding' : 'br'})
+			self.assertFalse('Content-Encoding' in response.headers)
+
+	def test_stream(self):
+
+		response = self.client.get('/huge', headers={'Accept-Encoding' : 'gzip'})
+		self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+		self.assertFalse('Content-Length' in response.headers)
+		self.assertEqual(gunzip(response.data), self.huge)
+
+if __name__ == '__main__':
+	unittest.main()
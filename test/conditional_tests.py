@@ -0,0 +1,104 @@
+import datetime
+import sys
+import os.path
+import time
+import unittest
+
+# the libraries are located in the '../src', so add it to the python path
+sys.path.append(os.path.join(os.path.split(os.path.dirname(os.path.abspath(__file__)))[0], 'src'))
+
+from flask import Flask
+
+import conditional
+import generation
+
+class TestConditional(unittest.TestCase):
+	'ETag / Last-Modified and conditional GET'
+
+	def setUp(self):
+
+		self.calls = []
+
+		app = Flask(__name__)
+
+		@app.route('/results/<rid>')
+		@conditional.conditional
+		def result(rid):
+			self.calls.append(rid)
+			return app.response_class('result', headers={'Last-Modified' : 'Thu, 01 Jan 2015 00:00:00 GMT'})
+
+		@app.route('/stats')
+		@conditional.conditional
+		def stats():
+			self.calls.append('stats')
+			return 'stats'
+
+		self.client = app.test_client()
+
+		# pretend the generation 10 was noticed a minute ago (and is current for a while)
+		generation._current = 10
+		generation._checked = time.time() + 3600
+		generation._changed = time.time() - 60
+
+	def test_immutable(self):
+
+		self.assertTrue(conditional.immutable('/results/abc'))
+		self.assertTrue(conditional.immutable('/results/abc/logs/install'))
+		self.assertFalse(conditional.immutable('/results/batch'))
+		self.assertFalse(conditional.immutable('/results'))
+
+		response = self.client.get('/results/abc')
+		self.assertEqual(response.status_code, 200)
+		self.assertTrue('immutable' in response.headers['Cache-Control'])
+
+		etag = response.headers['ETag']
+
+		# matching ETag - the resource is not called at all
+		response = self.client.get('/results/abc', headers={'If-None-Match' : etag})
+		self.assertEqual(response.status_code, 304)
+		self.assertEqual(self.calls, ['abc'])
+
+		# different result, different ETag
+		response = self.client.get('/results/xyz', headers={'If-None-Match' : etag})
+		self.assertEqual(response.status_code, 200)
+
+		# Last-Modified comes from the resource
+		response = self.client.get('/results/abc', headers={'If-Modified-Since' : 'Thu, 01 Jan 2015 00:00:00 GMT'})
+		self.assertEqual(response.status_code, 304)
+
+	def test_generation(self):
+
+		response = self.client.get('/stats')
+		self.assertEqual(response.status_code, 200)
+		self.assertTrue(response.headers['ETag'].startswith('"g10-'))
+
+		etag = response.headers['ETag']
+		last_modified = response.headers['Last-Modified']
+
+		self.assertEqual(self.client.get('/stats', headers={'If-None-Match' : etag}).status_code, 304)
+		self.assertEqual(self.client.get('/stats', headers={'If-Modified-Since' : last_modified}).status_code, 304)
+		self.assertEqual(self.calls, ['stats'])
+
+		# the callback is part of the ETag
+		self.assertNotEqual(self.client.get('/stats?callback=pgxn_x').headers['ETag'], etag)
+
+		# new generation, the old validators don't match anymore
+		generation._current = 11
+		generation._changed = time.time()
+
+		self.assertEqual(self.client.get('/stats', headers={'If-None-Match' : etag}).status_code, 200)
+		self.assertEqual(self.client.get('/stats', headers={'If-Modified-Since' : last_modified}).status_code, 200)
+
+	def test_dates(self):
+
+		# a fresh generation - Last-Modified is the response time
+		(settled, last_modified) = conditional.generation_dates(1000, 1001, 1)
+		self.assertEqual(settled, datetime.datetime.utcfromtimestamp(1003))
+		self.assertEqual(last_modified, datetime.datetime.utcfromtimestamp(1001))
+
+		# an old generation - Last-Modified is fixed (and later than settled)
+		(settled, last_modified) = conditional.generation_dates(1000, 5000, 1)
+		self.assertEqual(last_modified, datetime.datetime.utcfromtimestamp(1004))
+
+if __name__ == '__main__':
+	unittest.main()
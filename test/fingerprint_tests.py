@@ -0,0 +1,81 @@
+import sys
+import os.path
+import unittest
+
+# the libraries are located in the '../src', so add it to the python path
+sys.path.append(os.path.join(os.path.split(os.path.dirname(os.path.abspath(__file__)))[0], 'src'))
+
+import fingerprint
+from fingerprint import Clusters
+
+LOG = u"""gcc -O2 -Wall -fpic -I. -I/usr/include/postgresql/%(version)s/server -c -o %(file)s.o %(file)s.c
+%(file)s.c:%(line)d:5: error: 'heap_open' undeclared (first use in this function)
+%(file)s.c:%(line)d:5: note: each undeclared identifier is reported only once
+make: *** [%(file)s.o] Error 1 at 0x%(addr)x
+"""
+
+class TestFingerprint(unittest.TestCase):
+	'fingerprinting and clustering of failure logs'
+
+	def test_normalize(self):
+
+		lines = fingerprint.normalize(u"/home/user/src/foo.c:123: error at 0xdeadbeef\n\n   spaces   here  ")
+
+		self.assertEqual(lines, [u'PATH:N: error at ADDR', u'spaces here'])
+
+	def test_similarity(self):
+
+		a = fingerprint.minhash(fingerprint.shingles(fingerprint.normalize(LOG % {'version' : '9.4', 'file' : 'foo', 'line' : 10, 'addr' : 1})))
+		b = fingerprint.minhash(fingerprint.shingles(fingerprint.normalize(LOG % {'version' : '9.6', 'file' : 'foo', 'line' : 200, 'addr' : 2})))
+		c = fingerprint.minhash(fingerprint.shingles(fingerprint.normalize(u"ERROR: could not load library: undefined symbol\n")))
+
+		self.assertEqual(a, b)
+		self.assertTrue(fingerprint.similarity(a, c) < 0.2)
+
+	def test_clusters(self):
+
+		clusters = Clusters()
+
+		for i in range(10):
+			clusters.add(LOG % {'version' : '9.%d' % (i % 4,), 'file' : 'foo', 'line' : i, 'addr' : i}, i)
+
+		# a different file, but otherwise the same failure
+		clusters.add(LOG % {'version' : '9.4', 'file' : 'bar', 'line' : 1, 'addr' : 1}, 10)
+		clusters.add(u"ERROR: could not load library: undefined symbol\n", 11)
+
+		largest = clusters.largest()
+
+		self.assertEqual([c.count for c in largest], [11])
+		self.assertEqual(largest[0].result_id, 0)
+		self.assertTrue("error: 'heap_open' undeclared" in largest[0].sample)
+
+	def test_prune(self):
+
+		clusters = Clusters(max_clusters=2)
+
+		clusters.add(LOG % {'version' : '9.4', 'file' : 'foo', 'line' : 1, 'addr' : 1}, 1)
+		clusters.add(LOG % {'version' : '9.4', 'file' : 'foo', 'line' : 2, 'addr' : 1}, 2)
+		clusters.add(u"ERROR: could not load library: undefined symbol\n", 3)
+		clusters.add(u"make: *** No rule to make target `install'.  Stop.\n", 4)
+
+		# the single-log clusters got forgotten
+		self.assertEqual([c.count for c in clusters.clusters], [2])
+
+	def test_prune_bounded(self):
+
+		clusters = Clusters(max_clusters=4)
+
+		# distinct failures, each seen twice (so no cluster is a singleton)
+		for i in range(20):
+			log = u"ERROR: failure%d in module%d at stage%d with code%d\n" % (i, i, i, i)
+			clusters.add(log, i * 2)
+			clusters.add(log, i * 2 + 1)
+
+			self.assertTrue(len(clusters.clusters) <= 4)
+
+		# the recent failures are still tracked
+		self.assertTrue(clusters.clusters)
+		self.assertTrue(19 * 2 in [c.result_id for c in clusters.clusters])
+
+if __name__ == '__main__':
+	unittest.main()
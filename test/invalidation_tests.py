@@ -0,0 +1,43 @@
+import re
+import sys
+import os.path
+import unittest
+
+# the libraries are located in the '../src', so add it to the python path
+sys.path.append(os.path.join(os.path.split(os.path.dirname(os.path.abspath(__file__)))[0], 'src'))
+
+import invalidation
+
+class TestInvalidation(unittest.TestCase):
+	'tags of resources and notifications'
+
+	def test_tags(self):
+
+		self.assertEqual(invalidation.tags('/distributions/pgtap'), ['dist:pgtap'])
+		self.assertEqual(invalidation.tags('/distributions/pgtap/0.95.0'), ['dist:pgtap', 'views'])
+		self.assertEqual(invalidation.tags('/machines/alpha/queue/9.5'), ['machine:alpha', 'distributions'])
+		self.assertEqual(invalidation.tags('/stats/current'), ['views'])
+		self.assertEqual(invalidation.tags('/stats/errors/unclassified'), ['clusters'])
+
+		# immutable results depend on nothing, unknown resources on everything
+		self.assertEqual(invalidation.tags('/results/abc'), [])
+		self.assertEqual(invalidation.tags('/something'), [invalidation.ALL])
+
+	def test_parse(self):
+
+		self.assertEqual(invalidation.parse('["results", "dist:pgtap"]'), set(['results', 'dist:pgtap']))
+		self.assertEqual(invalidation.parse('garbage'), set([invalidation.ALL]))
+
+	def test_ban_regex(self):
+
+		regex = re.compile(invalidation.ban_regex(set(['dist:pgtap', 'results'])))
+
+		self.assertTrue(regex.search('dist:pgtap'))
+		self.assertTrue(regex.search('distributions results'))
+		self.assertTrue(regex.search('*'))
+		self.assertFalse(regex.search('dist:pgtap2 views'))
+
+		self.assertEqual(invalidation.ban_regex(set([invalidation.ALL])), '.*')
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,92 @@
+import sys
+import os.path
+import unittest
+
+# the libraries are located in the '../src', so add it to the python path
+sys.path.append(os.path.join(os.path.split(os.path.dirname(os.path.abspath(__file__)))[0], 'src'))
+
+import blobs
+import logs
+
+class TestBlobs(unittest.TestCase):
+	'compression and deduplication of blobs'
+
+	def setUp(self):
+		blobs.known = blobs.KnownHashes()
+
+	def test_roundtrip(self):
+
+		data = "make: *** No rule to make target `install'.  Stop.\n" * 100
+
+		(codec, compressed) = blobs.compress(data)
+
+		self.assertEqual(codec, 'zlib')
+		self.assertTrue(len(compressed) < len(data))
+		self.assertEqual(blobs.decompress(codec, compressed), data)
+
+		self.assertRaises(ValueError, blobs.decompress, 'lz4', compressed)
+
+	def test_dedup(self):
+
+		blobset = blobs.BlobSet()
+
+		a = blobset.add('{"CC" : "gcc"}')
+		b = blobset.add('{"CC" : "gcc"}')
+
+		self.assertEqual(a, b)
+		self.assertEqual(blobset.add(None), None)
+		self.assertEqual(len(blobset.params()['blob_hashes']), 1)
+		self.assertEqual(blobset.params()['blob_sizes'], [14])
+
+		# once stored, the blob is not sent again
+		blobset.stored()
+
+		blobset = blobs.BlobSet()
+
+		self.assertEqual(blobset.add('{"CC" : "gcc"}'), a)
+		self.assertEqual(blobset.params()['blob_hashes'], [])
+
+	def test_known_bounded(self):
+
+		blobs.known.add(['a', 'b', 'c'])
+		self.assertTrue('a' in blobs.known)
+
+		size = blobs.known_size
+		blobs.known_size = 3
+		try:
+			blobs.known.add(['d'])
+		finally:
+			blobs.known_size = size
+
+		# 'b' was the least recently used one
+		self.assertFalse('b' in blobs.known)
+		self.assertTrue('a' in blobs.known)
+		self.assertTrue('d' in blobs.known)
+
+
+class TestLogs(unittest.TestCase):
+	'selection of result logs'
+
+	def test_selector(self):
+
+		self.assertEqual(logs.parse_selector(None), [])
+		self.assertEqual(logs.parse_selector('all'), ['install', 'load', 'check', 'diff'])
+		self.assertEqual(logs.parse_selector('install, diff'), ['install', 'diff'])
+
+		self.assertRaises(ValueError, logs.parse_selector, 'install,config')
+
+	def test_params(self):
+
+		blobset = blobs.BlobSet()
+		hashes = logs.add_logs(blobset, {'install' : 'install log', 'load' : None, 'diff' : 'install log'})
+
+		self.assertEqual(sorted(hashes.keys()), ['diff', 'install'])
+		self.assertEqual(hashes['install'], hashes['diff'])
+
+		params = logs.log_params(hashes)
+
+		self.assertEqual(params['log_names'], ['install', 'diff'])
+		self.assertEqual(len(params['log_hashes']), 2)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,73 @@
+import sys
+import os.path
+import unittest
+
+# the libraries are located in the '../src', so add it to the python path
+sys.path.append(os.path.join(os.path.split(os.path.dirname(os.path.abspath(__file__)))[0], 'src'))
+
+from lookups import Lookup
+
+class TestLookup(unittest.TestCase):
+	'in-process cache of database lookups'
+
+	def setUp(self):
+
+		self.data = {'a' : 1, 'b' : 2}
+		self.queries = []
+
+		def load(cursor, keys):
+			self.queries.append(sorted(keys))
+			return {k : self.data[k] for k in keys if k in self.data}
+
+		self.lookup = Lookup(load, ttl=60)
+
+	def test_cached(self):
+
+		self.assertEqual(self.lookup.get(None, ['a', 'b', 'c']), {'a' : 1, 'b' : 2})
+		self.assertEqual(self.lookup.get(None, ['a', 'b']), {'a' : 1, 'b' : 2})
+
+		# only the first call hits the database
+		self.assertEqual(self.queries, [['a', 'b', 'c']])
+
+	def test_missing_not_cached(self):
+
+		self.assertEqual(self.lookup.get(None, ['c']), {})
+
+		self.data['c'] = 3
+
+		self.assertEqual(self.lookup.get(None, ['c']), {'c' : 3})
+
+	def test_invalidate(self):
+
+		self.lookup.get(None, ['a'])
+
+		self.data['a'] = 10
+		self.assertEqual(self.lookup.get(None, ['a']), {'a' : 1})
+		self.assertEqual(self.lookup.get(None, ['a'], refresh=True), {'a' : 10})
+
+		self.data['a'] = 100
+		self.lookup.invalidate('a')
+		self.assertEqual(self.lookup.get(None, ['a']), {'a' : 100})
+
+	def test_expiration(self):
+
+		self.lookup.ttl = -1
+
+		self.lookup.get(None, ['a'])
+		self.lookup.get(None, ['a'])
+
+		self.assertEqual(self.queries, [['a'], ['a']])
+
+	def test_cached_only(self):
+
+		self.lookup.ttl = -1
+		self.lookup.get(None, ['a'])
+
+		# expired entries are returned only when asked for
+		self.assertEqual(self.lookup.cached(['a', 'b']), {})
+		self.assertEqual(self.lookup.cached(['a', 'b'], expired=True), {'a' : 1})
+
+		self.assertEqual(self.queries, [['a']])
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,246 @@
+import BaseHTTPServer
+import json
+import sys
+import os
+import os.path
+import shutil
+import tempfile
+import threading
+import unittest
+
+# the libraries are located in the '../src', so add it to the python path
+sys.path.append(os.path.join(os.path.split(os.path.dirname(os.path.abspath(__file__)))[0], 'src'))
+
+import pgxn
+
+# a tiny fake of the PGXN API
+TEMPLATES = {'userlist' : '/users/{letter}.json', 'user' : '/user/{user}.json', 'meta' : '/dist/{dist}/{version}/META.json'}
+
+USERS = {
+	'a' : [{'user' : 'alice', 'name' : 'Alice'}, {'user' : 'adam', 'name' : 'Adam'}],
+	'b' : [{'user' : 'bob', 'name' : 'Bob'}],
+}
+
+RELEASES = {
+	'alice' : {'semver' : {'stable' : [{'version' : '0.2.0', 'date' : '2014-02-01T00:00:00Z'}, {'version' : '0.1.0', 'date' : '2014-01-01T00:00:00Z'}],
+						   'testing' : [{'version' : '0.3.0', 'date' : '2014-03-01T00:00:00Z'}]}},
+	'adam' : {},
+	'bob' : {'pgtap' : {'stable' : [{'version' : '0.95.0', 'date' : '2015-01-01T00:00:00Z'}]}},
+}
+
+class FakePGXN(BaseHTTPServer.BaseHTTPRequestHandler):
+
+	protocol_version = 'HTTP/1.1'
+
+	# buffer the responses (headers and body written separately get delayed by Nagle)
+	wbufsize = -1
+
+	# number of requests to fail (with 503) before responding
+	failures = 0
+
+	# paths requested so far
+	requests = []
+
+	def do_GET(self):
+
+		FakePGXN.requests.append(self.path)
+
+		if FakePGXN.failures > 0:
+			FakePGXN.failures -= 1
+			return self.reply(503, '')
+
+		parts = self.path.strip('/').split('/')
+
+		if self.path == '/index.json':
+			return self.reply(200, json.dumps(TEMPLATES))
+		elif parts[0] == 'users' and parts[1][:-5] in USERS:
+			return self.reply(200, json.dumps(USERS[parts[1][:-5]]))
+		elif parts[0] == 'user':
+			return self.reply(200, json.dumps({'releases' : RELEASES[parts[1][:-5]]}))
+		elif parts[0] == 'dist':
+			return self.reply(200, json.dumps({'name' : parts[1], 'version' : parts[2]}))
+
+		self.reply(404, '')
+
+	def reply(self, status, body):
+
+		etag = '"%x"' % (hash(body) & 0xffffffff,)
+
+		# conditional request for an unchanged document
+		if (status == 200) and (self.headers.getheader('If-None-Match') == etag):
+			(status, body) = (304, '')
+
+		self.send_response(status)
+		self.send_header('Content-Length', str(len(body)))
+		if status in (200, 304):
+			self.send_header('ETag', etag)
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, *args):
+		pass
+
+
+class TestCrawler(unittest.TestCase):
+	'concurrent crawling of the PGXN API'
+
+	def setUp(self):
+
+		self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), FakePGXN)
+
+		thread = threading.Thread(target=self.server.serve_forever)
+		thread.daemon = True
+		thread.start()
+
+		self.client = pgxn.Client('127.0.0.1:%d' % (self.server.server_address[1],), max_per_host=1, retries=2, backoff=0)
+
+	def tearDown(self):
+		self.client.close()
+		self.server.shutdown()
+		self.server.server_close()
+		FakePGXN.failures = 0
+		FakePGXN.requests = []
+
+	def test_crawl(self):
+
+		users = []
+		pgxn.Crawler(self.client, workers=4).crawl(users.append)
+
+		# users without releases are passed too (so that their marker gets stored)
+		users = dict([(u['user'], u) for u in users])
+		self.assertEqual(sorted(users.keys()), ['adam', 'alice', 'bob'])
+		self.assertEqual(users['adam']['releases'], {})
+
+		versions = users['alice']['releases']['semver']
+		self.assertEqual([v['version'] for v in versions], ['0.3.0', '0.2.0', '0.1.0'])
+		self.assertEqual(versions[0]['state'], 'testing')
+		self.assertEqual(versions[0]['meta'], {'name' : 'semver', 'version' : '0.3.0'})
+
+	def test_incremental(self):
+
+		state = pgxn.State()
+
+		users = []
+		pgxn.Crawler(self.client, workers=4, state=state).crawl(users.append)
+
+		# what a sync would store - the markers of users and user lists, and the versions
+		markers = dict([(u['uri'], u['marker']) for u in users])
+		markers.update(dict([(uri, marker) for (uri, (marker, document)) in state.fetched.items()]))
+		documents = dict([(uri, document) for (uri, (marker, document)) in state.fetched.items()])
+		versions = set([(r, v['version']) for u in users for (r, tmp) in u['releases'].items() for v in tmp])
+
+		self.assertEqual(len(versions), 4)
+
+		# nothing changed, so no users and no META documents
+		FakePGXN.requests = []
+		users = []
+
+		crawler = pgxn.Crawler(self.client, workers=4, state=pgxn.State(markers, documents, versions))
+		crawler.crawl(users.append)
+
+		self.assertEqual(users, [])
+		self.assertEqual(crawler.unchanged, 3)
+		self.assertFalse(any(['META' in r for r in FakePGXN.requests]))
+
+		# a new version - only its META gets fetched
+		RELEASES['bob']['pgtap']['stable'].append({'version' : '0.96.0', 'date' : '2015-02-01T00:00:00Z'})
+
+		try:
+			FakePGXN.requests = []
+			users = []
+			pgxn.Crawler(self.client, workers=4, state=pgxn.State(markers, documents, versions)).crawl(users.append)
+		finally:
+			RELEASES['bob']['pgtap']['stable'].pop()
+
+		self.assertEqual([u['user'] for u in users], ['bob'])
+		self.assertEqual([v['version'] for v in users[0]['releases']['pgtap']], ['0.96.0'])
+		self.assertEqual([r for r in FakePGXN.requests if 'META' in r], ['/dist/pgtap/0.96.0/META.json'])
+
+	def test_retry(self):
+
+		FakePGXN.failures = 2
+		self.assertEqual(self.client.get('/index.json'), TEMPLATES)
+		self.assertEqual(self.client.failures, 2)
+
+		FakePGXN.failures = 3
+		self.assertRaises(pgxn.HTTPError, self.client.get, '/index.json')
+
+	def test_missing(self):
+		self.assertEqual(self.client.get('/nothing.json'), None)
+
+class TestMirror(unittest.TestCase):
+	'crawling a local mirror of PGXN'
+
+	def setUp(self):
+
+		self.root = tempfile.mkdtemp()
+
+		self.write('/index.json', TEMPLATES)
+
+		for (letter, users) in USERS.items():
+			self.write(pgxn.expand(TEMPLATES['userlist'], letter=letter), users)
+
+		for (user, releases) in RELEASES.items():
+			self.write(pgxn.expand(TEMPLATES['user'], user=user), {'releases' : releases})
+			for (release, states) in releases.items():
+				for version in [v for tmp in states.values() for v in tmp]:
+					self.write(pgxn.expand(TEMPLATES['meta'], dist=release, version=version['version']),
+							   {'name' : release, 'version' : version['version']})
+
+	def tearDown(self):
+		shutil.rmtree(self.root)
+
+	def write(self, uri, document):
+
+		path = os.path.join(self.root, uri.lstrip('/'))
+
+		if not os.path.isdir(os.path.dirname(path)):
+			os.makedirs(os.path.dirname(path))
+
+		with open(path, 'w') as f:
+			json.dump(document, f)
+
+	def test_crawl(self):
+
+		mirror = pgxn.Mirror(self.root)
+
+		users = []
+		pgxn.MirrorCrawler(mirror, workers=2).crawl(users.append)
+
+		users = dict([(u['user'], u) for u in users])
+		self.assertEqual(sorted(users.keys()), ['adam', 'alice', 'bob'])
+
+		versions = users['alice']['releases']['semver']
+		self.assertEqual([v['version'] for v in versions], ['0.3.0', '0.2.0', '0.1.0'])
+		self.assertEqual(versions[0]['meta'], {'name' : 'semver', 'version' : '0.3.0'})
+
+		# index, two user lists, three users and four META documents
+		self.assertEqual(mirror.requests, 10)
+
+	def test_incremental(self):
+
+		state = pgxn.State()
+
+		users = []
+		pgxn.MirrorCrawler(pgxn.Mirror(self.root), workers=2, state=state).crawl(users.append)
+
+		markers = dict([(u['uri'], u['marker']) for u in users])
+		versions = set([(r, v['version']) for u in users for (r, tmp) in u['releases'].items() for v in tmp])
+
+		# a modified user file is read again, the other users are skipped
+		path = os.path.join(self.root, 'user', 'bob.json')
+		os.utime(path, (os.path.getmtime(path) + 10, os.path.getmtime(path) + 10))
+
+		users = []
+		crawler = pgxn.MirrorCrawler(pgxn.Mirror(self.root), workers=2, state=pgxn.State(markers, {}, versions))
+		crawler.crawl(users.append)
+
+		self.assertEqual([u['user'] for u in users], ['bob'])
+		self.assertEqual(users[0]['releases'], {'pgtap' : []})
+		self.assertEqual(crawler.unchanged, 2)
+
+	def test_missing(self):
+		self.assertEqual(pgxn.Mirror(self.root).get('/nothing.json'), None)
+
+if __name__ == '__main__':
+	unittest.main()
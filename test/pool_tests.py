@@ -0,0 +1,210 @@
+import sys
+import os.path
+import threading
+import time
+import unittest
+
+# the libraries are located in the '../src', so add it to the python path
+sys.path.append(os.path.join(os.path.split(os.path.dirname(os.path.abspath(__file__)))[0], 'src'))
+
+import psycopg2
+import psycopg2.extensions
+
+from db import DB, Pool, PoolTimeout, ReplicaSet
+
+class FakeConnection(object):
+	'mimics the few bits of a psycopg2 connection the pool needs'
+
+	def __init__(self):
+		self.closed = 0
+		self.created = time.time()
+		self.returned = self.created
+		self.dead = False
+		self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+	def get_transaction_status(self):
+		return self.status
+
+	def rollback(self):
+		self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+	def close(self):
+		self.closed = 1
+
+	def cursor(self):
+		return FakeCursor(self)
+
+class FakeCursor(object):
+
+	def __init__(self, conn):
+		self.conn = conn
+
+	def execute(self, query):
+		if self.conn.dead:
+			raise psycopg2.OperationalError('server closed the connection unexpectedly')
+
+	def close(self):
+		pass
+
+class FakePool(Pool):
+
+	def _connect(self):
+		return FakeConnection()
+
+class TestPool(unittest.TestCase):
+	'connection pool (without a database)'
+
+	def test_timeout(self):
+
+		pool = FakePool(None, minconn=1, maxconn=2, timeout=0.1)
+
+		a = pool.getconn()
+		b = pool.getconn()
+
+		self.assertRaises(PoolTimeout, pool.getconn)
+		self.assertEqual(pool.stats()['timeouts'], 1)
+		self.assertEqual(pool.stats()['in_use'], 2)
+
+		pool.putconn(a)
+		pool.putconn(b)
+
+		self.assertEqual(pool.stats()['in_use'], 0)
+		self.assertEqual(pool.stats()['idle'], 2)
+
+	def test_waiting(self):
+
+		pool = FakePool(None, minconn=0, maxconn=1, timeout=5)
+
+		conn = pool.getconn()
+		acquired = []
+
+		thread = threading.Thread(target=lambda: acquired.append(pool.getconn()))
+		thread.start()
+
+		time.sleep(0.1)
+		self.assertEqual(pool.stats()['waiting'], 1)
+
+		pool.putconn(conn)
+		thread.join()
+
+		# the waiter got the very same connection
+		self.assertEqual(acquired, [conn])
+		self.assertEqual(pool.stats()['waiting'], 0)
+
+	def test_dead_connection(self):
+
+		pool = FakePool(None, minconn=0, maxconn=1, timeout=1)
+
+		conn = pool.getconn()
+		pool.putconn(conn)
+
+		conn.closed = 2
+
+		self.assertIsNot(pool.getconn(), conn)
+		self.assertEqual(pool.stats()['discarded'], 1)
+
+	def test_idle_check(self):
+
+		pool = FakePool(None, minconn=0, maxconn=1, timeout=1, idle_check=10)
+
+		conn = pool.getconn()
+		pool.putconn(conn)
+
+		# idle for a while, but still alive
+		conn.returned -= 60
+		self.assertIs(pool.getconn(), conn)
+		pool.putconn(conn)
+
+		# killed by the server (the client does not know yet), but used recently
+		conn.dead = True
+		self.assertIs(pool.getconn(), conn)
+		pool.putconn(conn)
+
+		# idle for too long, so the probe finds out
+		conn.returned -= 60
+		self.assertIsNot(pool.getconn(), conn)
+		self.assertEqual(pool.stats()['discarded'], 1)
+		self.assertEqual(pool.stats()['in_use'], 1)
+
+	def test_max_age(self):
+
+		pool = FakePool(None, minconn=0, maxconn=1, timeout=1, max_age=60)
+
+		conn = pool.getconn()
+		pool.putconn(conn)
+
+		conn.created -= 120
+
+		self.assertIsNot(pool.getconn(), conn)
+
+	def test_rollback(self):
+
+		pool = FakePool(None, minconn=0, maxconn=1, timeout=1)
+
+		conn = pool.getconn()
+		conn.status = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+		pool.putconn(conn)
+
+		self.assertEqual(conn.get_transaction_status(), psycopg2.extensions.TRANSACTION_STATUS_IDLE)
+		self.assertIs(pool.getconn(), conn)
+
+class FakeReplicaSet(ReplicaSet):
+
+	def __init__(self, pools, lags, **kwargs):
+		super(FakeReplicaSet, self).__init__(pools, **kwargs)
+		self._fake_lags = lags
+
+	def _measure_lag(self, pool):
+		return self._fake_lags[self._pools.index(pool)]
+
+class TestReplicaSet(unittest.TestCase):
+	'routing of read-only contexts to replicas'
+
+	def test_round_robin(self):
+
+		pools = [FakePool(None, minconn=0, maxconn=1) for i in range(3)]
+		replicas = FakeReplicaSet(pools, [0, 0, 0])
+
+		self.assertEqual([replicas.choose() for i in range(6)], pools + pools)
+
+	def test_least_busy(self):
+
+		pools = [FakePool(None, minconn=0, maxconn=2) for i in range(2)]
+		replicas = FakeReplicaSet(pools, [0, 0], policy='least-busy')
+
+		pools[0].getconn()
+
+		self.assertIs(replicas.choose(), pools[1])
+
+	def test_lag(self):
+
+		pools = [FakePool(None, minconn=0, maxconn=1) for i in range(2)]
+
+		# the first replica is lagging, the second one is unreachable
+		replicas = FakeReplicaSet(pools, [30, None], max_lag=10)
+		self.assertIs(replicas.choose(), None)
+
+		replicas = FakeReplicaSet(pools, [30, 5], max_lag=10)
+		self.assertIs(replicas.choose(), pools[1])
+		self.assertIs(replicas.choose(), pools[1])
+
+	def test_failed(self):
+
+		pools = [FakePool(None, minconn=0, maxconn=1) for i in range(2)]
+		replicas = FakeReplicaSet(pools, [0, 0])
+
+		# a replica that failed is skipped for a while
+		replicas.failed(pools[0])
+		self.assertEqual([replicas.choose() for i in range(4)], [pools[1]] * 4)
+
+	def test_lazy(self):
+
+		# an unreachable replica does not prevent the startup
+		try:
+			DB.init_replicas(['host=/nonexistent port=1'], minconn=1, maxconn=1)
+			self.assertEqual(DB._replicas.stats()[0]['open'], 0)
+		finally:
+			DB._replicas = None
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,72 @@
+import sys
+import os.path
+import unittest
+
+# the libraries are located in the '../src', so add it to the python path
+sys.path.append(os.path.join(os.path.split(os.path.dirname(os.path.abspath(__file__)))[0], 'src'))
+
+import profiling
+
+from profiling import Histogram, QueryStats
+
+class TestHistogram(unittest.TestCase):
+	'query latency histograms'
+
+	def test_percentiles(self):
+
+		h = Histogram()
+		for d in [0.1] * 90 + [3.0] * 9 + [5000.0]:
+			h.add(d)
+
+		self.assertEqual(h.count, 100)
+		self.assertEqual(h.percentile(50), 0.125)
+		self.assertEqual(h.percentile(95), 4.0)
+		self.assertEqual(h.percentile(100), 8192.0)
+		self.assertEqual(h.max, 5000.0)
+
+	def test_report(self):
+
+		stats = QueryStats()
+		stats.add('machines', 'machine_list', 10.0)
+		stats.add('machines', 'machine_list', 30.0)
+		stats.add('stats', 'stats_current', 1.0)
+
+		report = stats.report()
+
+		self.assertEqual([(r['endpoint'], r['statement'], r['count']) for r in report],
+						 [('machines', 'machine_list', 2), ('stats', 'stats_current', 1)])
+		self.assertEqual(report[0]['avg_ms'], 20.0)
+
+class FakeConnection(object):
+	'connection of an aborted transaction (so even the SAVEPOINT fails)'
+
+	readonly = True
+
+	def cursor(self):
+		return self
+
+	def execute(self, query, vars=None):
+		raise Exception('current transaction is aborted')
+
+	def close(self):
+		pass
+
+class TestSlowLog(unittest.TestCase):
+	'logging of the slow queries'
+
+	def setUp(self):
+		(self.threshold, self.explain) = (profiling.slow_threshold, profiling.slow_explain)
+		(profiling.slow_threshold, profiling.slow_explain) = (0, True)
+
+	def tearDown(self):
+		(profiling.slow_threshold, profiling.slow_explain) = (self.threshold, self.explain)
+
+	def test_explain_failure(self):
+
+		# the query itself succeeded, so a failed EXPLAIN must not fail it
+		profiling.record(FakeConnection(), 'results_list', 'SELECT 1', None, 10.0)
+
+		self.assertTrue(profiling.explain(FakeConnection(), 'SELECT 1', None).startswith('EXPLAIN failed'))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,73 @@
+import sys
+import os.path
+import unittest
+
+# the libraries are located in the '../src', so add it to the python path
+sys.path.append(os.path.join(os.path.split(os.path.dirname(os.path.abspath(__file__)))[0], 'src'))
+
+import refresh
+from refresh import Debouncer
+
+class TestGraph(unittest.TestCase):
+	'dependencies between the materialized views'
+
+	views = {
+		'a' : ['results'],
+		'b' : ['results', 'version_last'],
+		'c' : ['a', 'b'],
+	}
+
+	def test_levels(self):
+
+		self.assertEqual([sorted(l) for l in refresh.levels(self.views)], [['a', 'b'], ['c']])
+
+		self.assertRaises(ValueError, refresh.levels, {'a' : ['b'], 'b' : ['a']})
+
+	def test_affected(self):
+
+		self.assertEqual(refresh.affected(self.views, set(['version_last'])), set(['b', 'c']))
+		self.assertEqual(refresh.affected(self.views, set(['results'])), set(['a', 'b', 'c']))
+		self.assertEqual(refresh.affected(self.views, set(['users'])), set())
+
+	def test_views(self):
+
+		# all the views can be ordered, and depend on existing tables only
+		refresh.levels(refresh.VIEWS)
+
+		self.assertEqual(refresh.sources(refresh.VIEWS), ['distribution_versions', 'error_analysis', 'results', 'results_last', 'version_last'])
+
+class TestDebouncer(unittest.TestCase):
+	'deciding when to refresh the views'
+
+	def test_first(self):
+
+		debouncer = Debouncer(quiet=10, max_delay=60)
+
+		self.assertEqual(debouncer.check({'results' : 1}, now=0), set(['results']))
+
+	def test_quiet(self):
+
+		debouncer = Debouncer(quiet=10, max_delay=60)
+		debouncer.done({'results' : 1, 'error_analysis' : 1})
+
+		self.assertEqual(debouncer.check({'results' : 1, 'error_analysis' : 1}, now=0), None)
+
+		# changed, but wait until the changes stop
+		self.assertEqual(debouncer.check({'results' : 2, 'error_analysis' : 1}, now=5), None)
+		self.assertEqual(debouncer.check({'results' : 3, 'error_analysis' : 1}, now=10), None)
+		self.assertEqual(debouncer.check({'results' : 3, 'error_analysis' : 1}, now=15), None)
+		self.assertEqual(debouncer.check({'results' : 3, 'error_analysis' : 1}, now=20), set(['results']))
+
+	def test_max_delay(self):
+
+		debouncer = Debouncer(quiet=10, max_delay=60)
+		debouncer.done({'results' : 0})
+
+		# changes keep coming, but the refresh happens after max_delay anyway
+		for i in range(12):
+			self.assertEqual(debouncer.check({'results' : i + 1}, now=i * 5), None)
+
+		self.assertEqual(debouncer.check({'results' : 13}, now=60), set(['results']))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -131,5 +131,46 @@ class TestResultPost(unittest.TestCase):
 		self.assertEqual(response.status_code, 401)
 		self.assertEqual(json.loads(response.data), {'message' : 'invalid signature'})
 
+class TestResultBatch(unittest.TestCase):
+	'submission of multiple results at once'
+
+	@classmethod
+	def setUpClass(cls):
+		TestResultPost.setUpClass()
+
+	def setUp(self):
+		self.app = app.test_client()
+
+	def result(self, uuid, **kwargs):
+
+		result = {  "machine" : "testanimal",
+					"distribution" : "testdistr",
+					"version" : "1.2.3",
+					"load" : "ok",
+					"install" : "ok",
+					"check" : "error",
+					"install_log" : "pgxnclient install logfile",
+					"check_log" : "pgxnclient check logfile",
+					"config" : json.dumps({"VERSION" : "PostgreSQL 9.5.1"}),
+					"env" : json.dumps({"PATH" : "/usr/bin"}),
+					"uuid" : uuid }
+
+		result.update(kwargs)
+		result['signature'] = sign_request(data=result, secret='testsecret')
+
+		return result
+
+	def test_invalid_item(self):
+
+		items = [self.result('00000000-0000-0000-0000-000000000001'),
+				 self.result('00000000-0000-0000-0000-000000000002', install='failed'),
+				 self.result(None)]
+
+		response = self.app.post('/api/results/batch', data=json.dumps(items), content_type='application/json')
+
+		# the invalid items are rejected, the valid one is stored anyway
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual([s['status'] for s in json.loads(response.data)['results']], ['ok', 'error', 'error'])
+
 if __name__ == '__main__':
 	unittest.main()
\ No newline at end of file
@@ -0,0 +1,100 @@
+import gzip
+import json
+import shutil
+import sys
+import os.path
+import StringIO
+import tempfile
+import unittest
+
+# the libraries are located in the '../src', so add it to the python path
+sys.path.append(os.path.join(os.path.split(os.path.dirname(os.path.abspath(__file__)))[0], 'src'))
+
+from flask import Flask
+
+import snapshots
+
+class Totals(object):
+
+	snapshot = 'stats-test'
+
+	@staticmethod
+	def render(cursor):
+		return {'total' : 10, 'ok' : 8}
+
+
+class Broken(object):
+
+	snapshot = 'stats-broken'
+
+	@staticmethod
+	def render(cursor):
+		raise Exception('relation "stats_broken" does not exist')
+
+
+class TestSnapshots(unittest.TestCase):
+	'JSON snapshots of the stats'
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.app = Flask(__name__)
+
+		snapshots.directory = self.directory
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+		snapshots.directory = None
+
+	def test_write_failure(self):
+
+		# a failing resource does not prevent writing the others
+		self.assertEqual(snapshots.write(self.directory, [Broken, Totals], None), ['stats-broken'])
+
+		self.assertTrue(os.path.exists(os.path.join(self.directory, 'stats-test.json')))
+		self.assertFalse(os.path.exists(os.path.join(self.directory, 'stats-broken.json')))
+
+	def test_write(self):
+
+		snapshots.write(self.directory, [Totals], None)
+
+		with open(os.path.join(self.directory, 'stats-test.json')) as f:
+			self.assertEqual(json.loads(f.read()), Totals.render(None))
+
+		with open(os.path.join(self.directory, 'stats-test.json.gz')) as f:
+			data = gzip.GzipFile(fileobj=StringIO.StringIO(f.read())).read()
+			self.assertEqual(json.loads(data), Totals.render(None))
+
+		# no temporary files left behind
+		self.assertEqual(sorted(os.listdir(self.directory)), ['stats-test.json', 'stats-test.json.gz'])
+
+		# the same data compress to the same bytes
+		self.assertEqual(snapshots.compress('abc'), snapshots.compress('abc'))
+
+	def test_response(self):
+
+		snapshots.write(self.directory, [Totals], None)
+
+		with self.app.test_request_context('/stats/test', headers={'Accept-Encoding' : 'gzip, deflate'}):
+			response = snapshots.response('stats-test')
+			self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+			self.assertTrue('Accept-Encoding' in response.vary)
+
+		with self.app.test_request_context('/stats/test'):
+			response = snapshots.response('stats-test')
+			self.assertFalse('Content-Encoding' in response.headers)
+			self.assertEqual(json.loads(response.data), Totals.render(None))
+
+		# JSONP needs the plain JSON
+		with self.app.test_request_context('/stats/test?callback=pgxn_x', headers={'Accept-Encoding' : 'gzip'}):
+			self.assertFalse('Content-Encoding' in snapshots.response('stats-test').headers)
+
+	def test_missing(self):
+
+		with self.app.test_request_context('/stats/test'):
+			self.assertEqual(snapshots.response('stats-test'), None)
+
+			snapshots.directory = None
+			self.assertEqual(snapshots.response('stats-test'), None)
+
+if __name__ == '__main__':
+	unittest.main()
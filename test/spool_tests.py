@@ -0,0 +1,127 @@
+import sys
+import os.path
+import shutil
+import tempfile
+import unittest
+
+# the libraries are located in the '../src', so add it to the python path
+sys.path.append(os.path.join(os.path.split(os.path.dirname(os.path.abspath(__file__)))[0], 'src'))
+
+import psycopg2
+
+from spool import Spool, Writer
+
+class TestSpool(unittest.TestCase):
+	'local spool of submitted results, and the background writer'
+
+	def setUp(self):
+
+		self.directory = tempfile.mkdtemp()
+		self.spool = Spool(self.directory, fsync_delay=0)
+
+		self.batches = []
+		self.errors = []
+
+		def store(records):
+			if self.errors:
+				raise self.errors.pop(0)
+			self.batches.append([r['id'] for r in records])
+
+		self.writer = Writer(self.spool, store, batch=2, max_backoff=0)
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def test_open_segment_not_drained(self):
+
+		self.spool.append({'id' : 1})
+		self.writer.drain()
+
+		# the segment is still being appended to
+		self.assertEqual(self.batches, [])
+		self.assertEqual(len(self.spool.segments()), 1)
+
+		self.spool.append({'id' : 2})
+		self.spool.append({'id' : 3})
+		self.spool.rotate()
+		self.writer.drain()
+
+		self.assertEqual(self.batches, [[1, 2], [3]])
+		self.assertEqual(self.spool.segments(), [])
+
+	def test_restarted_process(self):
+
+		self.spool.append({'id' : 1})
+		self.spool.rotate()
+
+		# a new process (possibly with the same pid) must not replace the segments not drained yet
+		spool = Spool(self.directory, fsync_delay=0)
+		spool.append({'id' : 2})
+		spool.rotate()
+
+		self.assertEqual(len(self.spool.segments()), 2)
+
+		self.writer.drain()
+		self.assertEqual(sorted([i for b in self.batches for i in b]), [1, 2])
+
+	def test_rotate_min_age(self):
+
+		self.spool.append({'id' : 1})
+		self.spool.rotate(min_age=60)
+
+		self.writer.drain()
+		self.assertEqual(self.batches, [])
+
+	def test_torn_record(self):
+
+		self.spool.append({'id' : 1})
+		self.spool.rotate()
+
+		with open(self.spool.segments()[0], 'ab') as f:
+			f.write('{"id" : ')
+
+		self.writer.drain()
+		self.assertEqual(self.batches, [[1]])
+
+	def test_retry(self):
+
+		self.errors = [psycopg2.OperationalError('server closed the connection')]
+
+		self.spool.append({'id' : 1})
+		self.spool.rotate()
+		self.writer.drain()
+
+		self.assertEqual(self.batches, [[1]])
+		self.assertEqual(self.writer.failures, 1)
+
+	def test_reject(self):
+
+		self.errors = [psycopg2.IntegrityError('batch'), psycopg2.IntegrityError('record')]
+
+		self.spool.append({'id' : 1})
+		self.spool.append({'id' : 2})
+		self.spool.rotate()
+		self.writer.drain()
+
+		# the batch is split, and the failing record set aside
+		self.assertEqual(self.batches, [[2]])
+		self.assertEqual(self.writer.rejected, 1)
+		self.assertTrue(os.path.exists(os.path.join(self.directory, 'rejected.log')))
+
+	def test_reject_malformed(self):
+
+		# a record the store can't even build a row from (not a database error)
+		self.errors = [KeyError('uuid'), KeyError('uuid')]
+
+		self.spool.append({'id' : 1})
+		self.spool.append({'id' : 2})
+		self.spool.rotate()
+		self.writer.drain()
+
+		# the segment is drained anyway, with the bad record set aside
+		self.assertEqual(self.batches, [[2]])
+		self.assertEqual(self.writer.rejected, 1)
+		self.assertEqual(self.spool.segments(), [])
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,36 @@
+import sys
+import os.path
+import unittest
+
+# the libraries are located in the '../src', so add it to the python path
+sys.path.append(os.path.join(os.path.split(os.path.dirname(os.path.abspath(__file__)))[0], 'src'))
+
+from db import Statement
+
+class TestStatement(unittest.TestCase):
+	'translation of static SQL to PREPARE / EXECUTE'
+
+	def test_no_params(self):
+
+		s = Statement('test_no_params', "SELECT * FROM results_summary")
+
+		self.assertEqual(s.prepare_sql, "PREPARE test_no_params AS SELECT * FROM results_summary")
+		self.assertEqual(s.execute_sql, "EXECUTE test_no_params")
+		self.assertEqual(s.arguments({}), [])
+
+	def test_params(self):
+
+		s = Statement('test_params', "SELECT 1 FROM t WHERE a = %(name)s AND b = %(version)s AND c = %(name)s AND d LIKE 'x%%'")
+
+		self.assertEqual(s.prepare_sql, "PREPARE test_params AS SELECT 1 FROM t WHERE a = $1 AND b = $2 AND c = $1 AND d LIKE 'x%'")
+		self.assertEqual(s.execute_sql, "EXECUTE test_params (%s, %s)")
+		self.assertEqual(s.arguments({'version' : '1.0', 'name' : 'x', 'other' : 0}), ['x', '1.0'])
+
+	def test_duplicate(self):
+
+		Statement('test_duplicate', "SELECT 1")
+
+		self.assertRaises(ValueError, Statement, 'test_duplicate', "SELECT 2")
+
+if __name__ == '__main__':
+	unittest.main()
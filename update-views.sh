@@ -1,3 +0,0 @@
-#!/usr/bin/env bash
-
-psql "user=pgxn-tester dbname=pgxn-tester" -c "SELECT refresh_views()" > /dev/null 2>&1
\ No newline at end of file